@@ -1,17 +1,52 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 import json
-import os
+import math
 import random
 import string
-from datetime import datetime
 import sqlite3
+import time
+from collections import deque
+from datetime import datetime
 
-# ---------- Files ----------
-
-VOUCHER_FILE = "vouchers.json"
-ORDER_FILE = "orders.json"
-DB_FILE = "restaurant.db"
+import billing
+from billing import (
+    CATEGORIES, ADMIN_PASSWORDS,
+    init_db,
+    load_menu_data, update_menu_category, load_menu_items, order_lines,
+    load_vouchers, save_vouchers, load_orders,
+    format_tk, format_item_price,
+    authenticate, generate_bill_no, check_voucher,
+    change_text, build_order, record_order,
+)
+from receipts import ReceiptSpooler
+from zreport import build_zreport, format_zreport, export_zreport
+from inventory import Inventory, format_recipes, item_ids, item_names, parse_recipes
+from tabs import TabBook, DEFAULT_TAB
+from staff import StaffDirectory
+from shifts import ShiftLedger, format_shift, recent_shifts
+from reservations import DEFAULT_MINUTES, ReservationBook, parse_slot
+from payments import (
+    APPROVED, DECLINED, FAILED, PaymentPipeline, new_payment_id,
+    payment_message,
+)
+from loyalty import (
+    LoyaltyBook, MIN_REDEEM, POINT_VALUE, normalize_phone, points_for,
+    redeem_value,
+)
+import history
+import menuio
+from changefeed import ChangeFeed
+import changefeed
+from ordersearch import OrderSearch, locate
+from combos import (
+    describe, format_combos, load_combos, parse_combos, save_combos, suggest,
+)
+from pricing import (
+    Cart, DEFAULT_RULES, compile_rules, describe_rules, load_rules, save_rules,
+)
+import metrics
+import action_profiler
 
 # ---------- Colors / Fonts ----------
 
@@ -30,47 +65,8 @@ GREEN_BTN = "#218838"
 BROWN_BTN = "#8b5a3c"
 RED_BTN = "#d9534f"
 
-CATEGORIES = ["Kacchi Combo", "Drinks & Dessert", "Add-ons", "Sharing Platter"]
-
-# ---------- Default menu (first run only) ----------
-
-DEFAULT_MENU = {
-    "Kacchi Combo": [
-        ("Basic Kacchi", 300),
-        ("Kacchi Meal", 320),
-        ("Kacchi + Borhani + Firni", 420),
-        ("Kacchi + Roast + Borhani", 450),
-        ("Kacchi + Roast + Borhani + Firni", 480),
-    ],
-    "Drinks & Dessert": [
-        ("Borhani", 60),
-        ("Soft Drink", 40),
-        ("Mineral Water", 20),
-        ("Firni", 50),
-        ("Jorda", 50),
-    ],
-    "Add-ons": [
-        ("Plain Polao", 250),
-        ("Chicken Roast", 200),
-        ("Beef Rezala", 220),
-        ("Jali Kabab", 80),
-        ("Salad", 40),
-        ("Chatni", 20),
-    ],
-    "Sharing Platter": [
-        ("Sharing Platter 1", 280),
-        ("Sharing Platter 2", 920),
-    ],
-}
-
 # ---------- Admin password helper ----------
 
-ADMIN_PASSWORDS = {
-    "Tanim119": "Tanim",
-    "Mim31": "Mim",
-}
-
-
 def ask_admin_password(message="Enter admin password:"):
     pw = simpledialog.askstring("Admin Access", message, show="*")
     if pw is None:
@@ -81,178 +77,9 @@ def ask_admin_password(message="Enter admin password:"):
     return None
 
 
-# ---------- DB helpers (employees + menu) ----------
-
-def init_db():
-    con = sqlite3.connect(DB_FILE)
-    cur = con.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS employees (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            password TEXT NOT NULL
-        )
-    """)
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS menu_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT NOT NULL,
-            name TEXT NOT NULL,
-            price REAL NOT NULL,
-            sort_order INTEGER NOT NULL DEFAULT 0
-        )
-    """)
-
-    # seed default menu if empty
-    cur.execute("SELECT COUNT(*) FROM menu_items")
-    if cur.fetchone()[0] == 0:
-        for cat, items in DEFAULT_MENU.items():
-            for sort_order, (name, price) in enumerate(items):
-                cur.execute(
-                    "INSERT INTO menu_items(category, name, price, sort_order) "
-                    "VALUES (?,?,?,?)",
-                    (cat, name, float(price), sort_order),
-                )
-        con.commit()
-
-    con.close()
-
-
-def load_employees():
-    con = sqlite3.connect(DB_FILE)
-    cur = con.cursor()
-    cur.execute("SELECT id, name, password FROM employees ORDER BY id")
-    rows = cur.fetchall()
-    con.close()
-    return [{"id": r[0], "name": r[1], "password": r[2]} for r in rows]
-
-
-def save_employees(employees):
-    con = sqlite3.connect(DB_FILE)
-    cur = con.cursor()
-    cur.execute("DELETE FROM employees")
-    for emp in employees:
-        cur.execute(
-            "INSERT INTO employees(id, name, password) VALUES (?,?,?)",
-            (emp["id"], emp["name"], emp["password"]),
-        )
-    con.commit()
-    con.close()
-
-
-def load_menu_data():
-    con = sqlite3.connect(DB_FILE)
-    cur = con.cursor()
-    data = {}
-    for cat in CATEGORIES:
-        cur.execute(
-            "SELECT name, price FROM menu_items "
-            "WHERE category=? ORDER BY sort_order, id",
-            (cat,),
-        )
-        rows = cur.fetchall()
-        data[cat] = [(name, float(price)) for (name, price) in rows]
-    con.close()
-    return data
-
-
-def update_menu_category(cat, items):
-    con = sqlite3.connect(DB_FILE)
-    cur = con.cursor()
-    cur.execute("DELETE FROM menu_items WHERE category=?", (cat,))
-    for idx, (name, price) in enumerate(items):
-        cur.execute(
-            "INSERT INTO menu_items(category, name, price, sort_order) "
-            "VALUES (?,?,?,?)",
-            (cat, name, float(price), idx),
-        )
-    con.commit()
-    con.close()
-
-
-# ---------- JSON helpers for vouchers/orders ----------
-
-def load_json(path, default):
-    if not os.path.exists(path):
-        return default
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return default
-
-
-def save_json(path, data):
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print("Error saving", path, ":", e)
-
-
-def load_vouchers():
-    raw = load_json(VOUCHER_FILE, {})
-    # Old format handle: list -> convert to dict
-    if isinstance(raw, list):
-        converted = {}
-        for entry in raw:
-            if not isinstance(entry, dict):
-                continue
-            code = str(entry.get("code", "")).upper()
-            if not code:
-                continue
-            converted[code] = {
-                "code": code,
-                "discount": float(entry.get("discount", entry.get("percent", 0))),
-                "max_uses": int(entry.get("max_uses", entry.get("max", 0))),
-                "used": int(entry.get("used", 0)),
-                "deleted": bool(entry.get("deleted", False)),
-            }
-        raw = converted
-
-    normalized = {}
-    for code, v in raw.items():
-        code_u = str(code).upper()
-        normalized[code_u] = {
-            "code": code_u,
-            "discount": float(v.get("discount", v.get("percent", 0))),
-            "max_uses": int(v.get("max_uses", v.get("max", 0))),
-            "used": int(v.get("used", 0)),
-            "deleted": bool(v.get("deleted", False)),
-        }
-    return normalized
-
-
-def save_vouchers(vouchers):
-    save_json(VOUCHER_FILE, vouchers)
-
-
-def load_orders():
-    return load_json(ORDER_FILE, [])
-
-
-def save_orders(orders):
-    save_json(ORDER_FILE, orders)
-
-
-# ---------- Formatting helpers ----------
-
-def format_tk(amount):
-    return f"Tk {amount:,.2f}"
-
-
-def format_item_price(amount):
-    a = float(amount)
-    if a.is_integer():
-        return f"{int(a)} Tk"
-    else:
-        return f"{a:,.2f} Tk"
-
-
 # ---------- Tk root ----------
 
+action_profiler.install()
 root = tk.Tk()
 root.title("Kacchi Bhai Style Restaurant Billing - Bangladesh")
 root.configure(bg=BG_COLOR)
@@ -261,30 +88,64 @@ root.geometry("1200x700")   # a little taller, so Add-ons fits nicely
 # ---------- Global state ----------
 
 init_db()
-employees = load_employees()
+staff = StaffDirectory()
 vouchers = load_vouchers()
+# closed months move to compressed segments, so only this month is loaded
+history.rotate()
+order_search = OrderSearch()
+order_cache = history.OrderCache()
+for period, action in history.apply_retention():
+    order_search.forget(period, action)
 orders = load_orders()
 menu_data = load_menu_data()
+pricing_rules = load_rules()
+combos, unmatched_combos = load_combos(item_ids())
+receipt_spooler = ReceiptSpooler()
+change_feed = ChangeFeed()
+inventory = Inventory()
+inventory.catch_up(orders)
+order_search.catch_up(orders)
+shift_ledger = ShiftLedger()
+shift_ledger.catch_up(orders)
+loyalty = LoyaltyBook()
+loyalty.catch_up(orders)
+reservations = ReservationBook()
+payment_pipeline = PaymentPipeline()
 
 current_user_name = None
 current_role = None
+session_switches = deque(maxlen=50)     # (kind, seconds) per login, newest last
 
 login_frame = tk.Frame(root, bg=BG_COLOR)
 main_frame = tk.Frame(root, bg=BG_COLOR)
 
 user_label_var = tk.StringVar(value="User: ---")
+shift_label_var = tk.StringVar()
 
 menu_items = []
+menu_by_id = {}
+menu_prices = {}   # item id -> current price
+menu_rows = {}      # item pos -> (name label, qty label, total label), menu page
+summary_rows = {}   # item pos -> (qty label, total label), order summary
+tab_book = TabBook()
+cart_pricer = Cart(compile_rules(DEFAULT_RULES, []))
+active_tab_var = tk.StringVar(value=DEFAULT_TAB)
+tab_bar_frame = None
 selection_total_var = tk.DoubleVar(value=0.0)
 
 applied_voucher_code = None
 applied_discount_percent = 0.0
+loyalty_customer = None     # phone of the member attached to the order
+applied_redeem_points = 0
 
 bill_no_var = tk.StringVar()
 datetime_var = tk.StringVar()
 food_cost_var = tk.StringVar(value="Tk 0.00")
 
 discount_display_var = tk.StringVar(value="Tk 0.00")
+promotions_var = tk.StringVar()
+combo_hint_var = tk.StringVar()
+combo_suggestion = None
 vat_var            = tk.StringVar(value="Tk 0.00")
 total_bill_var     = tk.StringVar(value="Tk 0.00")
 
@@ -292,75 +153,235 @@ total_bill_var     = tk.StringVar(value="Tk 0.00")
 payment_method_var = tk.StringVar(value="Cash")
 paid_amount_var = tk.StringVar()
 change_due_var = tk.StringVar()
+payment_status_var = tk.StringVar()
+
+PAYMENT_POLL_MS = 100
+# (key, order, points balance, started) while a gateway decides
+pending_payment = None
+failed_payment = None       # last order whose gateway could not be reached
 
 voucher_entry_var = tk.StringVar()
 voucher_message_var = tk.StringVar()
 
+customer_entry_var = tk.StringVar()
+customer_info_var = tk.StringVar()
+
 paid_amount_entry = None
 
 content_frame = None
 menu_page = None
 summary_page = None
+summary_page_built = False      # filled in on the first NEXT
 
 
 # ---------- Transaction helpers ----------
 
 def reset_transaction():
+    tab_book.active_tab().clear()
+    clear_transaction_ui()
+
+
+def clear_transaction_ui():
     global applied_voucher_code, applied_discount_percent
-    for item in menu_items:
-        item["qty_var"].set(0)
-        item["total_var"].set(0.0)
-        item["total_str_var"].set("0 Tk")
-        if "menu_total_label" in item:
-            item["menu_total_label"].config(fg="black")
+    global loyalty_customer, applied_redeem_points
+    paint_all_items()
+    cart_pricer.load(cart_qty())
     selection_total_var.set(0.0)
     applied_voucher_code = None
     applied_discount_percent = 0.0
     voucher_entry_var.set("")
     voucher_message_var.set("")
+    customer_entry_var.set("")
+    loyalty_customer = None
+    applied_redeem_points = 0
+    customer_info_var.set("")
     bill_no_var.set("")
     datetime_var.set("")
+    payment_status_var.set("")
     food_cost_var.set("Tk 0.00")
     discount_display_var.set("Tk 0.00")
+    promotions_var.set("")
     vat_var.set("Tk 0.00")
     total_bill_var.set("Tk 0.00")
     paid_amount_var.set("")
     change_due_var.set("")
 
 
-def generate_bill_no():
-    return str(random.randint(20000, 49999))
+# ---------- Open tabs ----------
 
+def save_active_tab():
+    # Quantities are written straight into the tab; only the voucher needs
+    # parking.
+    tab = tab_book.active_tab()
+    tab.voucher_code = applied_voucher_code
+    tab.discount_percent = applied_discount_percent
+    tab.customer = loyalty_customer
+    tab.redeem_points = applied_redeem_points
 
-def calculate_totals():
-    subtotal = 0.0
+
+def load_active_tab():
+    global applied_voucher_code, applied_discount_percent
+    global applied_redeem_points
+    tab = tab_book.active_tab()
+    paint_all_items()
+    cart_pricer.load(tab.qty)
+    applied_voucher_code = tab.voucher_code
+    applied_discount_percent = tab.discount_percent
+    voucher_entry_var.set(tab.voucher_code or "")
+    voucher_message_var.set("")
+    customer_entry_var.set(tab.customer or "")     # attaches the member
+    applied_redeem_points = tab.redeem_points
+    on_customer_typed()
+    active_tab_var.set(tab.name)
+    calculate_totals()
+
+
+def switch_tab(name=None):
+    name = name or active_tab_var.get()
+    if name == tab_book.active:
+        return
+    save_active_tab()
+    tab_book.open(name)
+    load_active_tab()
+    build_tab_bar()
+
+
+def new_tab():
+    name = simpledialog.askstring("New Tab", "Table / tab name:",
+                                  initialvalue=f"Table {len(tab_book.tabs)}")
+    if not name or not name.strip():
+        return
+    save_active_tab()
+    tab_book.open(name.strip())
+    load_active_tab()
+    build_tab_bar()
+
+
+def close_tab():
+    tab = tab_book.active_tab()
+    save_active_tab()
+    if not tab.is_empty() and not messagebox.askyesno(
+            "Close Tab", f"Discard the open order on {tab.name}?"):
+        return
+    if tab.reservation_id:
+        reservations.finish(tab.reservation_id)
+    tab_book.close(tab.name)
+    load_active_tab()
+    build_tab_bar()
+
+
+def finish_active_tab():
+    # Paid: drop the tab and go back to a fresh walk-in order. A seated
+    # booking frees its table from now on.
+    tab = tab_book.active_tab()
+    if tab.reservation_id:
+        reservations.finish(tab.reservation_id)
+        tab.reservation_id = None
+    if tab_book.active != DEFAULT_TAB:
+        tab_book.close(tab_book.active)
+    tab_book.open(DEFAULT_TAB).clear()
+    clear_transaction_ui()
+    load_active_tab()
+    build_tab_bar()
+
+
+def build_tab_bar():
+    if tab_bar_frame is None or not tab_bar_frame.winfo_exists():
+        return
+    for w in tab_bar_frame.winfo_children():
+        w.destroy()
+
+    tk.Label(tab_bar_frame, text="Open tabs:", bg=BG_COLOR,
+             font=COL_HEADER_FONT).pack(side="left", padx=(0, 6))
+    for name in tab_book.names():
+        tk.Radiobutton(
+            tab_bar_frame, text=name, value=name, variable=active_tab_var,
+            indicatoron=0, font=BUTTON_FONT, padx=8, pady=2,
+            bg=PANEL_BG, selectcolor="#f0c987", command=switch_tab
+        ).pack(side="left", padx=2)
+
+    tk.Button(
+        tab_bar_frame, text="CLOSE TAB", font=BUTTON_FONT,
+        bg=RED_BTN, fg="white", command=close_tab
+    ).pack(side="right", padx=2)
+    tk.Button(
+        tab_bar_frame, text="+ NEW TAB", font=BUTTON_FONT,
+        bg=GREEN_BTN, fg="white", command=new_tab
+    ).pack(side="right", padx=2)
+    tk.Button(
+        tab_bar_frame, text="BOOKINGS", font=BUTTON_FONT,
+        bg="#0099a8", fg="white", command=open_reservations_window
+    ).pack(side="right", padx=2)
+
+
+def cart_qty():
+    # Quantities of the active tab, indexed by MenuItem.pos.
+    return tab_book.active_tab().qty
+
+
+def paint_item(item):
+    # Push one item's quantity into whichever rows currently show it.
+    qty = cart_qty()[item.pos]
+    line_total = qty * item.price
+    row = menu_rows.get(item.pos)
+    if row is not None:
+        row[1].config(text=str(qty))
+        row[2].config(text=format_item_price(line_total),
+                      fg="green" if line_total > 0 else "black")
+    row = summary_rows.get(item.pos)
+    if row is not None:
+        row[0].config(text=str(qty))
+        row[1].config(text=format_tk(line_total))
+
+
+def paint_all_items():
     for item in menu_items:
-        qty = item["qty_var"].get()
-        line_total = qty * item["price"]
-        subtotal += line_total
-        item["total_var"].set(line_total)
-        item["total_str_var"].set(format_item_price(line_total))
-        if "menu_total_label" in item:
-            item["menu_total_label"].config(
-                fg="green" if line_total > 0 else "black"
-            )
+        paint_item(item)
 
-    selection_total_var.set(subtotal)
 
-    discount_amount = subtotal * (applied_discount_percent / 100.0)
-    after_discount = max(0.0, subtotal - discount_amount)
+def compile_pricing():
+    # The plan is resolved against menu positions, so it is rebuilt with
+    # the menu page and whenever the rules are saved.
+    global cart_pricer
+    try:
+        plan = compile_rules(pricing_rules, menu_items)
+    except ValueError as e:
+        messagebox.showerror("Pricing rules",
+                             f"Pricing rules ignored, using plain VAT:\n{e}")
+        plan = compile_rules(DEFAULT_RULES, menu_items)
+    cart_pricer = Cart(plan)
+    cart_pricer.load(cart_qty())
+
+
+def current_pricing():
+    voucher = None
+    if applied_voucher_code:
+        exclusive = vouchers.get(applied_voucher_code, {}).get("exclusive", False)
+        voucher = (applied_voucher_code, applied_discount_percent, exclusive)
+    redeem = redeem_value(applied_redeem_points) if loyalty_customer else 0.0
+    return cart_pricer.price(voucher, redeem=redeem)
 
-    if applied_discount_percent > 0:
+
+def calculate_totals():
+    result = current_pricing()
+    subtotal = result["subtotal"]
+    discount_amount = result["discount"]
+    total = result["total"]
+
+    selection_total_var.set(subtotal)
+
+    if result["voucher_applied"] and len(result["promotions"]) == 1:
         discount_display_var.set(
             f"{applied_discount_percent:.0f}% (-{format_tk(discount_amount)[3:]})"
         )
+    elif discount_amount > 0:
+        discount_display_var.set(f"-{format_tk(discount_amount)[3:]}")
     else:
         discount_display_var.set("Tk 0.00")
+    promotions_var.set("\n".join(f"{name}: -{format_tk(amount)[3:]}"
+                                  for name, amount in result["promotions"]))
 
-    vat_amount = after_discount * 0.05 if after_discount > 0 else 0.0
-    vat_var.set(format_tk(vat_amount))
-
-    total = after_discount + vat_amount
+    vat_var.set(format_tk(result["vat"]))
     total_bill_var.set(format_tk(total))
     food_cost_var.set(format_tk(subtotal))
 
@@ -369,7 +390,135 @@ def calculate_totals():
         change_due_var.set("")
 
 
-def on_qty_change():
+# ---------- Coalesced repaints ----------
+#
+# A "+" click updates the tab and the pricer straight away but only marks
+# the row dirty; labels, totals and the combo hint are redrawn by one idle
+# callback once the burst of clicks has been handled, and no more than once
+# per frame.
+
+FRAME_MS = 16
+coalesce_repaints = True
+dirty_items = {}        # item pos -> MenuItem waiting to be repainted
+dirty_since = []        # perf_counter() of every edit since the last repaint
+repaint_job = None
+last_repaint = 0.0
+repaint_count = 0
+paint_latencies = deque(maxlen=2000)    # event-to-paint seconds
+
+
+def schedule_repaint(item=None):
+    global repaint_job
+    if item is not None:
+        dirty_items[item.pos] = item
+    dirty_since.append(time.perf_counter())
+    if not coalesce_repaints:
+        flush_repaint()
+    elif repaint_job is None:
+        repaint_job = root.after_idle(flush_repaint)
+
+
+def flush_repaint(force=False):
+    # force=True paints now whatever is pending, e.g. before the totals are
+    # read for payment.
+    global repaint_job, last_repaint, repaint_count
+    if repaint_job is not None:
+        root.after_cancel(repaint_job)
+        repaint_job = None
+    if not dirty_since:
+        return
+    wait = FRAME_MS - (time.perf_counter() - last_repaint) * 1000
+    if coalesce_repaints and not force and wait >= 1:
+        repaint_job = root.after(int(wait), flush_repaint)
+        return
+    for item in dirty_items.values():
+        paint_item(item)
+    dirty_items.clear()
+    calculate_totals()
+    refresh_combo_hint()
+    last_repaint = time.perf_counter()
+    repaint_count += 1
+    for t in dirty_since:
+        paint_latencies.append(last_repaint - t)
+        if metrics.ENABLED:
+            metrics.observe("qty_event_to_paint", last_repaint - t)
+    dirty_since.clear()
+
+
+def run_click_burst(report, clicks=100, interval_ms=0):
+    # Replays `clicks` "+" presses on the first menu item through the event
+    # loop, first with coalesced repaints and then painting every click,
+    # puts the quantity back and hands one summary per mode to report().
+    if not menu_items:
+        report([])
+        return
+    item = menu_items[0]
+    results = []
+
+    def run(modes):
+        global coalesce_repaints
+        if not modes:
+            coalesce_repaints = True
+            report(results)
+            return
+        coalesce_repaints = modes[0]
+        before = cart_qty()[item.pos]
+        paint_latencies.clear()
+        first_repaint = repaint_count
+        started = time.perf_counter()
+        for n in range(clicks):
+            root.after(n * interval_ms, lambda: change_qty(item, 1))
+
+        def finish():
+            flush_repaint(force=True)
+            lat = sorted(paint_latencies)
+            results.append({
+                "mode": "coalesced" if modes[0] else "every click",
+                "clicks": len(lat),
+                "repaints": repaint_count - first_repaint,
+                "p50_ms": lat[len(lat) // 2] * 1000 if lat else 0.0,
+                "p95_ms": lat[int(len(lat) * 0.95) - 1] * 1000 if lat else 0.0,
+                "max_ms": lat[-1] * 1000 if lat else 0.0,
+                "busy_ms": (last_repaint - started) * 1000,
+            })
+            change_qty(item, before - cart_qty()[item.pos])
+            flush_repaint(force=True)
+            root.after(50, lambda: run(modes[1:]))
+
+        root.after(clicks * interval_ms + 1, lambda: root.after_idle(finish))
+
+    run([True, False])
+
+
+def refresh_combo_hint():
+    # Suggest ringing loose items up as combos when that is cheaper.
+    global combo_suggestion
+    if not summary_page_built:
+        return
+    frame = summary_page.combo_frame
+    cart = {menu_items[pos].item_id: q for pos, q in cart_pricer.lines.items()}
+    combo_suggestion = suggest(cart, combos, menu_prices)
+    if combo_suggestion is None:
+        frame.grid_remove()
+        return
+    names = {item_id: it.name for item_id, it in menu_by_id.items()}
+    combo_hint_var.set(f"{describe(combo_suggestion, names)} - saves "
+                       f"{format_tk(combo_suggestion['saving'])}")
+    frame.grid()
+
+
+def apply_combo_suggestion():
+    if combo_suggestion is None:
+        return
+    qty = cart_qty()
+    for changes, sign in ((combo_suggestion["remove"], -1),
+                          (combo_suggestion["add"], 1)):
+        for item_id, n in changes.items():
+            item = menu_by_id[item_id]
+            qty[item.pos] += sign * n
+            cart_pricer.set(item.pos, qty[item.pos])
+            paint_item(item)
+    rebuild_order_summary()
     calculate_totals()
 
 
@@ -380,7 +529,7 @@ def make_qty_controls(parent, item):
         command=lambda: change_qty(item, -1)
     )
     qty_lbl = tk.Label(
-        frame, textvariable=item["qty_var"], width=2,
+        frame, text=str(cart_qty()[item.pos]), width=2,
         font=TEXT_FONT, bg="white", relief="solid", bd=1
     )
     plus_btn = tk.Button(
@@ -392,15 +541,17 @@ def make_qty_controls(parent, item):
     qty_lbl.grid(row=0, column=1, padx=1)
     plus_btn.grid(row=0, column=2)
 
-    return frame
+    return frame, qty_lbl
 
 
 def change_qty(item, delta):
-    v = item["qty_var"].get() + delta
+    qty = cart_qty()
+    v = qty[item.pos] + delta
     if v < 0:
         v = 0
-    item["qty_var"].set(v)
-    on_qty_change()
+    qty[item.pos] = v
+    cart_pricer.set(item.pos, v)
+    schedule_repaint(item)
 
 
 # ---------- Login UI ----------
@@ -483,21 +634,11 @@ def build_login_ui():
         uid = id_var.get().strip()
         pw = pwd_var.get().strip()
 
-        if role == "Employee":
-            if not uid or not pw:
-                msg_var.set("Please enter Employee ID and Password.")
-                return
-            emp = next((e for e in employees if e["id"] == uid), None)
-            if not emp or emp["password"] != pw:
-                msg_var.set("Invalid employee credentials.")
-                return
-            start_main_session(f'{emp["name"]} (Employee)', "Employee")
-        else:
-            if pw not in ADMIN_PASSWORDS:
-                msg_var.set("Wrong admin password.")
-                return
-            name = ADMIN_PASSWORDS[pw]
-            start_main_session(f"{name} (Admin)", "Admin")
+        display_name, error = authenticate(staff, role, uid, pw)
+        if error:
+            msg_var.set(error)
+            return
+        start_main_session(display_name, role)
 
     tk.Button(
         inner, text="LOGIN", font=BUTTON_FONT, bg=BLUE_BTN, fg="white",
@@ -512,17 +653,26 @@ def build_login_ui():
     pwd_entry.bind("<Return>", do_login)
     id_entry.bind("<Return>", do_login)
 
+    def reset_form():
+        # The form is built once; logging out only clears what was typed.
+        role_var.set("Employee")
+        id_var.set("")
+        pwd_var.set("")
+        msg_var.set("")
+        on_role_change()
+
+    login_frame.reset_form = reset_form
     on_role_change()
 
 
 # ---------- Main UI ----------
 
 def build_main_ui():
+    # Built on the first login only; later logins re-bind it to the new
+    # user in start_main_session(). The summary page is filled in on the
+    # first NEXT.
     global content_frame, menu_page, summary_page
 
-    for w in main_frame.winfo_children():
-        w.destroy()
-
     title_bar = tk.Frame(main_frame, bg=HEADER_BG)
     title_bar.pack(fill="x")
 
@@ -545,10 +695,19 @@ def build_main_ui():
         padx=15,
     ).pack(side="right")
 
+    tk.Label(
+        title_bar,
+        textvariable=shift_label_var,
+        bg=HEADER_BG,
+        fg=HEADER_FG,
+        font=("Segoe UI", 10),
+        padx=15,
+    ).pack(side="right")
+    refresh_shift_label()
+
     content_frame = tk.Frame(main_frame, bg=BG_COLOR)
     content_frame.pack(fill="both", expand=True)
 
-    global menu_page, summary_page
     menu_page = tk.Frame(content_frame, bg=BG_COLOR)
     summary_page = tk.Frame(content_frame, bg=BG_COLOR)
 
@@ -558,16 +717,18 @@ def build_main_ui():
     content_frame.grid_columnconfigure(0, weight=1)
 
     build_menu_page()
-    build_summary_page()
     show_menu_page()
 
 
 def build_menu_page():
-    global menu_items
+    global menu_items, tab_bar_frame
     for w in menu_page.winfo_children():
         w.destroy()
 
-    outer = tk.Frame(menu_page, bg=BG_COLOR, padx=8, pady=8)
+    tab_bar_frame = tk.Frame(menu_page, bg=BG_COLOR, padx=12, pady=4)
+    tab_bar_frame.pack(fill="x")
+
+    outer = tk.Frame(menu_page, bg=BG_COLOR, padx=8, pady=4)
     outer.pack(fill="both", expand=True)
 
     outer.grid_columnconfigure(0, weight=1, uniform="col")
@@ -575,7 +736,17 @@ def build_menu_page():
     outer.grid_rowconfigure(0, weight=1)
     outer.grid_rowconfigure(1, weight=1)
 
-    menu_items.clear()
+    # Positions are reassigned here, so summary rows from an earlier NEXT
+    # are stale as well.
+    menu_items[:] = load_menu_items()
+    menu_rows.clear()
+    summary_rows.clear()
+    tab_book.rebind([it.item_id for it in menu_items])
+    menu_by_id.clear()
+    menu_by_id.update((it.item_id, it) for it in menu_items)
+    menu_prices.clear()
+    menu_prices.update((it.item_id, it.price) for it in menu_items)
+    compile_pricing()
 
     def build_category(row, col, cat_name):
         cat_frame = tk.Frame(
@@ -602,34 +773,28 @@ def build_menu_page():
                  font=COL_HEADER_FONT, anchor="e")\
             .grid(row=1, column=3, sticky="e", padx=(8, 0))
 
-        items = menu_data.get(cat_name, [])
+        items = [it for it in menu_items if it.category == cat_name]
         start_row = 2
-        for idx, (name, price) in enumerate(items):
+        for idx, item in enumerate(items):
             r = start_row + idx
-            item = {
-                "category": cat_name,
-                "name": name,
-                "price": float(price),
-                "qty_var": tk.IntVar(value=0),
-                "total_var": tk.DoubleVar(value=0.0),
-                "total_str_var": tk.StringVar(value="0 Tk"),
-            }
-            menu_items.append(item)
-
-            tk.Label(cat_frame, text=name, bg=PANEL_BG,
-                     font=TEXT_FONT, anchor="w")\
-                .grid(row=r, column=0, sticky="w", padx=(0, 8), pady=1)
-
-            tk.Label(cat_frame, text=format_item_price(price), bg=PANEL_BG,
-                     font=TEXT_FONT, anchor="e")\
+
+            name_lbl = tk.Label(
+                cat_frame, text=item.name, bg=PANEL_BG, font=TEXT_FONT,
+                anchor="w",
+                fg=("gray55" if inventory.is_low(item.item_id) else "black")
+            )
+            name_lbl.grid(row=r, column=0, sticky="w", padx=(0, 8), pady=1)
+
+            tk.Label(cat_frame, text=format_item_price(item.price),
+                     bg=PANEL_BG, font=TEXT_FONT, anchor="e")\
                 .grid(row=r, column=1, sticky="e", pady=1)
 
-            qty_frame = make_qty_controls(cat_frame, item)
+            qty_frame, qty_lbl = make_qty_controls(cat_frame, item)
             qty_frame.grid(row=r, column=2, pady=1)
 
             total_lbl = tk.Label(
                 cat_frame,
-                textvariable=item["total_str_var"],
+                text=format_item_price(0),
                 bg=PANEL_BG,
                 fg="black",
                 font=TEXT_FONT,
@@ -637,7 +802,7 @@ def build_menu_page():
             )
             total_lbl.grid(row=r, column=3, sticky="e",
                            padx=(8, 0), pady=1)
-            item["menu_total_label"] = total_lbl
+            menu_rows[item.pos] = (name_lbl, qty_lbl, total_lbl)
 
         for c in range(4):
             cat_frame.grid_columnconfigure(c, weight=(3 if c == 0 else 1))
@@ -650,7 +815,7 @@ def build_menu_page():
     # bottom bar
     bottom = tk.Frame(outer, bg=BG_COLOR)
     bottom.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(4, 0))
-    for c in range(9):
+    for c in range(10):
         bottom.grid_columnconfigure(c, weight=0)
     bottom.grid_columnconfigure(0, weight=1)
 
@@ -673,7 +838,11 @@ def build_menu_page():
     )
     lbl_sel.grid(row=0, column=1, sticky="w", padx=(5, 20))
 
-    selection_total_var.trace_add("write", lambda *a: upd_sel_label())
+    # the page is rebuilt after menu edits; drop the trace of the old label
+    if getattr(menu_page, "selection_trace", None):
+        selection_total_var.trace_remove("write", menu_page.selection_trace)
+    menu_page.selection_trace = selection_total_var.trace_add(
+        "write", lambda *a: upd_sel_label())
 
     tk.Button(
         bottom, text="EXIT", font=BUTTON_FONT, bg="gray20", fg="white",
@@ -709,14 +878,35 @@ def build_menu_page():
         command=open_items_window
     ).grid(row=0, column=7, padx=4)
 
+    manager_btn = tk.Menubutton(
+        bottom, text="MANAGER ▾", font=BUTTON_FONT,
+        bg="#3d3d3d", fg="white", width=11, relief="raised"
+    )
+    manager_menu = tk.Menu(manager_btn, tearoff=0, font=TEXT_FONT)
+    manager_menu.add_command(label="Z-Report", command=open_zreport_window)
+    manager_menu.add_command(label="Shift & Cash Drawer",
+                             command=open_shift_window)
+    manager_menu.add_command(label="Stock & Recipes",
+                             command=open_stock_window)
+    manager_menu.add_command(label="Pricing & Combos",
+                             command=open_pricing_window)
+    manager_menu.add_command(label="Demand Forecast",
+                             command=open_forecast_window)
+    manager_menu.add_command(label="Profiling", command=open_profiler_window)
+    manager_btn.configure(menu=manager_menu)
+    manager_btn.grid(row=0, column=8, padx=4)
+
     tk.Button(
         bottom, text="NEXT →", font=BUTTON_FONT, bg=BLUE_BTN, fg="white",
         width=12, command=go_to_summary
-    ).grid(row=0, column=8, padx=(10, 0))
+    ).grid(row=0, column=9, padx=(10, 0))
+
+    load_active_tab()
+    build_tab_bar()
 
 
 def build_summary_page():
-    global paid_amount_entry
+    global paid_amount_entry, summary_page_built
 
     for w in summary_page.winfo_children():
         w.destroy()
@@ -770,6 +960,42 @@ def build_summary_page():
 
     voucher_entry.bind("<Return>", lambda e: apply_voucher())
 
+    tk.Label(voucher_frame, text="Customer Phone:",
+             bg=PANEL_BG, font=TEXT_FONT)\
+        .grid(row=2, column=0, padx=(0, 5), pady=(8, 0))
+    tk.Entry(
+        voucher_frame, textvariable=customer_entry_var,
+        font=TEXT_FONT, width=15, bg="white"
+    ).grid(row=2, column=1, padx=(0, 5), pady=(8, 0))
+    redeem_btn = tk.Button(
+        voucher_frame, text="REDEEM", font=BUTTON_FONT,
+        bg=GREEN_BTN, fg="white", width=8, command=apply_points
+    )
+    redeem_btn.grid(row=2, column=2, pady=(8, 0))
+    enroll_btn = tk.Button(
+        voucher_frame, text="ENROLL", font=BUTTON_FONT,
+        bg="#0099a8", fg="white", width=8, command=enroll_customer
+    )
+    enroll_btn.grid(row=2, column=3, padx=(5, 0), pady=(8, 0))
+    tk.Label(
+        voucher_frame, textvariable=customer_info_var, bg=PANEL_BG,
+        font=TEXT_FONT, fg="#0f5132", justify="left"
+    ).grid(row=3, column=0, columnspan=4, sticky="w", pady=(5, 0))
+
+    combo_frame = tk.Frame(left, bg="#fff3cd", padx=10, pady=6)
+    combo_frame.grid(row=3, column=0, columnspan=5, sticky="ew",
+                     padx=10, pady=(0, 10))
+    tk.Label(combo_frame, textvariable=combo_hint_var, bg="#fff3cd",
+             font=TEXT_FONT, justify="left", wraplength=420)\
+        .pack(side="left")
+    combo_btn = tk.Button(
+        combo_frame, text="USE COMBOS", font=BUTTON_FONT,
+        bg=GREEN_BTN, fg="white", command=apply_combo_suggestion
+    )
+    combo_btn.pack(side="right", padx=(10, 0))
+    combo_frame.grid_remove()
+    summary_page.combo_frame = combo_frame
+
     right = tk.Frame(outer, bg=BG_COLOR)
     right.grid(row=0, column=1, sticky="nsew")
 
@@ -805,20 +1031,24 @@ def build_summary_page():
              font=TEXT_FONT, width=15, relief="sunken", anchor="e")\
         .grid(row=3, column=1, sticky="w", padx=5, pady=3)
 
-    tk.Label(bill_panel, text="VAT (5%)", bg=PANEL_BG,
+    tk.Label(bill_panel, textvariable=promotions_var, bg=PANEL_BG,
+             font=("Segoe UI", 9), fg="green", justify="right")\
+        .grid(row=4, column=0, columnspan=2, sticky="e", padx=5)
+
+    tk.Label(bill_panel, text="VAT", bg=PANEL_BG,
              font=TEXT_FONT)\
-        .grid(row=4, column=0, sticky="e", padx=5, pady=3)
+        .grid(row=5, column=0, sticky="e", padx=5, pady=3)
     tk.Label(bill_panel, textvariable=vat_var, bg="#e5efe0",
              font=TEXT_FONT, width=15, relief="sunken", anchor="e")\
-        .grid(row=4, column=1, sticky="w", padx=5, pady=3)
+        .grid(row=5, column=1, sticky="w", padx=5, pady=3)
 
     tk.Label(bill_panel, text="Total Bill", bg=PANEL_BG,
              font=TEXT_FONT)\
-        .grid(row=5, column=0, sticky="e", padx=5, pady=8)
+        .grid(row=6, column=0, sticky="e", padx=5, pady=8)
     tk.Label(bill_panel, textvariable=total_bill_var, bg="#0f5132",
              fg="white", font=("Segoe UI", 13, "bold"),
              width=15, relief="sunken", anchor="e")\
-        .grid(row=5, column=1, sticky="w", padx=5, pady=8)
+        .grid(row=6, column=1, sticky="w", padx=5, pady=8)
 
     pay_panel = tk.Frame(right, bg=PANEL_BG,
                          bd=1, relief="solid", padx=10, pady=10)
@@ -836,11 +1066,14 @@ def build_summary_page():
     method_frame.grid(row=1, column=1, sticky="w", pady=3)
 
     methods = ["Cash", "bKash", "Nagad", "Rocket", "Card"]
+    method_buttons = []
     for m in methods:
-        tk.Radiobutton(
+        rb = tk.Radiobutton(
             method_frame, text=m, variable=payment_method_var, value=m,
             bg=PANEL_BG, font=TEXT_FONT, command=on_method_change
-        ).pack(side="left", padx=3)
+        )
+        rb.pack(side="left", padx=3)
+        method_buttons.append(rb)
 
     tk.Label(pay_panel, text="Paid Amount (Tk):",
              bg=PANEL_BG, font=TEXT_FONT)\
@@ -872,19 +1105,29 @@ def build_summary_page():
     )
     btn_complete.grid(row=5, column=0, columnspan=2, pady=5)
 
+    tk.Label(pay_panel, textvariable=payment_status_var, bg=PANEL_BG,
+             font=TEXT_FONT, fg="#0d6efd", wraplength=300)\
+        .grid(row=6, column=0, columnspan=2, pady=(0, 5))
+
     btn_back = tk.Button(
         pay_panel, text="← BACK", font=BUTTON_FONT,
         bg=BROWN_BTN, fg="white", width=26, command=show_menu_page
     )
-    btn_back.grid(row=6, column=0, columnspan=2, pady=(10, 0))
+    btn_back.grid(row=7, column=0, columnspan=2, pady=(10, 0))
 
     summary_page.summary_rows_frame = rows_frame
+    summary_page.payment_buttons = (
+        [btn_calc, btn_complete, btn_back, apply_btn, redeem_btn, enroll_btn,
+         combo_btn] + method_buttons)
+    summary_page_built = True
 
 
 def rebuild_order_summary():
     frame = summary_page.summary_rows_frame
     for w in frame.winfo_children():
         w.destroy()
+    summary_rows.clear()
+    summary_page.row_buttons = []
 
     header_row = 0
     tk.Label(frame, text="Item", bg=PANEL_BG,
@@ -905,37 +1148,34 @@ def rebuild_order_summary():
         .grid(row=header_row, column=4)
 
     row = 1
+    cart = cart_qty()
     for item in menu_items:
-        qty = item["qty_var"].get()
+        qty = cart[item.pos]
         if qty <= 0:
             continue
 
-        tk.Label(frame, text=item["name"], bg=PANEL_BG,
+        tk.Label(frame, text=item.name, bg=PANEL_BG,
                  font=TEXT_FONT, anchor="w")\
             .grid(row=row, column=0, sticky="w",
                   padx=(10, 10), pady=2)
 
-        price_display = f"{int(item['price'])} Tk" if item["price"].is_integer() else f"{item['price']:.2f} Tk"
+        price_display = f"{int(item.price)} Tk" if item.price.is_integer() else f"{item.price:.2f} Tk"
         tk.Label(frame, text=price_display, bg=PANEL_BG,
                  font=TEXT_FONT, anchor="e")\
             .grid(row=row, column=1, sticky="e", pady=2)
 
-        qty_frame = make_qty_controls(frame, item)
+        qty_frame, qty_lbl = make_qty_controls(frame, item)
         qty_frame.grid(row=row, column=2, pady=2)
+        summary_page.row_buttons += qty_frame.winfo_children()
 
         total_lbl = tk.Label(
             frame,
-            text=format_tk(item["qty_var"].get() * item["price"]),
+            text=format_tk(qty * item.price),
             bg=PANEL_BG, font=TEXT_FONT, anchor="e"
         )
         total_lbl.grid(row=row, column=3, sticky="e",
                        padx=(10, 0), pady=2)
-
-        item["qty_var"].trace_add(
-            "write",
-            lambda *args, v=item["qty_var"], p=item["price"], l=total_lbl:
-            l.configure(text=format_tk(v.get() * p))
-        )
+        summary_rows[item.pos] = (qty_lbl, total_lbl)
 
         rem_btn = tk.Button(
             frame, text="Remove", font=("Segoe UI", 9),
@@ -943,6 +1183,7 @@ def rebuild_order_summary():
             command=lambda it=item: remove_item(it)
         )
         rem_btn.grid(row=row, column=4, padx=5, pady=2)
+        summary_page.row_buttons.append(rem_btn)
 
         row += 1
 
@@ -956,10 +1197,13 @@ def rebuild_order_summary():
         ).grid(row=1, column=0, columnspan=5,
                pady=10, padx=10, sticky="w")
 
+    refresh_combo_hint()
+
 
 def remove_item(item):
-    item["qty_var"].set(0)
-    on_qty_change()
+    cart_qty()[item.pos] = 0
+    cart_pricer.set(item.pos, 0)
+    schedule_repaint(item)
     rebuild_order_summary()
 
 
@@ -1002,50 +1246,106 @@ def calculate_change():
         messagebox.showerror("Invalid amount", "Please enter a valid paid amount.")
         return
 
-    diff = paid - total
-    if diff >= 0:
-        change_due_var.set(f"Back Tk {diff:,.2f}")
-    else:
-        change_due_var.set(f"Due Tk {-diff:,.2f}")
+    change_due_var.set(change_text(paid, total))
 
 
 def apply_voucher():
     global applied_voucher_code, applied_discount_percent
 
-    subtotal = selection_total_var.get()
-    if subtotal <= 0:
-        voucher_message_var.set("No items to discount.")
+    if pending_payment is not None:
         return
-
     code = voucher_entry_var.get().strip().upper()
-    if not code:
-        voucher_message_var.set("Please enter a voucher code.")
+    percent, error = check_voucher(vouchers, code, selection_total_var.get())
+    if error:
+        voucher_message_var.set(error)
         return
 
-    v = vouchers.get(code)
-    if not v or v.get("deleted", False):
-        voucher_message_var.set("Invalid voucher code.")
-        return
+    applied_voucher_code = code
+    applied_discount_percent = percent
+    if current_pricing()["voucher_applied"]:
+        voucher_message_var.set("Voucher applied successfully.")
+    else:
+        voucher_message_var.set("Voucher not used: current promotions are "
+                                "a better price and it does not stack.")
 
-    max_uses = v.get("max_uses", 0)
-    used = v.get("used", 0)
+    calculate_totals()
 
-    if max_uses > 0 and used >= max_uses:
-        voucher_message_var.set("Voucher limit reached.")
-        return
 
-    applied_voucher_code = code
-    applied_discount_percent = v.get("discount", 0.0)
-    voucher_message_var.set("Voucher applied successfully.")
+# ---------- Loyalty ----------
+
+def on_customer_typed(*_):
+    # Runs on every keystroke: one primary-key lookup once the number is
+    # complete, a short prefix scan before that.
+    global loyalty_customer, applied_redeem_points
+    text = customer_entry_var.get()
+    phone, _error = normalize_phone(text)
+    member = loyalty.lookup(phone) if phone else None
+    if (member["phone"] if member else None) != loyalty_customer:
+        loyalty_customer = member["phone"] if member else None
+        applied_redeem_points = 0
+        calculate_totals()
+    if member:
+        customer_info_var.set(
+            f"{member['name'] or 'Member'}: {member['points']} points"
+            + (f", redeeming {applied_redeem_points}"
+               if applied_redeem_points else ""))
+    elif phone:
+        customer_info_var.set("Not a member yet - press ENROLL.")
+    else:
+        matches = loyalty.suggest(text, limit=3)
+        customer_info_var.set("  ".join(f"{p} {n}" for p, n, _pts in matches))
 
+
+customer_entry_var.trace_add("write", lambda *a: on_customer_typed())
+
+
+def apply_points():
+    # Same path as a voucher: it only changes what current_pricing() is
+    # asked for; nothing is spent until payment.
+    global applied_redeem_points
+    if pending_payment is not None:
+        return
+    if not loyalty_customer:
+        customer_info_var.set("Enter a member's phone number first.")
+        return
+    balance = loyalty.lookup(loyalty_customer)["points"]
+    if balance < MIN_REDEEM:
+        customer_info_var.set(f"{balance} points - at least {MIN_REDEEM} "
+                              "are needed to redeem.")
+        return
+    applied_redeem_points = 0
+    result = current_pricing()
+    payable = result["subtotal"] - result["discount"]
+    applied_redeem_points = min(balance, int(payable / POINT_VALUE))
     calculate_totals()
+    on_customer_typed()
+
+
+def enroll_customer():
+    phone, error = normalize_phone(customer_entry_var.get())
+    if error:
+        customer_info_var.set(error)
+        return
+    name = simpledialog.askstring("Enroll Customer", f"Name for {phone}:")
+    if name is None:
+        return
+    try:
+        loyalty.enroll(phone, name)
+    except ValueError as e:
+        customer_info_var.set(str(e))
+        return
+    customer_entry_var.set(phone)
 
 
 def payment_complete():
     global orders, vouchers, applied_voucher_code, applied_discount_percent
+    global applied_redeem_points
 
-    has_item = any(it["qty_var"].get() > 0 for it in menu_items)
-    if not has_item:
+    if pending_payment is not None:
+        return
+    flush_repaint(force=True)
+    cart = cart_qty()
+    if not any(cart):
         messagebox.showwarning("No items", "Please select at least one item.")
         return
 
@@ -1072,47 +1372,144 @@ def payment_complete():
 
     calculate_change()
 
-    items_list = []
-    for it in menu_items:
-        q = it["qty_var"].get()
-        if q <= 0:
-            continue
-        items_list.append({
-            "category": it["category"],
-            "name": it["name"],
-            "price": it["price"],
-            "qty": q,
-            "line_total": q * it["price"],
-        })
-
-    order = {
-        "datetime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "bill_no": bill_no_var.get(),
-        "employee": current_user_name,
-        "method": method,
-        "total_bill": total,
-        "paid": paid,
-        "change_or_due": change_due_var.get(),
-        "voucher_code": applied_voucher_code or "None",
-        "discount_percent": applied_discount_percent,
-        "items": items_list,
-    }
-
-    orders.append(order)
-    save_orders(orders)
+    lines = [(it.item_id, it.price_id, cart[it.pos])
+             for it in menu_items if cart[it.pos] > 0]
+    priced = current_pricing()
+    subtotal = priced["subtotal"]
+    redeemed = math.ceil(priced["redeemed"] / POINT_VALUE - 1e-9)
+    order = build_order(
+        lines, bill_no_var.get(), current_user_name, method, total, paid,
+        change_due_var.get(),
+        applied_voucher_code if priced["voucher_applied"] else None,
+        priced["discount"] / subtotal * 100.0 if subtotal else 0.0,
+        discount=priced["discount"], promotions=priced["promotions"],
+        customer=loyalty_customer, points_earned=points_for(total),
+        points_redeemed=redeemed,
+    )
 
-    if applied_voucher_code:
-        v = vouchers.get(applied_voucher_code)
-        if v:
-            v["used"] = v.get("used", 0) + 1
-            save_vouchers(vouchers)
+    # The points ledger is committed first, so a sale is never saved with a
+    # redemption the customer's balance could not cover.
+    balance = None
+    if order.get("customer"):
+        try:
+            balance = loyalty.commit_order(order)
+        except ValueError:
+            # spent at another till since REDEEM was pressed
+            applied_redeem_points = 0
+            calculate_totals()
+            on_customer_typed()
+            messagebox.showerror("Loyalty", "Those points are no longer "
+                                 "available; the bill was re-priced without "
+                                 "them.")
+            return
+
+    if method != "Cash" and total > 0:
+        start_authorization(order, balance)
+        return
+    commit_payment(order, balance)
 
-    messagebox.showinfo("Payment", "Payment successful.")
 
-    reset_transaction()
+def commit_payment(order, balance=None):
+    record_order(order, orders, vouchers, change_feed)
+    order_search.index_order(order)
+    refresh_low_stock(inventory.commit_order(order))
+    shift_ledger.commit_order(order)
+    refresh_shift_label()
+    note = ""
+    if balance is not None:
+        note = (f"\n{order['points_earned']} points earned, "
+                f"balance {balance}.")
+
+    if order.get("auth_code"):
+        note = f"\n{order['method']} ref {order['auth_code']}." + note
+
+    receipt_spooler.submit(order)
+
+    messagebox.showinfo("Payment", "Payment successful." + note)
+
+    finish_active_tab()
     show_menu_page()
 
 
+# ---------- Card / mobile wallet authorization ----------
+
+def set_payment_controls(state):
+    # Locked while a gateway decides: nothing may change the bill that is
+    # being authorized.
+    for button in summary_page.payment_buttons + summary_page.row_buttons:
+        button.configure(state=state)
+
+
+def start_authorization(order, balance=None):
+    # bKash, Nagad, Rocket and cards are authorized on the payments thread.
+    # The summary page stays up with its buttons locked, and poll_payment()
+    # picks up progress from the Tk loop until the gateway has answered.
+    global pending_payment
+    retry = failed_payment
+    if retry and all(retry[k] == order[k] for k in
+                     ("bill_no", "method", "total_bill", "lines")):
+        # the same bill again after a timeout: same key, never a 2nd charge
+        order["payment_id"] = retry["payment_id"]
+    else:
+        order["payment_id"] = new_payment_id()
+    key = payment_pipeline.submit(order["payment_id"], order["bill_no"],
+                                  order["method"], order["total_bill"])
+    pending_payment = (key, order, balance, time.perf_counter())
+    payment_status_var.set(f"Authorizing {order['method']}...")
+    set_payment_controls("disabled")
+    root.after(PAYMENT_POLL_MS, poll_payment)
+
+
+def poll_payment():
+    global pending_payment, failed_payment
+    if pending_payment is None:
+        return
+    key, order, balance, started = pending_payment
+    result = None
+    for event_key, state, info in payment_pipeline.poll():
+        if event_key != key:
+            continue
+        if state == "progress":
+            payment_status_var.set(info)
+        else:
+            result = info
+    if result is None:
+        root.after(PAYMENT_POLL_MS, poll_payment)
+        return
+
+    pending_payment = None
+    failed_payment = order if result["status"] == FAILED else None
+    set_payment_controls("normal")
+    payment_status_var.set(payment_message(result))
+    if metrics.ENABLED:
+        metrics.observe("payment_authorization",
+                        time.perf_counter() - started,
+                        failed=result["status"] != APPROVED)
+    if result["status"] != APPROVED:
+        # nothing was sold: give back the points committed for this bill
+        loyalty.revert_order(order)
+        on_customer_typed()
+        hint = ("Try another method." if result["status"] == DECLINED else
+                "Press PAYMENT COMPLETE to try again; the customer will not "
+                "be charged twice.")
+        messagebox.showerror("Payment", f"{payment_message(result)}\n{hint}")
+        return
+    order["auth_code"] = result["auth_code"]
+    commit_payment(order, balance)
+
+
+def refresh_low_stock(changed_ids):
+    # Only repaint the rows whose low-stock state actually changed.
+    if not changed_ids:
+        return
+    for item in menu_items:
+        row = menu_rows.get(item.pos)
+        if item.item_id in changed_ids and row is not None:
+            row[0].config(
+                fg="gray55" if inventory.is_low(item.item_id) else "black"
+            )
+
+
 # ---------- Voucher admin ----------
 
 def generate_voucher_code():
@@ -1160,6 +1557,12 @@ def open_voucher_admin():
     tk.Entry(win, textvariable=max_var, font=TEXT_FONT, width=10)\
         .grid(row=3, column=1, sticky="w", padx=5, pady=3)
 
+    exclusive_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(
+        win, text="Exclusive (no other promotions with it)",
+        variable=exclusive_var, bg=BG_COLOR, font=TEXT_FONT
+    ).grid(row=4, column=0, columnspan=3, sticky="w", padx=10, pady=3)
+
     def create_voucher():
         code = code_var.get().strip().upper()
         if not code:
@@ -1181,37 +1584,41 @@ def open_voucher_admin():
             "max_uses": max_uses,
             "used": 0,
             "deleted": False,
+            "exclusive": exclusive_var.get(),
         }
         save_vouchers(vouchers)
+        change_feed.emit("voucher.created", dict(vouchers[code]))
         refresh_tree()
         messagebox.showinfo("Voucher", "Voucher created.")
         regen()
         disc_var.set("")
         max_var.set("0")
+        exclusive_var.set(False)
 
     tk.Button(
         win, text="Create Voucher", font=BUTTON_FONT,
         bg=BLUE_BTN, fg="white", width=15,
         command=create_voucher
-    ).grid(row=4, column=0, columnspan=3, pady=(10, 10))
+    ).grid(row=5, column=0, columnspan=3, pady=(10, 10))
 
     tk.Label(
         win, text="Active Vouchers", bg=BG_COLOR, font=SUBTITLE_FONT
-    ).grid(row=5, column=0, columnspan=3, pady=(0, 5), padx=10, sticky="w")
+    ).grid(row=6, column=0, columnspan=3, pady=(0, 5), padx=10, sticky="w")
 
-    cols = ("code", "percent", "used", "max")
+    cols = ("code", "percent", "used", "max", "exclusive")
     tree = ttk.Treeview(win, columns=cols, show="headings", height=8)
     for c, txt, w in [
         ("code", "Code", 80),
         ("percent", "%", 60),
         ("used", "Used", 60),
         ("max", "Max", 60),
+        ("exclusive", "Exclusive", 70),
     ]:
         tree.heading(c, text=txt)
         tree.column(c, width=w, anchor="center")
-    tree.grid(row=6, column=0, columnspan=3, padx=10, pady=(0, 5), sticky="nsew")
+    tree.grid(row=7, column=0, columnspan=3, padx=10, pady=(0, 5), sticky="nsew")
 
-    win.grid_rowconfigure(6, weight=1)
+    win.grid_rowconfigure(7, weight=1)
     win.grid_columnconfigure(0, weight=1)
 
     def refresh_tree():
@@ -1224,6 +1631,7 @@ def open_voucher_admin():
                 f'{v.get("discount", 0):.1f}',
                 v.get("used", 0),
                 v.get("max_uses", 0),
+                "Yes" if v.get("exclusive") else "No",
             ))
 
     def delete_selected():
@@ -1235,8 +1643,21 @@ def open_voucher_admin():
             if code in vouchers:
                 vouchers[code]["deleted"] = True
                 save_vouchers(vouchers)
+                change_feed.emit("voucher.deleted", {"code": code})
                 refresh_tree()
 
+    def toggle_exclusive():
+        sel = tree.selection()
+        if not sel:
+            return
+        code = tree.item(sel[0], "values")[0]
+        if code in vouchers:
+            v = vouchers[code]
+            v["exclusive"] = not v.get("exclusive", False)
+            save_vouchers(vouchers)
+            change_feed.emit("voucher.updated", dict(v))
+            refresh_tree()
+
     def copy_code():
         sel = tree.selection()
         if not sel:
@@ -1248,12 +1669,16 @@ def open_voucher_admin():
         messagebox.showinfo("Copy", f"Copied voucher code: {code}")
 
     btn_frame = tk.Frame(win, bg=BG_COLOR)
-    btn_frame.grid(row=7, column=0, columnspan=3, pady=(0, 10))
+    btn_frame.grid(row=8, column=0, columnspan=3, pady=(0, 10))
 
     tk.Button(
         btn_frame, text="Delete selected", font=("Segoe UI", 9),
         bg=RED_BTN, fg="white", command=delete_selected
     ).pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="Toggle exclusive", font=("Segoe UI", 9),
+        bg="#fff3cd", command=toggle_exclusive
+    ).pack(side="left", padx=5)
     tk.Button(
         btn_frame, text="Copy", font=("Segoe UI", 9),
         bg="#e2f0fb", command=copy_code
@@ -1275,22 +1700,40 @@ def open_employee_admin():
     tk.Label(win, text="Employee Accounts", bg=BG_COLOR,
              font=SUBTITLE_FONT).pack(pady=(10, 5))
 
-    cols = ("id", "name", "password")
+    search_frame = tk.Frame(win, bg=BG_COLOR)
+    search_frame.pack(fill="x", padx=10, pady=(0, 5))
+    tk.Label(search_frame, text="Find:", bg=BG_COLOR, font=TEXT_FONT)\
+        .pack(side="left")
+    find_var = tk.StringVar()
+    find_entry = tk.Entry(search_frame, textvariable=find_var,
+                          font=TEXT_FONT, width=24)
+    find_entry.pack(side="left", padx=5)
+    count_var = tk.StringVar()
+    tk.Label(search_frame, textvariable=count_var, bg=BG_COLOR,
+             font=TEXT_FONT, fg="gray30").pack(side="right")
+
+    # passwords are stored hashed and never shown
+    cols = ("id", "name", "branch")
     tree = ttk.Treeview(win, columns=cols, show="headings", height=10)
     for c, txt, w in [
         ("id", "Employee ID", 100),
         ("name", "Name", 160),
-        ("password", "Password", 120),
+        ("branch", "Branch", 100),
     ]:
         tree.heading(c, text=txt)
         tree.column(c, width=w, anchor="center")
     tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
 
-    def refresh():
+    def refresh(event=None):
         tree.delete(*tree.get_children())
-        for emp in employees:
-            tree.insert("", "end",
-                        values=(emp["id"], emp["name"], emp["password"]))
+        rows = staff.search(find_var.get())
+        for row in rows:
+            tree.insert("", "end", values=row)
+        total = staff.count()
+        count_var.set(f"{total} employees" if len(rows) == total
+                      else f"showing {len(rows)} of {total} employees")
+
+    find_entry.bind("<Return>", refresh)
 
     form = tk.Frame(win, bg=BG_COLOR)
     form.pack(pady=(0, 10))
@@ -1310,9 +1753,15 @@ def open_employee_admin():
     tk.Label(form, text="Password:", bg=BG_COLOR, font=TEXT_FONT)\
         .grid(row=0, column=4, padx=5, pady=2)
     pwd_var = tk.StringVar()
-    tk.Entry(form, textvariable=pwd_var, font=TEXT_FONT, width=12)\
+    tk.Entry(form, textvariable=pwd_var, font=TEXT_FONT, width=12, show="*")\
         .grid(row=0, column=5, padx=5, pady=2)
 
+    tk.Label(form, text="Branch:", bg=BG_COLOR, font=TEXT_FONT)\
+        .grid(row=0, column=6, padx=5, pady=2)
+    branch_var = tk.StringVar()
+    tk.Entry(form, textvariable=branch_var, font=TEXT_FONT, width=8)\
+        .grid(row=0, column=7, padx=5, pady=2)
+
     def add_employee():
         eid = id_var.get().strip()
         nm = name_var.get().strip()
@@ -1320,11 +1769,12 @@ def open_employee_admin():
         if not eid or not nm or not pw:
             messagebox.showerror("Error", "Please fill ID, Name and Password.")
             return
-        if any(e["id"] == eid for e in employees):
-            messagebox.showerror("Error", "Employee ID already exists.")
+        try:
+            staff.add(eid, nm, pw, branch_var.get().strip())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
-        employees.append({"id": eid, "name": nm, "password": pw})
-        save_employees(employees)
+        change_feed.emit("employee.added", {"id": eid, "name": nm})
         refresh()
         id_var.set("")
         name_var.set("")
@@ -1336,10 +1786,33 @@ def open_employee_admin():
             return
         eid = tree.item(sel[0], "values")[0]
         if messagebox.askyesno("Delete", f"Delete employee {eid}?"):
-            employees[:] = [e for e in employees if e["id"] != eid]
-            save_employees(employees)
+            staff.remove(eid)
+            change_feed.emit("employee.deleted", {"id": eid})
             refresh()
 
+    def sync_roster():
+        path = filedialog.askopenfilename(
+            parent=win, title="Central roster database",
+            filetypes=[("SQLite database", "*.db"), ("All files", "*.*")])
+        if not path:
+            return
+        branch = simpledialog.askstring(
+            "Roster Sync", "This branch (leave empty to take every branch):",
+            parent=win)
+        if branch is None:
+            return
+        started = time.perf_counter()
+        try:
+            applied, version = staff.sync_from(path, branch.strip() or None)
+        except sqlite3.Error as e:
+            messagebox.showerror("Roster Sync", f"Could not read roster:\n{e}")
+            return
+        messagebox.showinfo(
+            "Roster Sync", f"{applied} changed employee(s) applied in "
+            f"{(time.perf_counter() - started) * 1000:.0f} ms "
+            f"(roster version {version}).")
+        refresh()
+
     btn_frame = tk.Frame(win, bg=BG_COLOR)
     btn_frame.pack(pady=(0, 10))
 
@@ -1353,6 +1826,11 @@ def open_employee_admin():
         bg=RED_BTN, fg="white", command=delete_selected
     ).pack(side="left", padx=5)
 
+    tk.Button(
+        btn_frame, text="Sync roster...", font=BUTTON_FONT,
+        bg="#6f42c1", fg="white", command=sync_roster
+    ).pack(side="left", padx=5)
+
     tk.Button(
         btn_frame, text="Close", font=BUTTON_FONT,
         bg=BROWN_BTN, fg="white", command=win.destroy
@@ -1364,8 +1842,11 @@ def open_employee_admin():
 # ---------- Items window (menu editor) ----------
 
 def parse_menu_block(text):
+    # Returns (items, errors); errors are (line number, line) for every line
+    # that could not be read, so nothing is dropped without the admin seeing.
     items = []
-    for line in text.splitlines():
+    errors = []
+    for n, line in enumerate(text.splitlines(), 1):
         line = line.strip()
         if not line:
             continue
@@ -1374,6 +1855,7 @@ def parse_menu_block(text):
         elif "-" in line:
             name_part, price_part = line.split("-", 1)
         else:
+            errors.append((n, line))
             continue
         name = name_part.strip()
         price_str = price_part.lower().replace("tk", "").strip()
@@ -1381,9 +1863,28 @@ def parse_menu_block(text):
         try:
             price = float(price_str)
         except ValueError:
+            errors.append((n, line))
+            continue
+        if not name:
+            errors.append((n, line))
             continue
         items.append((name, price))
-    return items
+    return items, errors
+
+
+def reload_menu(old_menu):
+    # After any menu edit: rebuild the menu page and publish what changed.
+    global menu_data
+    menu_data = load_menu_data()
+    save_active_tab()
+    build_menu_page()
+    for cat in CATEGORIES:
+        if menu_data[cat] != old_menu.get(cat, []):
+            change_feed.emit("menu.updated", {
+                "category": cat,
+                "items": [[it.item_id, it.price_id, it.name, it.price]
+                          for it in menu_items if it.category == cat],
+            })
 
 
 def open_items_window():
@@ -1413,28 +1914,493 @@ def open_items_window():
         text_widgets[cat] = txt
 
     def save_items():
-        global menu_data
+        parsed = {}
+        bad = []
         for cat in CATEGORIES:
             raw = text_widgets[cat].get("1.0", "end-1c")
-            items = parse_menu_block(raw)
-            update_menu_category(cat, items)
+            parsed[cat], errors = parse_menu_block(raw)
+            bad += [f"{cat}, line {n}: {line}" for n, line in errors]
+        if bad:
+            messagebox.showerror(
+                "Items", "These lines are not 'Name — price', nothing was "
+                "saved:\n\n" + "\n".join(bad[:15])
+                + (f"\n... and {len(bad) - 15} more" if len(bad) > 15 else ""))
+            return
 
-        menu_data = load_menu_data()
-        build_menu_page()
+        for cat in CATEGORIES:
+            update_menu_category(cat, parsed[cat])
+        reload_menu(menu_data)
         messagebox.showinfo("Items", "Menu updated successfully.")
 
+    def import_items():
+        path = filedialog.askopenfilename(
+            parent=win, title="Import menu",
+            filetypes=[("Menu files", "*.csv *.json *.jsonl"),
+                       ("All files", "*.*")])
+        if not path:
+            return
+        report = menuio.import_menu(path, apply=False)
+        if report["errors"]:
+            messagebox.showerror("Import menu", menuio.format_report(report))
+            return
+        if not messagebox.askyesno(
+                "Import menu",
+                menuio.format_report(report) + "\n\nApply these changes?"):
+            return
+        report = menuio.import_menu(path)
+        if report["errors"]:
+            messagebox.showerror("Import menu", menuio.format_report(report))
+            return
+        reload_menu(menu_data)
+        win.destroy()
+        messagebox.showinfo("Import menu", menuio.format_report(report))
+
+    def export_items():
+        path = filedialog.asksaveasfilename(
+            parent=win, title="Export menu", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON", "*.json"),
+                       ("JSON lines", "*.jsonl")])
+        if not path:
+            return
+        try:
+            n = menuio.export_menu(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Export menu", str(e))
+            return
+        messagebox.showinfo("Export menu", f"Exported {n} items to {path}")
+
     btn_frame = tk.Frame(win, bg=BG_COLOR)
     btn_frame.pack(pady=5)
     tk.Button(
         btn_frame, text="Save", font=BUTTON_FONT,
         bg=BLUE_BTN, fg="white", width=10, command=save_items
     ).pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="Import…", font=BUTTON_FONT,
+        bg=GREEN_BTN, fg="white", width=10, command=import_items
+    ).pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="Export…", font=BUTTON_FONT,
+        bg=GREEN_BTN, fg="white", width=10, command=export_items
+    ).pack(side="left", padx=5)
     tk.Button(
         btn_frame, text="Close", font=BUTTON_FONT,
         bg=BROWN_BTN, fg="white", width=10, command=win.destroy
     ).pack(side="left", padx=5)
 
 
+# ---------- Stock & recipes ----------
+
+def open_stock_window():
+    if not ask_admin_password("Admin password for stock management:"):
+        return
+
+    win = tk.Toplevel(root)
+    win.title("Stock & Recipes")
+    win.configure(bg=BG_COLOR)
+    win.geometry("640x480")
+
+    nb = ttk.Notebook(win)
+    nb.pack(fill="both", expand=True, padx=5, pady=5)
+
+    # --- stock tab ---
+    stock_tab = tk.Frame(nb, bg=BG_COLOR)
+    nb.add(stock_tab, text="Stock")
+
+    cols = ("name", "unit", "stock", "low")
+    tree = ttk.Treeview(stock_tab, columns=cols, show="headings", height=12)
+    for c, txt, w in [
+        ("name", "Ingredient", 200),
+        ("unit", "Unit", 80),
+        ("stock", "In Stock", 100),
+        ("low", "Low Level", 100),
+    ]:
+        tree.heading(c, text=txt)
+        tree.column(c, width=w, anchor="center")
+    tree.tag_configure("low", foreground=RED_BTN)
+    tree.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+
+    def refresh():
+        tree.delete(*tree.get_children())
+        for name in sorted(inventory.stock):
+            level = inventory.stock[name]
+            low = inventory.low_level.get(name, 0.0)
+            tree.insert("", "end", iid=name,
+                        tags=(("low",) if level <= low else ()),
+                        values=(name, inventory.units.get(name, ""),
+                                f"{level:g}", f"{low:g}"))
+
+    form = tk.Frame(stock_tab, bg=BG_COLOR)
+    form.pack(pady=(0, 10))
+
+    tk.Label(form, text="Quantity:", bg=BG_COLOR, font=TEXT_FONT)\
+        .grid(row=0, column=0, padx=5)
+    qty_var = tk.StringVar()
+    tk.Entry(form, textvariable=qty_var, font=TEXT_FONT, width=8)\
+        .grid(row=0, column=1, padx=5)
+
+    def selected_ingredient():
+        sel = tree.selection()
+        if not sel:
+            messagebox.showerror("Error", "Please select an ingredient.")
+            return None
+        return sel[0]
+
+    def read_qty():
+        try:
+            return float(qty_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid quantity.")
+            return None
+
+    def receive():
+        ing = selected_ingredient()
+        q = read_qty() if ing else None
+        if q is None:
+            return
+        refresh_low_stock(inventory.receive(ing, q))
+        refresh()
+        qty_var.set("")
+
+    def set_low():
+        ing = selected_ingredient()
+        q = read_qty() if ing else None
+        if q is None:
+            return
+        refresh_low_stock(inventory.set_low_level(ing, q))
+        refresh()
+        qty_var.set("")
+
+    tk.Button(
+        form, text="Receive", font=BUTTON_FONT,
+        bg=GREEN_BTN, fg="white", width=10, command=receive
+    ).grid(row=0, column=2, padx=5)
+    tk.Button(
+        form, text="Set Low Level", font=BUTTON_FONT,
+        bg=BLUE_BTN, fg="white", width=12, command=set_low
+    ).grid(row=0, column=3, padx=5)
+
+    # --- recipes tab ---
+    recipe_tab = tk.Frame(nb, bg=BG_COLOR)
+    nb.add(recipe_tab, text="Recipes")
+
+    tk.Label(recipe_tab, text="Item: Ingredient x qty; Ingredient x qty",
+             bg=BG_COLOR, font=TEXT_FONT, fg="gray30")\
+        .pack(anchor="w", padx=5, pady=(5, 0))
+    if inventory.unmatched:
+        tk.Label(recipe_tab, fg="firebrick", bg=BG_COLOR, font=TEXT_FONT,
+                 wraplength=600, justify="left",
+                 text="No menu item for these recipes; saving drops them: "
+                      + ", ".join(sorted(inventory.unmatched)))\
+            .pack(anchor="w", padx=5)
+    txt = tk.Text(recipe_tab, font=("Consolas", 11), wrap="none")
+    txt.pack(fill="both", expand=True, padx=5, pady=5)
+    txt.insert("1.0", format_recipes(inventory.recipes, item_names()))
+
+    def save_recipes():
+        recipes, errors = parse_recipes(txt.get("1.0", "end-1c"), item_ids())
+        if errors:
+            messagebox.showerror("Recipes", "\n".join(errors[:15]))
+            return
+        refresh_low_stock(inventory.set_recipes(recipes))
+        refresh()
+        messagebox.showinfo("Recipes", "Recipes saved.")
+
+    tk.Button(
+        recipe_tab, text="Save", font=BUTTON_FONT,
+        bg=BLUE_BTN, fg="white", width=10, command=save_recipes
+    ).pack(pady=(0, 10))
+
+    refresh()
+
+
+# ---------- Pricing rules ----------
+
+def open_pricing_window():
+    if not ask_admin_password("Admin password for pricing rules:"):
+        return
+
+    win = tk.Toplevel(root)
+    win.title("Pricing Rules & Combos")
+    win.configure(bg=BG_COLOR)
+    win.geometry("640x520")
+
+    nb = ttk.Notebook(win)
+    nb.pack(fill="both", expand=True, padx=5, pady=5)
+
+    # --- rules tab ---
+    rules_tab = tk.Frame(nb, bg=BG_COLOR)
+    nb.add(rules_tab, text="Rules")
+
+    tk.Label(rules_tab, text="Rules (JSON list): vat, happy_hour, buy_x_get_y, "
+                             "min_spend - see pricing.py",
+             bg=BG_COLOR, font=TEXT_FONT, fg="gray30")\
+        .pack(anchor="w", padx=5, pady=(5, 0))
+    txt = tk.Text(rules_tab, font=("Consolas", 11), wrap="none")
+    txt.pack(fill="both", expand=True, padx=5, pady=5)
+    txt.insert("1.0", json.dumps(pricing_rules, indent=2, ensure_ascii=False))
+
+    status_var = tk.StringVar(value="Active: " + "; ".join(describe_rules(pricing_rules)))
+    tk.Label(rules_tab, textvariable=status_var, bg=BG_COLOR,
+             font=("Segoe UI", 9), wraplength=600, justify="left")\
+        .pack(anchor="w", padx=5)
+
+    def save():
+        global pricing_rules
+        try:
+            rules = json.loads(txt.get("1.0", "end-1c"))
+            if not isinstance(rules, list):
+                raise ValueError("expected a JSON list of rules")
+            compile_rules(rules, menu_items)
+        except ValueError as e:
+            messagebox.showerror("Pricing Rules", str(e))
+            return
+        save_rules(rules)
+        pricing_rules = rules
+        compile_pricing()
+        calculate_totals()
+        status_var.set("Active: " + "; ".join(describe_rules(rules)))
+        messagebox.showinfo("Pricing Rules", "Pricing rules saved.")
+
+    tk.Button(
+        rules_tab, text="Save", font=BUTTON_FONT,
+        bg=BLUE_BTN, fg="white", width=10, command=save
+    ).pack(pady=(5, 10))
+
+    # --- combos tab ---
+    combo_tab = tk.Frame(nb, bg=BG_COLOR)
+    nb.add(combo_tab, text="Combos")
+
+    tk.Label(combo_tab, text="Combo: Item x qty; Item x qty",
+             bg=BG_COLOR, font=TEXT_FONT, fg="gray30")\
+        .pack(anchor="w", padx=5, pady=(5, 0))
+    if unmatched_combos:
+        tk.Label(combo_tab, fg="firebrick", bg=BG_COLOR, font=TEXT_FONT,
+                 wraplength=600, justify="left",
+                 text="No menu item for these combos; saving drops them: "
+                      + ", ".join(sorted(unmatched_combos)))\
+            .pack(anchor="w", padx=5)
+    combo_txt = tk.Text(combo_tab, font=("Consolas", 11), wrap="none")
+    combo_txt.pack(fill="both", expand=True, padx=5, pady=5)
+    combo_txt.insert("1.0", format_combos(combos, item_names()))
+
+    def save_combo_map():
+        parsed, errors = parse_combos(combo_txt.get("1.0", "end-1c"),
+                                      {it.name: it.item_id for it in menu_items})
+        if errors:
+            messagebox.showerror("Combos", "\n".join(errors[:15]))
+            return
+        save_combos(parsed)
+        combos.clear()
+        combos.update(parsed)
+        unmatched_combos.clear()
+        refresh_combo_hint()
+        messagebox.showinfo("Combos", "Combos saved.")
+
+    tk.Button(
+        combo_tab, text="Save", font=BUTTON_FONT,
+        bg=BLUE_BTN, fg="white", width=10, command=save_combo_map
+    ).pack(pady=(5, 10))
+
+
+# ---------- Demand forecast ----------
+
+def open_forecast_window():
+    try:
+        import forecast
+    except ImportError:
+        messagebox.showerror("Forecast", "Demand forecasting needs NumPy.\n"
+                             "Install it with: pip install numpy")
+        return
+
+    win = tk.Toplevel(root)
+    win.title("Demand Forecast")
+    win.configure(bg=BG_COLOR)
+    win.geometry("760x620")
+
+    top = tk.Frame(win, bg=BG_COLOR)
+    top.pack(fill="x", padx=10, pady=(10, 5))
+
+    tk.Label(top, text="Item:", bg=BG_COLOR, font=TEXT_FONT)\
+        .pack(side="left")
+    item_var = tk.StringVar()
+    item_box = ttk.Combobox(top, textvariable=item_var, state="readonly",
+                            width=32, font=TEXT_FONT)
+    item_box.pack(side="left", padx=5)
+
+    high_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(top, text="Prep level (p80)", variable=high_var,
+                   bg=BG_COLOR, font=TEXT_FONT,
+                   command=lambda: show_item())\
+        .pack(side="left", padx=10)
+
+    status_var = tk.StringVar()
+    tk.Label(win, textvariable=status_var, bg=BG_COLOR, font=TEXT_FONT,
+             fg="gray30").pack(anchor="w", padx=10)
+
+    cols = ["hour"] + forecast.WEEKDAYS
+    tree = ttk.Treeview(win, columns=cols, show="headings", height=18)
+    tree.heading("hour", text="Hour")
+    tree.column("hour", width=70, anchor="center")
+    for d in forecast.WEEKDAYS:
+        tree.heading(d, text=d)
+        tree.column(d, width=80, anchor="center")
+    tree.pack(fill="both", expand=True, padx=10, pady=5)
+
+    state = {"model": None}
+
+    def show_item(*_):
+        model = state["model"]
+        tree.delete(*tree.get_children())
+        if model is None or not item_var.get():
+            return
+        profile = forecast.weekly_profile(model, item_var.get(),
+                                          high=high_var.get())
+        for hour in range(24):
+            row = profile[:, hour]
+            if not row.any():
+                continue
+            tree.insert("", "end", values=[f"{hour:02d}:00"] +
+                        [f"{v:.1f}" for v in row])
+
+    def retrain():
+        started = datetime.now()
+        # archived months as well, not just the live order file
+        model = forecast.fit(history.iter_history(live=orders))
+        forecast.save_model(model)
+        state["model"] = model
+        took = (datetime.now() - started).total_seconds()
+        mae = "n/a" if model["mae"] is None else f"{model['mae']:.2f}"
+        status_var.set(f"Trained on {model['days']} days of history in "
+                       f"{took:.2f}s   (last-week error per slot: {mae})")
+        item_box.configure(values=model["items"])
+        if model["items"] and item_var.get() not in model["items"]:
+            item_var.set(model["items"][0])
+        show_item()
+
+    item_box.bind("<<ComboboxSelected>>", show_item)
+
+    btn_frame = tk.Frame(win, bg=BG_COLOR)
+    btn_frame.pack(pady=(0, 10))
+    tk.Button(
+        btn_frame, text="Retrain", font=BUTTON_FONT,
+        bg=BLUE_BTN, fg="white", width=10, command=retrain
+    ).pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="Close", font=BUTTON_FONT,
+        bg=BROWN_BTN, fg="white", width=10, command=win.destroy
+    ).pack(side="left", padx=5)
+
+    retrain()
+
+
+# ---------- Profiling mode ----------
+
+def open_profiler_window():
+    if not ask_admin_password("Admin password for profiling mode:"):
+        return
+
+    win = tk.Toplevel(root)
+    win.title("Action Profiling")
+    win.configure(bg=BG_COLOR)
+    win.geometry("760x560")
+
+    status_var = tk.StringVar()
+    tk.Label(win, textvariable=status_var, bg=BG_COLOR,
+             font=TEXT_FONT).pack(pady=(10, 5))
+
+    def make_table(title, cols):
+        tk.Label(win, text=title, bg=BG_COLOR, font=SUBTITLE_FONT)\
+            .pack(anchor="w", padx=10)
+        tree = ttk.Treeview(win, columns=[c for c, _, _ in cols],
+                            show="headings", height=7)
+        for c, txt, w in cols:
+            tree.heading(c, text=txt)
+            tree.column(c, width=w, anchor="center")
+        tree.pack(fill="both", expand=True, padx=10, pady=(0, 5))
+        return tree
+
+    slow_tree = make_table("Slowest actions", [
+        ("action", "Action", 300), ("calls", "Calls", 60),
+        ("p95", "p95 ms", 90), ("max", "Max ms", 90),
+    ])
+    heavy_tree = make_table("Allocation-heavy actions", [
+        ("action", "Action", 300), ("calls", "Calls", 60),
+        ("peak", "Peak KB", 90), ("net", "Net KB", 90),
+    ])
+
+    def refresh():
+        active = action_profiler.is_active()
+        status_var.set("Profiling is ON - every UI action is recorded."
+                       if active else "Profiling is off.")
+        switch_var.set("Login / cashier switch: " + ", ".join(
+            f"{kind} {seconds * 1000:.0f} ms"
+            for kind, seconds in list(session_switches)[-5:]))
+        toggle_btn.configure(text="STOP PROFILING" if active
+                             else "START PROFILING",
+                             bg=RED_BTN if active else GREEN_BTN)
+        rows = action_profiler.summarize(action_profiler.load_records())
+        slow_tree.delete(*slow_tree.get_children())
+        for r in action_profiler.slowest(rows):
+            slow_tree.insert("", "end", values=(
+                r["action"], r["calls"], f'{r["p95_ms"]:.1f}',
+                f'{r["max_ms"]:.1f}'))
+        heavy_tree.delete(*heavy_tree.get_children())
+        for r in action_profiler.heaviest(rows):
+            heavy_tree.insert("", "end", values=(
+                r["action"], r["calls"], f'{r["max_peak_kb"]:.1f}',
+                f'{r["total_net_kb"]:.1f}'))
+
+    def toggle():
+        if action_profiler.is_active():
+            action_profiler.stop()
+        else:
+            action_profiler.start()
+        refresh()
+
+    switch_var = tk.StringVar()
+    tk.Label(win, textvariable=switch_var, bg=BG_COLOR, font=("Consolas", 10),
+             justify="left").pack(anchor="w", padx=10)
+
+    burst_var = tk.StringVar()
+    tk.Label(win, textvariable=burst_var, bg=BG_COLOR, font=("Consolas", 10),
+             justify="left").pack(anchor="w", padx=10)
+
+    def show_burst(results):
+        if not win.winfo_exists():
+            return
+        burst_var.set("\n".join(
+            f"{r['mode']:<12} {r['clicks']} clicks, {r['repaints']} repaints, "
+            f"event-to-paint p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms, "
+            f"max {r['max_ms']:.1f} ms, busy {r['busy_ms']:.0f} ms"
+            for r in results) or "No menu items to click.")
+
+    def click_burst():
+        burst_var.set("Clicking...")
+        run_click_burst(show_burst)
+
+    btn_frame = tk.Frame(win, bg=BG_COLOR)
+    btn_frame.pack(pady=(0, 10))
+    toggle_btn = tk.Button(
+        btn_frame, font=BUTTON_FONT, fg="white", width=16, command=toggle
+    )
+    toggle_btn.pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="Refresh", font=BUTTON_FONT,
+        bg=BLUE_BTN, fg="white", width=10, command=refresh
+    ).pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="100-click burst", font=BUTTON_FONT,
+        bg=BROWN_BTN, fg="white", width=14, command=click_burst
+    ).pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="Close", font=BUTTON_FONT,
+        bg=BROWN_BTN, fg="white", width=10, command=win.destroy
+    ).pack(side="left", padx=5)
+
+    refresh()
+
+
 # ---------- Order history ----------
 
 def open_history_window():
@@ -1446,6 +2412,23 @@ def open_history_window():
     tk.Label(win, text="Order History", bg=BG_COLOR,
              font=SUBTITLE_FONT).pack(pady=(10, 5))
 
+    # item:"beef rezala"  staff:rahim  voucher:EID*  bill:1042  has:voucher
+    search_bar = tk.Frame(win, bg=BG_COLOR)
+    search_bar.pack(fill="x", padx=10, pady=(0, 5))
+    query_var = tk.StringVar()
+    from_var = tk.StringVar()
+    to_var = tk.StringVar()
+    tk.Label(search_bar, text="Search:", bg=BG_COLOR,
+             font=TEXT_FONT).pack(side="left")
+    query_entry = tk.Entry(search_bar, textvariable=query_var,
+                           font=TEXT_FONT, width=28)
+    query_entry.pack(side="left", padx=(5, 10))
+    for text, var in (("From:", from_var), ("To:", to_var)):
+        tk.Label(search_bar, text=text, bg=BG_COLOR,
+                 font=TEXT_FONT).pack(side="left")
+        tk.Entry(search_bar, textvariable=var, font=TEXT_FONT,
+                 width=11).pack(side="left", padx=(5, 10))
+
     cols = ("datetime", "bill", "employee", "method", "total", "voucher")
     tree = ttk.Treeview(win, columns=cols, show="headings")
     tree.pack(fill="both", expand=True, padx=10, pady=(0, 5))
@@ -1465,6 +2448,22 @@ def open_history_window():
     count_by_method = {"Cash": 0, "bKash": 0, "Nagad": 0,
                        "Rocket": 0, "Card": 0}
 
+    # Archived months come from the segment indexes; their bodies are only
+    # read when a row is opened.
+    archived = history.history_headers()
+    for n, (period, row) in enumerate(archived):
+        h = history.header_dict(row)
+        tree.insert("", "end", iid=f"a{n}", values=(
+            h["datetime"],
+            h["bill_no"],
+            h["employee"],
+            h["method"],
+            f'{h["total_bill"] or 0:.2f}',
+            h["voucher_code"],
+        ))
+        if h["method"] in count_by_method:
+            count_by_method[h["method"]] += 1
+
     for idx, o in enumerate(orders):
         tree.insert("", "end", iid=str(idx), values=(
             o.get("datetime", ""),
@@ -1478,19 +2477,90 @@ def open_history_window():
         if m in count_by_method:
             count_by_method[m] += 1
 
-    summary = f"Total orders: {len(orders)}"
+    summary = f"Total orders: {len(archived) + len(orders)}"
     for m in ["Cash", "bKash", "Nagad", "Rocket", "Card"]:
         summary += f"   {m}: {count_by_method[m]}"
 
-    tk.Label(win, text=summary, bg=BG_COLOR,
+    summary_var = tk.StringVar(value=summary)
+    tk.Label(win, textvariable=summary_var, bg=BG_COLOR,
              font=TEXT_FONT).pack(pady=(0, 5))
+    cache_var = tk.StringVar()
+    tk.Label(win, textvariable=cache_var, bg=BG_COLOR,
+             font=("Segoe UI", 9)).pack(pady=(0, 5))
+
+    def show_cache_stats():
+        st = order_cache.stats()
+        cache_var.set(f"Details cache: {st['hits']} hits, {st['misses']} misses "
+                      f"({st['hit_rate']:.0%}), {st['cached']}/{st['size']} orders")
+
+    listed = tree.get_children()
+    hits = []
+
+    def run_search(event=None):
+        query = query_var.get().strip()
+        first_day = from_var.get().strip() or None
+        last_day = to_var.get().strip() or None
+        if not (query or first_day or last_day):
+            clear_search()
+            return
+        started = time.perf_counter()
+        try:
+            hits[:] = order_search.search(query, first_day, last_day)
+        except sqlite3.OperationalError as e:
+            messagebox.showerror("Search", f"Could not search for that:\n{e}")
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        drop_results()
+        tree.detach(*tree.get_children())
+        for n, (when, bill, staff, method, total, voucher) in enumerate(hits):
+            tree.insert("", "end", iid=f"s{n}", values=(
+                when, bill, staff, method, f"{total:.2f}", voucher or "None"))
+        summary_var.set(f"{len(hits)} matching orders ({elapsed:.1f} ms)")
+
+    def drop_results():
+        tree.delete(*[iid for iid in tree.get_children() if iid.startswith("s")])
+
+    def clear_search():
+        drop_results()
+        for iid in listed:
+            tree.reattach(iid, "", "end")
+        hits.clear()
+        query_var.set("")
+        from_var.set("")
+        to_var.set("")
+        summary_var.set(summary)
+
+    query_entry.bind("<Return>", run_search)
+    tk.Button(search_bar, text="Search", font=BUTTON_FONT, bg=BLUE_BTN,
+              fg="white", command=run_search).pack(side="left", padx=(0, 5))
+    tk.Button(search_bar, text="Clear", font=BUTTON_FONT, bg=BROWN_BTN,
+              fg="white", command=clear_search).pack(side="left")
 
     def show_order_details(event=None):
         sel = tree.selection()
         if not sel:
             return
-        idx = int(sel[0])
-        order = orders[idx]
+        # Bodies come through the LRU cache; the tree only holds headers.
+        if sel[0].startswith("s"):
+            when, bill = hits[int(sel[0][1:])][:2]
+            load = lambda: locate(when, bill, orders)
+        elif sel[0].startswith("a"):
+            period, row = archived[int(sel[0][1:])]
+            when, bill = row[0], str(row[1])
+            load = lambda: history.fetch_order(period, row)
+        else:
+            idx = int(sel[0])
+            when, bill = orders[idx].get("datetime", ""), str(orders[idx].get("bill_no", ""))
+            load = lambda: orders[idx]
+        try:
+            order = order_cache.get((when, bill), load)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not read archived order:\n{e}")
+            return
+        show_cache_stats()
+        if order is None:
+            messagebox.showerror("Error", "That order is no longer in history.")
+            return
 
         detail = tk.Toplevel(win)
         detail.title(f"Bill {order.get('bill_no', '')} details")
@@ -1513,7 +2583,7 @@ def open_history_window():
             tree2.heading(c, text=txt)
             tree2.column(c, width=w, anchor="center")
 
-        for it in order.get("items", []):
+        for it in order_lines(order):
             tree2.insert("", "end", values=(
                 it.get("name", ""),
                 format_item_price(it.get("price", 0)),
@@ -1528,6 +2598,369 @@ def open_history_window():
         ).pack(pady=(0, 10))
 
     tree.bind("<Double-1>", show_order_details)
+    show_cache_stats()
+
+
+# ---------- End-of-day Z-report ----------
+
+def open_zreport_window():
+    if not ask_admin_password("Admin password for end-of-day Z-report:"):
+        return
+
+    win = tk.Toplevel(root)
+    win.title("End-of-day Z-report")
+    win.configure(bg=BG_COLOR)
+    win.geometry("640x560")
+
+    form = tk.Frame(win, bg=BG_COLOR)
+    form.pack(pady=(10, 5))
+
+    day_var = tk.StringVar(value=datetime.now().strftime("%Y-%m-%d"))
+    float_var = tk.StringVar(value="0")
+    counted_var = tk.StringVar()
+
+    for col, (label, var, width) in enumerate([
+        ("Date (YYYY-MM-DD):", day_var, 12),
+        ("Opening float:", float_var, 8),
+        ("Counted cash:", counted_var, 10),
+    ]):
+        tk.Label(form, text=label, bg=BG_COLOR, font=TEXT_FONT)\
+            .grid(row=0, column=col * 2, padx=(5, 2), pady=2)
+        tk.Entry(form, textvariable=var, font=TEXT_FONT, width=width)\
+            .grid(row=0, column=col * 2 + 1, padx=(0, 5), pady=2)
+
+    txt = tk.Text(win, font=("Consolas", 10), wrap="none")
+    txt.pack(fill="both", expand=True, padx=10, pady=5)
+
+    report = {}
+
+    def run_report():
+        try:
+            opening = float(float_var.get().strip() or "0")
+            counted_text = counted_var.get().strip()
+            counted = float(counted_text) if counted_text else None
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid cash amounts.")
+            return
+        report.clear()
+        day = day_var.get().strip()
+        report.update(build_zreport(day, opening, counted,
+                                    orders=history.iter_history(
+                                        first_day=day, last_day=day,
+                                        live=orders)))
+        txt.delete("1.0", "end")
+        txt.insert("1.0", format_zreport(report))
+
+    def export():
+        if not report:
+            run_report()
+        if report:
+            paths = export_zreport(report)
+            messagebox.showinfo("Z-report", "Exported to:\n" + "\n".join(paths))
+
+    btn_frame = tk.Frame(win, bg=BG_COLOR)
+    btn_frame.pack(pady=(0, 10))
+    tk.Button(
+        btn_frame, text="Run", font=BUTTON_FONT,
+        bg=BLUE_BTN, fg="white", width=10, command=run_report
+    ).pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="Export", font=BUTTON_FONT,
+        bg=GREEN_BTN, fg="white", width=10, command=export
+    ).pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="Close", font=BUTTON_FONT,
+        bg=BROWN_BTN, fg="white", width=10, command=win.destroy
+    ).pack(side="left", padx=5)
+
+    run_report()
+
+
+# ---------- Reservations ----------
+
+def seat_reservation(rid):
+    # The party has arrived: open a tab for their table on the menu page.
+    r = reservations.seat(rid)
+    save_active_tab()
+    name = r["table"]
+    if name in tab_book.tabs:
+        name = f"{r['table']} ({r['guest']})"
+    tab = tab_book.open(name)
+    tab.reservation_id = rid
+    load_active_tab()
+    build_tab_bar()
+    show_menu_page()
+
+
+def open_reservations_window():
+    win = tk.Toplevel(root)
+    win.title("Table Bookings")
+    win.configure(bg=BG_COLOR)
+    win.geometry("820x560")
+
+    top = tk.Frame(win, bg=BG_COLOR)
+    top.pack(fill="x", padx=10, pady=(10, 5))
+    tk.Label(top, text="Day (YYYY-MM-DD):", bg=BG_COLOR, font=TEXT_FONT)\
+        .pack(side="left")
+    day_var = tk.StringVar(value=datetime.now().strftime("%Y-%m-%d"))
+    day_entry = tk.Entry(top, textvariable=day_var, font=TEXT_FONT, width=12)
+    day_entry.pack(side="left", padx=5)
+
+    cols = ("id", "time", "table", "guest", "party", "phone", "status")
+    tree = ttk.Treeview(win, columns=cols, show="headings", height=12)
+    for c, title, w in [
+        ("id", "#", 40), ("time", "Time", 110), ("table", "Table", 110),
+        ("guest", "Guest", 160), ("party", "Party", 50),
+        ("phone", "Phone", 110), ("status", "Status", 80),
+    ]:
+        tree.heading(c, text=title)
+        tree.column(c, width=w, anchor="center")
+    tree.pack(fill="both", expand=True, padx=10, pady=(0, 5))
+
+    form = tk.Frame(win, bg=BG_COLOR)
+    form.pack(pady=(0, 5))
+    guest_var = tk.StringVar()
+    phone_var = tk.StringVar()
+    party_var = tk.StringVar(value="2")
+    time_var = tk.StringVar(value="20:00")
+    minutes_var = tk.StringVar(value=str(DEFAULT_MINUTES))
+    table_var = tk.StringVar(value="Any")
+    for col, (label, var, width) in enumerate([
+        ("Guest:", guest_var, 14), ("Phone:", phone_var, 12),
+        ("Party:", party_var, 4), ("Time:", time_var, 6),
+        ("Minutes:", minutes_var, 5),
+    ]):
+        tk.Label(form, text=label, bg=BG_COLOR, font=TEXT_FONT)\
+            .grid(row=0, column=col * 2, padx=(5, 2), pady=2)
+        tk.Entry(form, textvariable=var, font=TEXT_FONT, width=width)\
+            .grid(row=0, column=col * 2 + 1, padx=(0, 5), pady=2)
+    tk.Label(form, text="Table:", bg=BG_COLOR, font=TEXT_FONT)\
+        .grid(row=1, column=0, padx=(5, 2), pady=2)
+    ttk.Combobox(form, textvariable=table_var, state="readonly", width=14,
+                 values=["Any"] + [f"{name}" for name in reservations.tables])\
+        .grid(row=1, column=1, columnspan=3, sticky="w", pady=2)
+
+    msg_var = tk.StringVar()
+    tk.Label(win, textvariable=msg_var, bg=BG_COLOR, font=TEXT_FONT,
+             fg="#0f5132").pack()
+
+    def refresh(event=None):
+        tree.delete(*tree.get_children())
+        for rid, start, end, table, guest, party, phone, status in \
+                reservations.day(day_var.get().strip()):
+            tree.insert("", "end", iid=str(rid), values=(
+                rid, f"{start[11:]}-{end[11:]}", table, guest, party, phone,
+                status))
+
+    def read_slot():
+        try:
+            party = int(party_var.get())
+        except ValueError:
+            msg_var.set("Party size must be a number.")
+            return None
+        start, end, error = parse_slot(day_var.get(), time_var.get(),
+                                       minutes_var.get() or DEFAULT_MINUTES)
+        if error:
+            msg_var.set(error)
+            return None
+        return party, start, end
+
+    def find_free():
+        slot = read_slot()
+        if slot:
+            free = reservations.free_tables(*slot)
+            msg_var.set("Free: " + ", ".join(
+                f"{t} ({reservations.tables[t]})" for t in free)
+                if free else "No table that size is free then.")
+
+    def book():
+        slot = read_slot()
+        if not slot:
+            return
+        party, start, end = slot
+        table = None if table_var.get() == "Any" else table_var.get()
+        try:
+            rid, table = reservations.book(guest_var.get(), party, start, end,
+                                           table, phone_var.get())
+        except ValueError as e:
+            msg_var.set(str(e))
+            return
+        msg_var.set(f"Booked #{rid}: {table}, {start[11:]}-{end[11:]}.")
+        guest_var.set("")
+        phone_var.set("")
+        refresh()
+
+    def selected_id():
+        sel = tree.selection()
+        return int(sel[0]) if sel else None
+
+    def seat():
+        rid = selected_id()
+        if rid is None:
+            return
+        try:
+            seat_reservation(rid)
+        except ValueError as e:
+            msg_var.set(str(e))
+            return
+        win.destroy()
+
+    def cancel():
+        rid = selected_id()
+        if rid is None or not messagebox.askyesno(
+                "Cancel Booking", f"Cancel reservation #{rid}?", parent=win):
+            return
+        try:
+            reservations.cancel(rid)
+        except ValueError as e:
+            msg_var.set(str(e))
+        refresh()
+
+    day_entry.bind("<Return>", refresh)
+    tree.bind("<Double-1>", lambda e: seat())
+
+    btn_frame = tk.Frame(win, bg=BG_COLOR)
+    btn_frame.pack(pady=(0, 10))
+    for text, color, command in [
+        ("Show day", BLUE_BTN, refresh),
+        ("Find free", BLUE_BTN, find_free),
+        ("Book", GREEN_BTN, book),
+        ("Seat selected", "#198754", seat),
+        ("Cancel booking", RED_BTN, cancel),
+        ("Close", BROWN_BTN, win.destroy),
+    ]:
+        tk.Button(btn_frame, text=text, font=BUTTON_FONT, bg=color,
+                  fg="white", command=command).pack(side="left", padx=4)
+
+    refresh()
+
+
+# ---------- Shift / cash drawer ----------
+
+def refresh_shift_label():
+    if shift_ledger.is_open():
+        shift = shift_ledger.current
+        shift_label_var.set(f"Shift #{shift['id']} | Cash in drawer: "
+                            f"{format_tk(shift_ledger.expected_cash())}")
+    else:
+        shift_label_var.set("No shift open")
+
+
+def open_shift_window():
+    if not ask_admin_password("Admin password for shift & cash drawer:"):
+        return
+
+    win = tk.Toplevel(root)
+    win.title("Shift & Cash Drawer")
+    win.configure(bg=BG_COLOR)
+    win.geometry("640x640")
+
+    status_var = tk.StringVar()
+    tk.Label(win, textvariable=status_var, bg=BG_COLOR,
+             font=SUBTITLE_FONT).pack(pady=(10, 5))
+
+    form = tk.Frame(win, bg=BG_COLOR)
+    form.pack(pady=(0, 5))
+    amount_label = tk.Label(form, bg=BG_COLOR, font=TEXT_FONT)
+    amount_label.grid(row=0, column=0, padx=(5, 2), pady=2)
+    amount_var = tk.StringVar()
+    amount_entry = tk.Entry(form, textvariable=amount_var, font=TEXT_FONT,
+                            width=12)
+    amount_entry.grid(row=0, column=1, padx=(0, 5), pady=2)
+    action_btn = tk.Button(form, font=BUTTON_FONT, fg="white", width=14)
+    action_btn.grid(row=0, column=2, padx=5, pady=2)
+
+    txt = tk.Text(win, font=("Consolas", 10), wrap="none", height=18)
+    txt.pack(fill="both", expand=True, padx=10, pady=5)
+
+    tk.Label(win, text="Closed shifts", bg=BG_COLOR,
+             font=SUBTITLE_FONT).pack(anchor="w", padx=10)
+    cols = ("id", "opened", "closed", "expected", "counted", "variance")
+    tree = ttk.Treeview(win, columns=cols, show="headings", height=5)
+    for c, title, w in [
+        ("id", "#", 40), ("opened", "Opened", 130), ("closed", "Closed", 130),
+        ("expected", "Expected", 90), ("counted", "Counted", 90),
+        ("variance", "Over / short", 90),
+    ]:
+        tree.heading(c, text=title)
+        tree.column(c, width=w, anchor="center")
+    tree.pack(fill="x", padx=10, pady=(0, 5))
+
+    def read_amount():
+        try:
+            return float(amount_var.get().replace(",", "").strip())
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid amount.",
+                                 parent=win)
+            return None
+
+    def refresh(closeout=None):
+        txt.delete("1.0", "end")
+        if closeout is not None:
+            txt.insert("1.0", format_shift(closeout))
+        elif shift_ledger.is_open():
+            txt.insert("1.0", format_shift(shift_ledger.summary()))
+        if shift_ledger.is_open():
+            status_var.set(f"Shift #{shift_ledger.current['id']} is open")
+            amount_label.configure(text="Counted cash:")
+            action_btn.configure(text="CLOSE SHIFT", bg=RED_BTN,
+                                 command=close_shift)
+        else:
+            status_var.set("No shift is open")
+            amount_label.configure(text="Opening float:")
+            action_btn.configure(text="OPEN SHIFT", bg=GREEN_BTN,
+                                 command=open_shift)
+        amount_var.set("")
+        tree.delete(*tree.get_children())
+        for sid, opened, closed, _by, _cby, expected, counted in recent_shifts():
+            tree.insert("", "end", values=(
+                sid, opened, closed, format_tk(expected), format_tk(counted),
+                format_tk(counted - expected)))
+        refresh_shift_label()
+
+    def open_shift():
+        amount = read_amount()
+        if amount is None:
+            return
+        try:
+            shift_ledger.open(current_user_name, amount)
+        except ValueError as e:
+            messagebox.showerror("Shift", str(e), parent=win)
+            return
+        refresh()
+
+    def close_shift():
+        counted = read_amount()
+        if counted is None:
+            return
+        variance = counted - shift_ledger.expected_cash()
+        if abs(variance) >= 0.005 and not messagebox.askyesno(
+                "Close Shift",
+                f"Drawer is {'over' if variance > 0 else 'short'} by "
+                f"{format_tk(abs(variance))}. Close the shift anyway?",
+                parent=win):
+            return
+        try:
+            closeout = shift_ledger.close(current_user_name, counted)
+        except ValueError as e:
+            messagebox.showerror("Shift", str(e), parent=win)
+            return
+        refresh(closeout)
+
+    amount_entry.bind("<Return>", lambda e: action_btn.invoke())
+
+    btn_frame = tk.Frame(win, bg=BG_COLOR)
+    btn_frame.pack(pady=(0, 10))
+    tk.Button(
+        btn_frame, text="Refresh", font=BUTTON_FONT,
+        bg=BLUE_BTN, fg="white", width=10, command=refresh
+    ).pack(side="left", padx=5)
+    tk.Button(
+        btn_frame, text="Close", font=BUTTON_FONT,
+        bg=BROWN_BTN, fg="white", width=10, command=win.destroy
+    ).pack(side="left", padx=5)
+
+    refresh()
 
 
 # ---------- Navigation ----------
@@ -1541,10 +2974,13 @@ def show_summary_page():
 
 
 def go_to_summary():
-    if not any(it["qty_var"].get() > 0 for it in menu_items):
+    flush_repaint(force=True)
+    if not any(cart_qty()):
         messagebox.showwarning("No items", "Please select at least one item.")
         return
 
+    if not summary_page_built:
+        build_summary_page()
     rebuild_order_summary()
     bill_no_var.set(generate_bill_no())
     datetime_var.set(datetime.now().strftime("%d-%m-%Y  %I:%M %p"))
@@ -1554,22 +2990,78 @@ def go_to_summary():
 
 
 def on_logout_request():
-    reset_transaction()
+    if pending_payment is not None:
+        messagebox.showwarning("Payment", "Wait for the payment to finish.")
+        return
+    save_active_tab()
+    clear_transaction_ui()
     main_frame.pack_forget()
     login_frame.pack(fill="both", expand=True)
-    build_login_ui()
+    login_frame.reset_form()
+
+
+def menu_is_current():
+    # One query: the same items at the same price versions as on screen.
+    return ([(it.item_id, it.price_id) for it in load_menu_items()]
+            == [(it.item_id, it.price_id) for it in menu_items])
 
 
 def start_main_session(user_display_name, role):
+    # Only the first login builds the main UI. Later ones re-bind it: new
+    # user label, the parked tab reloaded, and the menu page rebuilt only
+    # if items or prices changed meanwhile (e.g. a scheduled price).
     global current_user_name, current_role
+    started = time.perf_counter()
     current_user_name = user_display_name
     current_role = role
     user_label_var.set(f"User: {user_display_name}")
 
-    reset_transaction()
-    build_main_ui()
+    clear_transaction_ui()
+    if menu_page is None:
+        kind = "first login"
+        build_main_ui()
+    elif not menu_is_current():
+        kind = "menu reloaded"
+        build_menu_page()
+        show_menu_page()
+    else:
+        kind = "re-bind"
+        load_active_tab()
+        build_tab_bar()
+        show_menu_page()
     login_frame.pack_forget()
     main_frame.pack(fill="both", expand=True)
+    root.update_idletasks()
+    elapsed = time.perf_counter() - started
+    session_switches.append((kind, elapsed))
+    if metrics.ENABLED:
+        metrics.observe("session_switch", elapsed)
+
+
+# ---------- Metrics ----------
+
+metrics.instrument(globals(), [
+    "calculate_totals", "rebuild_order_summary", "payment_complete",
+    "save_vouchers", "load_menu_data", "build_menu_page",
+    "open_history_window", "on_customer_typed",
+])
+# record_order() saves through the billing module's own references
+metrics.instrument(vars(billing), ["save_orders", "save_vouchers"])
+
+
+def export_metrics():
+    metrics.write_prometheus()
+    root.after(10000, export_metrics)
+
+
+if metrics.ENABLED:
+    if metrics.HTTP_PORT:
+        metrics.serve()
+    root.after(10000, export_metrics)
+
+# downstream systems tail changes.jsonl, or this socket when configured
+if changefeed.FEED_PORT:
+    changefeed.serve()
 
 
 # ---------- Start ----------
@@ -1578,4 +3070,8 @@ build_login_ui()
 login_frame.pack(fill="both", expand=True)
 
 root.mainloop()
+payment_pipeline.close()
+receipt_spooler.close()
+if metrics.ENABLED:
+    metrics.write_prometheus()
 
@@ -0,0 +1,219 @@
+import cProfile
+import json
+import os
+import time
+import tkinter as tk
+import tracemalloc
+from datetime import datetime
+
+# ---------- Files ----------
+
+PROFILE_DIR = "profiles"
+ACTION_LOG = "actions.jsonl"
+
+TOP_ALLOCATIONS = 8
+
+_TkCallWrapper = tk.CallWrapper
+
+
+# ---------- Profiling mode ----------
+
+_state = {
+    "active": False,
+    "depth": 0,         # nested callbacks are folded into the outermost one
+    "dir": None,
+    "seq": 0,
+}
+
+
+def action_name(func):
+    name = getattr(func, "__qualname__", None) or repr(func)
+    name = name.replace("<locals>.", "")
+    if name.endswith("<lambda>"):
+        code = getattr(func, "__code__", None)
+        if code is not None:
+            name += f":{code.co_firstlineno}"
+    return name
+
+
+def _safe_name(name):
+    return "".join(ch if ch.isalnum() or ch in "._-" else "_" for ch in name)[:60]
+
+
+class ProfilingCallWrapper(_TkCallWrapper):
+    # Every Tk callback (button commands, bindings, traces, after jobs) goes
+    # through CallWrapper, so replacing it catches do_login, go_to_summary,
+    # payment_complete and the rest without touching their definitions.
+    # With profiling off the cost is one dict lookup per callback.
+
+    def __call__(self, *args):
+        if not _state["active"] or _state["depth"] \
+                or getattr(self.func, "__module__", None) == __name__:
+            return _TkCallWrapper.__call__(self, *args)
+        _state["depth"] += 1
+        try:
+            return _profile_call(self, args)
+        finally:
+            _state["depth"] -= 1
+
+
+def install():
+    # Must run before the UI is built: Tk binds callbacks at registration.
+    tk.CallWrapper = ProfilingCallWrapper
+
+
+def is_active():
+    return _state["active"]
+
+
+def start(out_dir=PROFILE_DIR):
+    if _state["active"]:
+        return _state["dir"]
+    session = datetime.now().strftime("%Y%m%d_%H%M%S")
+    _state["dir"] = os.path.join(out_dir, session)
+    _state["seq"] = 0
+    os.makedirs(_state["dir"], exist_ok=True)
+    tracemalloc.start(1)
+    _state["active"] = True
+    return _state["dir"]
+
+
+def stop():
+    if not _state["active"]:
+        return None
+    _state["active"] = False
+    tracemalloc.stop()
+    return _state["dir"]
+
+
+def _profile_call(wrapper, args):
+    name = action_name(wrapper.func)
+    _state["seq"] += 1
+    base = os.path.join(_state["dir"], f"{_state['seq']:05d}_{_safe_name(name)}")
+
+    tracemalloc.reset_peak()
+    before_mem = tracemalloc.get_traced_memory()[0]
+    before = tracemalloc.take_snapshot()
+    prof = cProfile.Profile()
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    prof.enable()
+    try:
+        return _TkCallWrapper.__call__(wrapper, *args)
+    finally:
+        prof.disable()
+        wall = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        _write_record(name, base, prof, wall, cpu,
+                      current - before_mem, peak - before_mem,
+                      after.compare_to(before, "lineno"))
+
+
+def _write_record(name, base, prof, wall, cpu, net, peak, diff):
+    prof.dump_stats(base + ".prof")
+    top = []
+    for stat in diff:
+        frame = stat.traceback[0]
+        if frame.filename.endswith(("tracemalloc.py", "action_profiler.py")):
+            continue
+        top.append({"where": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                    "size_kb": round(stat.size_diff / 1024, 1),
+                    "count": stat.count_diff})
+        if len(top) >= TOP_ALLOCATIONS:
+            break
+    record = {
+        "action": name,
+        "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "wall_ms": round(wall * 1000, 3),
+        "cpu_ms": round(cpu * 1000, 3),
+        "alloc_net_kb": round(net / 1024, 1),
+        "alloc_peak_kb": round(peak / 1024, 1),
+        "top_allocations": top,
+        "profile": os.path.basename(base) + ".prof",
+    }
+    with open(os.path.join(_state["dir"], ACTION_LOG), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+# ---------- Viewer ----------
+
+def load_records(path=PROFILE_DIR):
+    # `path` may be one session folder or the folder holding all sessions.
+    logs = []
+    for folder, _dirs, files in os.walk(path):
+        if ACTION_LOG in files:
+            logs.append(os.path.join(folder, ACTION_LOG))
+    for log in sorted(logs):
+        with open(log, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    rec = json.loads(line)
+                    rec["session"] = os.path.dirname(log)
+                    yield rec
+
+
+def _p95(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+
+
+def summarize(records):
+    by_action = {}
+    for rec in records:
+        by_action.setdefault(rec["action"], []).append(rec)
+    rows = []
+    for action, recs in by_action.items():
+        walls = [r["wall_ms"] for r in recs]
+        peaks = [r["alloc_peak_kb"] for r in recs]
+        worst = max(recs, key=lambda r: r["wall_ms"])
+        rows.append({
+            "action": action,
+            "calls": len(recs),
+            "total_ms": round(sum(walls), 3),
+            "p95_ms": _p95(walls),
+            "max_ms": worst["wall_ms"],
+            "max_peak_kb": max(peaks),
+            "total_net_kb": round(sum(r["alloc_net_kb"] for r in recs), 1),
+            "worst_profile": os.path.join(worst["session"], worst["profile"]),
+        })
+    return rows
+
+
+def slowest(rows, n=10):
+    return sorted(rows, key=lambda r: (-r["p95_ms"], -r["max_ms"]))[:n]
+
+
+def heaviest(rows, n=10):
+    return sorted(rows, key=lambda r: (-r["max_peak_kb"], -r["total_net_kb"]))[:n]
+
+
+if __name__ == "__main__":
+    import argparse
+    import pstats
+
+    parser = argparse.ArgumentParser(
+        description="Rank profiled UI actions from a shift.")
+    parser.add_argument("path", nargs="?", default=PROFILE_DIR)
+    parser.add_argument("-n", type=int, default=10)
+    parser.add_argument("--stats", action="store_true",
+                        help="print cProfile stats for the slowest action")
+    args = parser.parse_args()
+
+    rows = summarize(load_records(args.path))
+    print(f"{'Slowest actions':<44}{'calls':>7}{'p95 ms':>10}{'max ms':>10}")
+    for r in slowest(rows, args.n):
+        print(f"{r['action'][:44]:<44}{r['calls']:>7}{r['p95_ms']:>10.1f}"
+              f"{r['max_ms']:>10.1f}")
+    print()
+    print(f"{'Allocation-heavy actions':<44}{'calls':>7}{'peak KB':>10}"
+          f"{'net KB':>10}")
+    for r in heaviest(rows, args.n):
+        print(f"{r['action'][:44]:<44}{r['calls']:>7}{r['max_peak_kb']:>10.1f}"
+              f"{r['total_net_kb']:>10.1f}")
+    if args.stats and rows:
+        print()
+        pstats.Stats(slowest(rows, 1)[0]["worst_profile"])\
+            .sort_stats("cumulative").print_stats(15)
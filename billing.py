@@ -0,0 +1,540 @@
+import json
+import os
+import random
+import sqlite3
+from datetime import datetime
+
+
+# ---------- Files ----------
+
+VOUCHER_FILE = "vouchers.json"
+ORDER_FILE = "orders.json"
+DB_FILE = "restaurant.db"
+
+# ---------- Default menu (first run only) ----------
+
+EPOCH = "1970-01-01 00:00:00"
+
+CATEGORIES = ["Kacchi Combo", "Drinks & Dessert", "Add-ons", "Sharing Platter"]
+
+DEFAULT_MENU = {
+    "Kacchi Combo": [
+        ("Basic Kacchi", 300),
+        ("Kacchi Meal", 320),
+        ("Kacchi + Borhani + Firni", 420),
+        ("Kacchi + Roast + Borhani", 450),
+        ("Kacchi + Roast + Borhani + Firni", 480),
+    ],
+    "Drinks & Dessert": [
+        ("Borhani", 60),
+        ("Soft Drink", 40),
+        ("Mineral Water", 20),
+        ("Firni", 50),
+        ("Jorda", 50),
+    ],
+    "Add-ons": [
+        ("Plain Polao", 250),
+        ("Chicken Roast", 200),
+        ("Beef Rezala", 220),
+        ("Jali Kabab", 80),
+        ("Salad", 40),
+        ("Chatni", 20),
+    ],
+    "Sharing Platter": [
+        ("Sharing Platter 1", 280),
+        ("Sharing Platter 2", 920),
+    ],
+}
+
+# ---------- DB helpers (employees + menu) ----------
+
+def init_db():
+    con = sqlite3.connect(DB_FILE)
+    cur = con.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS employees (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            password TEXT NOT NULL
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS menu_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            name TEXT NOT NULL,
+            price REAL NOT NULL,
+            sort_order INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # Items are never deleted, only retired, so their ids stay valid for
+    # every order that refers to them.
+    cols = [r[1] for r in cur.execute("PRAGMA table_info(menu_items)")]
+    if "active" not in cols:
+        cur.execute("ALTER TABLE menu_items "
+                    "ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+    # optional stock-keeping code, used to match rows on bulk import
+    if "code" not in cols:
+        cur.execute("ALTER TABLE menu_items ADD COLUMN code TEXT")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_menu_items_code "
+                "ON menu_items(code) WHERE code IS NOT NULL")
+
+    # Every price an item has had; orders point at a version, and a price
+    # change is a new row effective from a given time.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS price_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL REFERENCES menu_items(id),
+            price REAL NOT NULL,
+            effective_from TEXT NOT NULL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_price_versions_item "
+                "ON price_versions(item_id, effective_from)")
+
+    # seed default menu if empty
+    cur.execute("SELECT COUNT(*) FROM menu_items")
+    if cur.fetchone()[0] == 0:
+        for cat, items in DEFAULT_MENU.items():
+            for sort_order, (name, price) in enumerate(items):
+                cur.execute(
+                    "INSERT INTO menu_items(category, name, price, sort_order) "
+                    "VALUES (?,?,?,?)",
+                    (cat, name, float(price), sort_order),
+                )
+
+    # items from before price versions start with their current price
+    cur.execute(
+        "INSERT INTO price_versions(item_id, price, effective_from) "
+        "SELECT id, price, ? FROM menu_items WHERE id NOT IN "
+        "(SELECT item_id FROM price_versions)",
+        (EPOCH,),
+    )
+    con.commit()
+    con.close()
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# active items with the price version in effect at `when`
+CURRENT_MENU_SQL = (
+    "SELECT m.id, m.category, m.name, v.id, v.price FROM menu_items m "
+    "JOIN price_versions v ON v.id = ("
+    "  SELECT id FROM price_versions WHERE item_id = m.id "
+    "  AND effective_from <= ? ORDER BY effective_from DESC, id DESC LIMIT 1) "
+    "WHERE m.active = 1 ORDER BY m.sort_order, m.id"
+)
+
+
+class MenuItem:
+    # One sellable item, plain values only. `item_id` and `price_id` are the
+    # stable database ids orders refer to; `pos` is the item's place on the
+    # menu page, which indexes the open tab's quantity array. The widgets
+    # showing the row belong to the UI, so a large menu costs no Tk
+    # variables at all.
+    __slots__ = ("pos", "item_id", "price_id", "category", "name", "price")
+
+    def __init__(self, pos, item_id, price_id, category, name, price):
+        self.pos = pos
+        self.item_id = item_id
+        self.price_id = price_id
+        self.category = category
+        self.name = name
+        self.price = float(price)
+
+
+def load_menu_items(when=None, path=DB_FILE):
+    con = sqlite3.connect(path)
+    rows = con.execute(CURRENT_MENU_SQL, (when or _now(),)).fetchall()
+    con.close()
+    by_cat = {}
+    for row in rows:
+        by_cat.setdefault(row[1], []).append(row)
+    items = []
+    for cat in CATEGORIES:
+        for item_id, _cat, name, price_id, price in by_cat.get(cat, []):
+            items.append(MenuItem(len(items), item_id, price_id, cat, name, price))
+    return items
+
+
+def load_menu_data():
+    data = {cat: [] for cat in CATEGORIES}
+    for it in load_menu_items():
+        data[it.category].append((it.name, it.price))
+    return data
+
+
+def set_price(item_id, price, effective_from=None, con=None):
+    # Adds a price version; a future `effective_from` schedules the change.
+    own = con is None
+    if own:
+        con = sqlite3.connect(DB_FILE)
+    cur = con.cursor()
+    cur.execute("INSERT INTO price_versions(item_id, price, effective_from) "
+                "VALUES (?,?,?)", (item_id, float(price), effective_from or _now()))
+    cur.execute("UPDATE menu_items SET price=? WHERE id=?", (float(price), item_id))
+    if own:
+        con.commit()
+        con.close()
+    _catalogs.clear()
+    return cur.lastrowid
+
+
+def update_menu_category(cat, items):
+    # Keeps item ids stable across edits. A line matches the listed item
+    # with the same name, then a retired one (brought back), then the
+    # unmatched item at the same position (a rename in place). Changed
+    # prices get a new version effective now; items no longer listed are
+    # retired, not deleted.
+    con = sqlite3.connect(DB_FILE)
+    cur = con.cursor()
+    now = _now()
+    old = [row for row in cur.execute(CURRENT_MENU_SQL, (now,)).fetchall()
+           if row[1] == cat]
+    price_of = {row[0]: row[4] for row in old}
+    by_name = {row[2]: row[0] for row in old}
+    for item_id, name, price in cur.execute(
+            "SELECT id, name, price FROM menu_items "
+            "WHERE category=? AND active=0 ORDER BY id", (cat,)).fetchall():
+        by_name.setdefault(name, item_id)
+        price_of[item_id] = price
+
+    matched = {}
+    for idx, (name, _price) in enumerate(items):
+        if name in by_name and by_name[name] not in matched.values():
+            matched[idx] = by_name[name]
+    free = [row[0] for row in old if row[0] not in matched.values()]
+    for idx in range(len(items)):
+        if idx not in matched and idx < len(old) and old[idx][0] in free:
+            matched[idx] = old[idx][0]
+            free.remove(old[idx][0])
+
+    for idx, (name, price) in enumerate(items):
+        item_id = matched.get(idx)
+        if item_id is None:
+            cur.execute(
+                "INSERT INTO menu_items(category, name, price, sort_order) "
+                "VALUES (?,?,?,?)",
+                (cat, name, float(price), idx),
+            )
+            set_price(cur.lastrowid, price, now, con)
+            continue
+        cur.execute("UPDATE menu_items SET name=?, sort_order=?, active=1 "
+                    "WHERE id=?", (name, idx, item_id))
+        if float(price) != price_of[item_id]:
+            set_price(item_id, price, now, con)
+    cur.executemany("UPDATE menu_items SET active=0 WHERE id=?",
+                    [(item_id,) for item_id in free])
+    con.commit()
+    con.close()
+    _catalogs.clear()
+
+
+# ---------- Order lines ----------
+
+_catalogs = {}      # db path -> catalog
+
+
+def load_catalog(path=DB_FILE, reload=False):
+    # Every item and price version ever defined, for resolving order lines.
+    # Versions are never deleted, so any stored order resolves.
+    if reload or path not in _catalogs:
+        catalog = {"items": {}, "prices": {}}
+        if os.path.exists(path):
+            con = sqlite3.connect(path)
+            try:
+                catalog["items"] = {r[0]: (r[1], r[2]) for r in con.execute(
+                    "SELECT id, category, name FROM menu_items")}
+                catalog["prices"] = {r[0]: (r[1], r[2]) for r in con.execute(
+                    "SELECT id, item_id, price FROM price_versions")}
+            except sqlite3.Error:
+                pass
+            finally:
+                con.close()
+        _catalogs[path] = catalog
+    return _catalogs[path]
+
+
+def order_lines(order, catalog=None, path=DB_FILE):
+    # Line dicts (category, name, price, qty, line_total) for any stored
+    # order. New orders keep only [item id, price version id, qty]; orders
+    # from before that carry the full lines in "items".
+    if "lines" not in order:
+        return order.get("items", [])
+    if catalog is None:
+        catalog = load_catalog(path)
+        if any(pid not in catalog["prices"] for _i, pid, _q in order["lines"]):
+            catalog = load_catalog(path, reload=True)
+    out = []
+    for item_id, price_id, qty in order["lines"]:
+        category, name = catalog["items"].get(item_id, ("", f"Item #{item_id}"))
+        price = catalog["prices"].get(price_id, (item_id, 0.0))[1]
+        out.append({
+            "item_id": item_id,
+            "price_id": price_id,
+            "category": category,
+            "name": name,
+            "price": price,
+            "qty": qty,
+            "line_total": qty * price,
+        })
+    return out
+
+
+# ---------- JSON helpers for vouchers/orders ----------
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def save_json(path, data):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    except Exception as e:
+        print("Error saving", path, ":", e)
+
+
+def load_vouchers():
+    raw = load_json(VOUCHER_FILE, {})
+    # Old format handle: list -> convert to dict
+    if isinstance(raw, list):
+        converted = {}
+        for entry in raw:
+            if not isinstance(entry, dict):
+                continue
+            code = str(entry.get("code", "")).upper()
+            if not code:
+                continue
+            converted[code] = {
+                "code": code,
+                "discount": float(entry.get("discount", entry.get("percent", 0))),
+                "max_uses": int(entry.get("max_uses", entry.get("max", 0))),
+                "used": int(entry.get("used", 0)),
+                "deleted": bool(entry.get("deleted", False)),
+                "exclusive": bool(entry.get("exclusive", False)),
+            }
+        raw = converted
+
+    normalized = {}
+    for code, v in raw.items():
+        code_u = str(code).upper()
+        normalized[code_u] = {
+            "code": code_u,
+            "discount": float(v.get("discount", v.get("percent", 0))),
+            "max_uses": int(v.get("max_uses", v.get("max", 0))),
+            "used": int(v.get("used", 0)),
+            "deleted": bool(v.get("deleted", False)),
+            # exclusive: the voucher replaces other promotions, not stacks
+            "exclusive": bool(v.get("exclusive", False)),
+        }
+    return normalized
+
+
+def save_vouchers(vouchers):
+    save_json(VOUCHER_FILE, vouchers)
+
+
+def load_orders():
+    return load_json(ORDER_FILE, [])
+
+
+def save_orders(orders):
+    save_json(ORDER_FILE, orders)
+
+
+def iter_orders(path=ORDER_FILE, chunk_size=1 << 16):
+    # Yields orders one at a time from the JSON array on disk, keeping only
+    # one chunk plus the current order in memory.
+    if not os.path.exists(path):
+        return
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size).lstrip()
+        if not buf.startswith("["):
+            return
+        pos = 1
+        while True:
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf):
+                    break
+                buf, pos = f.read(chunk_size), 0
+                if not buf:
+                    return
+            if buf[pos] == "]":
+                return
+            while True:
+                try:
+                    obj, pos = decoder.raw_decode(buf, pos)
+                    break
+                except json.JSONDecodeError:
+                    more = f.read(chunk_size)
+                    if not more:
+                        return      # truncated file: stop at the last good order
+                    buf, pos = buf[pos:] + more, 0
+            yield obj
+
+
+def order_amounts(order, catalog=None):
+    # (food cost, discount, VAT) of a stored order; only the final total and
+    # the discount are persisted (older orders: just the percent), so VAT is
+    # whatever remains.
+    subtotal = 0.0
+    for it in order_lines(order, catalog):
+        subtotal += float(it.get("line_total", 0) or 0)
+    if "discount" in order:
+        discount = float(order["discount"] or 0)
+    else:
+        percent = float(order.get("discount_percent", 0) or 0)
+        discount = subtotal * (percent / 100.0)
+    total = float(order.get("total_bill", 0) or 0)
+    vat = max(0.0, total - max(0.0, subtotal - discount))
+    return subtotal, discount, vat
+
+
+# ---------- Formatting helpers ----------
+
+def format_tk(amount):
+    return f"Tk {amount:,.2f}"
+
+
+def format_item_price(amount):
+    a = float(amount)
+    if a.is_integer():
+        return f"{int(a)} Tk"
+    else:
+        return f"{a:,.2f} Tk"
+
+
+# ---------- Till logic (shared by the UI and the load generator) ----------
+
+VAT_RATE = 0.05
+
+ADMIN_PASSWORDS = {
+    "Tanim119": "Tanim",
+    "Mim31": "Mim",
+}
+
+
+def authenticate(staff, role, uid, pw):
+    # Returns (display name, None) or (None, error message). `staff` is a
+    # staff.StaffDirectory.
+    if role == "Employee":
+        if not uid or not pw:
+            return None, "Please enter Employee ID and Password."
+        name = staff.verify(uid, pw)
+        if name is None:
+            return None, "Invalid employee credentials."
+        return f'{name} (Employee)', None
+    if pw not in ADMIN_PASSWORDS:
+        return None, "Wrong admin password."
+    return f"{ADMIN_PASSWORDS[pw]} (Admin)", None
+
+
+def generate_bill_no():
+    return str(random.randint(20000, 49999))
+
+
+def price_totals(subtotal, discount_percent):
+    # (discount, VAT, total) for a cart subtotal
+    discount = subtotal * (discount_percent / 100.0)
+    after_discount = max(0.0, subtotal - discount)
+    vat = after_discount * VAT_RATE if after_discount > 0 else 0.0
+    return discount, vat, after_discount + vat
+
+
+def check_voucher(vouchers, code, subtotal):
+    # Returns (discount percent, None) or (None, error message).
+    if subtotal <= 0:
+        return None, "No items to discount."
+    if not code:
+        return None, "Please enter a voucher code."
+    v = vouchers.get(code)
+    if not v or v.get("deleted", False):
+        return None, "Invalid voucher code."
+    max_uses = v.get("max_uses", 0)
+    used = v.get("used", 0)
+    if max_uses > 0 and used >= max_uses:
+        return None, "Voucher limit reached."
+    return v.get("discount", 0.0), None
+
+
+def cash_taken(order):
+    # What a Cash order put in the drawer: the bill, or only what was paid
+    # when it was short-paid ("Due"). Other methods take no cash.
+    if order.get("method") != "Cash":
+        return 0.0
+    total = float(order.get("total_bill", 0) or 0)
+    paid = order.get("paid")
+    return total if paid is None else min(float(paid or 0), total)
+
+
+def change_text(paid, total):
+    diff = paid - total
+    if diff >= 0:
+        return f"Back Tk {diff:,.2f}"
+    return f"Due Tk {-diff:,.2f}"
+
+
+def build_order(lines, bill_no, employee, method, total, paid,
+                change_or_due, voucher_code, discount_percent, when=None,
+                discount=None, promotions=None, customer=None,
+                points_earned=0, points_redeemed=0):
+    # lines: (item id, price version id, qty) for every item with qty > 0;
+    # names and prices are resolved through the menu when read back.
+    # discount/promotions come from the pricing rules when they were used;
+    # customer is a loyalty phone number.
+    order = {
+        "datetime": (when or datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+        "bill_no": bill_no,
+        "employee": employee,
+        "method": method,
+        "total_bill": total,
+        "paid": paid,
+        "change_or_due": change_or_due,
+        "voucher_code": voucher_code or "None",
+        "discount_percent": discount_percent,
+        "lines": [[item_id, price_id, qty] for item_id, price_id, qty in lines],
+    }
+    if discount:
+        order["discount"] = round(discount, 2)
+    if promotions:
+        order["promotions"] = [[name, round(amount, 2)]
+                               for name, amount in promotions]
+    if customer:
+        order["customer"] = customer
+        order["points_earned"] = points_earned
+        order["points_redeemed"] = points_redeemed
+    return order
+
+
+def record_order(order, orders, vouchers, feed=None):
+    # `feed` is an optional changefeed.ChangeFeed; events are emitted only
+    # after the stores they describe have been saved.
+    orders.append(order)
+    save_orders(orders)
+    if feed is not None:
+        feed.emit("order.committed", order)
+
+    code = order.get("voucher_code")
+    if code and code != "None":
+        v = vouchers.get(code)
+        if v:
+            v["used"] = v.get("used", 0) + 1
+            save_vouchers(vouchers)
+            if feed is not None:
+                feed.emit("voucher.redeemed", {"code": code,
+                                               "bill_no": order.get("bill_no"),
+                                               "used": v["used"]})
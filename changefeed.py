@@ -0,0 +1,240 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from datetime import datetime
+
+# ---------- Files ----------
+
+# One JSON object per line, append-only:
+#   {"seq": 42, "at": "2026-10-19 12:00:01", "type": "order.committed",
+#    "data": {...}}
+# seq increases by one per event and is never reused, so a consumer only has
+# to remember the last seq it processed (plus the byte offset, to skip the
+# scan) to pick up exactly where it left off.
+CHANGE_LOG = "changes.jsonl"
+
+# KACCHI_FEED_PORT serves the log on 127.0.0.1:<port> (see serve()).
+FEED_PORT = int(os.environ.get("KACCHI_FEED_PORT", "0") or 0)
+
+POLL_SECONDS = 0.25
+BATCH_EVENTS = 500
+
+EVENT_TYPES = (
+    "order.committed",      # data: the stored order
+    "voucher.created",      # data: the voucher record
+    "voucher.deleted",      # data: {"code"}
+    "voucher.updated",      # data: the voucher record
+    "voucher.redeemed",     # data: {"code", "bill_no", "used"}
+    "menu.updated",         # data: {"category", "items":
+                            #        [[item id, price id, name, price]]}
+    "employee.added",       # data: {"id", "name"} - never the password
+    "employee.deleted",     # data: {"id"}
+)
+
+
+# ---------- Writer ----------
+
+def _recover(path):
+    # Returns the last complete event's seq, cutting off a torn final line
+    # left by a crash mid-write so new events start on a clean line.
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        window = 1 << 16
+        while True:
+            start = max(0, size - window)
+            f.seek(start)
+            tail = f.read(size - start)
+            end = tail.rfind(b"\n")
+            if end < 0 and start > 0:
+                window *= 2
+                continue
+            if start + end + 1 < size:
+                size = start + end + 1
+                f.truncate(size)
+            if end < 0:
+                return 0
+            prev = tail.rfind(b"\n", 0, end)
+            if prev < 0 and start > 0:
+                window *= 2
+                continue
+            return json.loads(tail[prev + 1:end])["seq"]
+
+
+class ChangeFeed:
+    def __init__(self, path=CHANGE_LOG):
+        self.path = path
+        self.lock = threading.Lock()
+        self.seq = _recover(path)
+
+    def emit(self, kind, data):
+        with self.lock:
+            self.seq += 1
+            line = json.dumps({
+                "seq": self.seq,
+                "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "type": kind,
+                "data": data,
+            }, separators=(",", ":")) + "\n"
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            return self.seq
+
+
+# ---------- Readers ----------
+
+def read_changes(cursor=None, path=CHANGE_LOG, limit=BATCH_EVENTS):
+    # Returns (events after the cursor, new cursor). The cursor's byte
+    # offset lets this seek straight to the unread tail; if the offset is
+    # unknown or beyond the file the log is scanned and old seqs skipped.
+    cursor = dict(cursor or {"seq": 0, "offset": 0})
+    events = []
+    if not os.path.exists(path):
+        return events, cursor
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        offset = cursor.get("offset", 0)
+        if offset > size:
+            offset = 0
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break               # still being written
+            offset += len(line)
+            event = json.loads(line)
+            if event["seq"] <= cursor["seq"]:
+                continue
+            events.append(event)
+            if limit and len(events) >= limit:
+                break
+    if events:
+        cursor["seq"] = events[-1]["seq"]
+    cursor["offset"] = offset
+    return events, cursor
+
+
+def tail(cursor=None, path=CHANGE_LOG, poll=POLL_SECONDS, follow=True):
+    # Yields (events, cursor) batches; save the cursor once a batch has been
+    # applied downstream. With follow=False it stops at the end of the log.
+    while True:
+        events, cursor = read_changes(cursor, path)
+        if events:
+            yield events, cursor
+        elif not follow:
+            return
+        else:
+            time.sleep(poll)
+
+
+def load_cursor(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"seq": 0, "offset": 0}
+
+
+def save_cursor(path, cursor):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cursor, f)
+    os.replace(tmp, path)
+
+
+# ---------- Socket API ----------
+#
+# A client connects and sends one line, "<seq> [<offset>]", the cursor it
+# last saved (0 for everything). The server streams every later event as
+# JSON lines, each batch followed by {"cursor": {...}}, and keeps the
+# connection open, pushing new events as they are committed.
+
+class _FeedHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        parts = self.rfile.readline().decode("ascii", "replace").split()
+        try:
+            cursor = {"seq": int(parts[0]) if parts else 0,
+                      "offset": int(parts[1]) if len(parts) > 1 else 0}
+        except ValueError:
+            return
+        try:
+            while True:
+                events, cursor = read_changes(cursor, self.server.log_path)
+                if not events:
+                    time.sleep(POLL_SECONDS)
+                    continue
+                out = [json.dumps(e, separators=(",", ":")) for e in events]
+                out.append(json.dumps({"cursor": cursor}))
+                self.wfile.write(("\n".join(out) + "\n").encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class _FeedServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(port=FEED_PORT, path=CHANGE_LOG):
+    # Localhost only, like the metrics endpoint.
+    server = _FeedServer(("127.0.0.1", port), _FeedHandler)
+    server.log_path = path
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name="changefeed").start()
+    return server
+
+
+def subscribe(port, cursor=None, host="127.0.0.1"):
+    # Client side of the socket API; yields (events, cursor) like tail().
+    cursor = cursor or {"seq": 0, "offset": 0}
+    with socket.create_connection((host, port)) as sock:
+        sock.sendall(f"{cursor['seq']} {cursor.get('offset', 0)}\n".encode("ascii"))
+        events = []
+        for line in sock.makefile("rb"):
+            obj = json.loads(line)
+            if "cursor" in obj:
+                yield events, obj["cursor"]
+                events = []
+            else:
+                events.append(obj)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Read the change feed from a saved cursor.")
+    parser.add_argument("--log", default=CHANGE_LOG)
+    parser.add_argument("--cursor", default=None,
+                        help="cursor file to resume from and update")
+    parser.add_argument("--follow", action="store_true",
+                        help="keep waiting for new events")
+    parser.add_argument("--port", type=int, default=0,
+                        help="read from a running feed socket instead of the file")
+    parser.add_argument("--serve", type=int, default=0, metavar="PORT",
+                        help="serve the log on a local socket")
+    args = parser.parse_args()
+
+    if args.serve:
+        server = _FeedServer(("127.0.0.1", args.serve), _FeedHandler)
+        server.log_path = args.log
+        print(f"Serving {args.log} on 127.0.0.1:{args.serve}")
+        server.serve_forever()
+
+    start = load_cursor(args.cursor) if args.cursor else None
+    batches = (subscribe(args.port, start) if args.port
+               else tail(start, args.log, follow=args.follow))
+    try:
+        for batch, cur in batches:
+            for ev in batch:
+                print(json.dumps(ev))
+            if args.cursor:
+                save_cursor(args.cursor, cur)
+            if args.port and not args.follow:
+                break
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,214 @@
+from billing import load_json, save_json
+
+# ---------- Component mapping ----------
+
+# combo item id -> {component item id: qty}, so renaming an item keeps its
+# combos. A combo is only ever suggested while it is cheaper than its parts
+# at current menu prices. Entries still keyed by name (the defaults, older
+# files) are resolved against the menu on load; those that match no item are
+# kept as they are and never suggested.
+COMBO_FILE = "combos.json"
+
+DEFAULT_COMBOS = {
+    "Kacchi + Borhani + Firni": {"Basic Kacchi": 1, "Borhani": 1, "Firni": 1},
+    "Kacchi + Roast + Borhani": {"Basic Kacchi": 1, "Chicken Roast": 1,
+                                 "Borhani": 1},
+    "Kacchi + Roast + Borhani + Firni": {"Basic Kacchi": 1, "Chicken Roast": 1,
+                                         "Borhani": 1, "Firni": 1},
+}
+
+
+def load_combos(ids, path=COMBO_FILE):
+    # ids: {item name: item id}. Returns (combos, unmatched), unmatched being
+    # the name-keyed entries no menu item answers to. Entries resolved here
+    # are written back by id straight away.
+    combos, unmatched, resolved = {}, {}, False
+    for combo, parts in load_json(path, DEFAULT_COMBOS).items():
+        if combo.isdigit():
+            combos[int(combo)] = {int(p): q for p, q in parts.items()}
+        elif combo in ids and all(p in ids for p in parts):
+            combos[ids[combo]] = {ids[p]: q for p, q in parts.items()}
+            resolved = True
+        else:
+            unmatched[combo] = parts
+    if resolved:
+        save_combos(combos, unmatched, path)
+    return combos, unmatched
+
+
+def save_combos(combos, unmatched=None, path=COMBO_FILE):
+    data = {str(combo): {str(p): q for p, q in parts.items()}
+            for combo, parts in combos.items()}
+    data.update(unmatched or {})
+    save_json(path, data)
+
+
+def format_combos(combos, names):
+    # Same text layout as recipes: "Combo: Part x qty; Part x qty", with
+    # names: {item id: name}.
+    def name(item_id):
+        return names.get(item_id, f"Item #{item_id}")
+    return "\n".join(
+        f"{name(combo)}: "
+        + "; ".join(f"{name(p)} x {qty:g}" for p, qty in parts.items())
+        for combo, parts in combos.items())
+
+
+def parse_combos(text, ids):
+    # ids: {item name: item id}; returns combos keyed by id.
+    combos, errors = {}, []
+    for n, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        combo, sep, rest = line.rpartition(":")
+        combo = combo.strip()
+        if not sep or not combo:
+            errors.append(f"Line {n}: expected 'Combo: Item x qty; ...'")
+            continue
+        parts = {}
+        for chunk in rest.split(";"):
+            if not chunk.strip():
+                continue
+            name, _, qty = chunk.rpartition(" x ")
+            try:
+                q = int(qty.strip())
+            except ValueError:
+                q = 0
+            name = name.strip()
+            if not name or q <= 0:
+                errors.append(f"Line {n}: bad part '{chunk.strip()}'")
+                continue
+            if name not in ids:
+                errors.append(f"Line {n}: '{name}' is not on the menu")
+                continue
+            parts[ids[name]] = parts.get(ids[name], 0) + q
+        if combo not in ids:
+            errors.append(f"Line {n}: '{combo}' is not on the menu")
+        elif parts:
+            combos[ids[combo]] = parts
+    return combos, errors
+
+
+# ---------- Optimizer ----------
+
+# search nodes before settling for the best combination found so far
+MAX_NODES = 3000
+
+
+def cheapest_bundles(cart, combos, prices, max_nodes=MAX_NODES):
+    # cart: {item id: qty}, prices: {item id: unit price}. Finds how many
+    # of each combo to ring up instead of their parts so the cart costs the
+    # least. Returns ({combo: count}, exact).
+    #
+    # Branch and bound over the combos, best saving ratio first, trying the
+    # largest count of each first so a good answer is found straight away.
+    # A branch is cut when its spend plus a lower bound for the parts left
+    # (each part at its cheapest share of any combo still to come) cannot
+    # beat the best answer, or when the same (combo, parts left) was already
+    # reached for less. Past `max_nodes` the best answer so far is returned.
+    usable = []
+    for combo, parts in combos.items():
+        if combo not in prices or not all(p in prices for p in parts):
+            continue
+        loose = sum(prices[p] * q for p, q in parts.items())
+        if prices[combo] < loose and all(cart.get(p, 0) >= q
+                                         for p, q in parts.items()):
+            usable.append(((loose - prices[combo]) / loose, combo, parts))
+    if not usable:
+        return {}, True
+    usable.sort(reverse=True)
+    part_ids = sorted({p for _, _, parts in usable for p in parts})
+    unit = [prices[p] for p in part_ids]
+    vectors = [tuple(parts.get(p, 0) for p in part_ids)
+               for _, _, parts in usable]
+    cost = [prices[combo] for _, combo, _ in usable]
+    # floor[j][i]: lowest price part i can reach in combos j.. or loose
+    floor = [unit[:] for _ in range(len(usable) + 1)]
+    for j in range(len(usable) - 1, -1, -1):
+        r = usable[j][0]
+        floor[j] = [min(f, u * (1.0 - r)) if v else f
+                    for f, u, v in zip(floor[j + 1], unit, vectors[j])]
+
+    start = tuple(cart.get(p, 0) for p in part_ids)
+    best = [sum(u * q for u, q in zip(unit, start)), ()]
+    reached = {}
+    nodes = [0]
+
+    def search(j, state, spent, picks):
+        if spent + sum(f * q for f, q in zip(floor[j], state)) >= best[0] - 1e-9:
+            return
+        if j == len(vectors):
+            best[0], best[1] = spent + sum(u * q for u, q in zip(unit, state)), picks
+            return
+        key = (j, state)
+        if reached.get(key, float("inf")) <= spent:
+            return
+        reached[key] = spent
+        nodes[0] += 1
+        if nodes[0] > max_nodes:
+            return
+        vec = vectors[j]
+        most = min(s // v for s, v in zip(state, vec) if v)
+        for k in range(most, -1, -1):
+            search(j + 1, tuple(s - k * v for s, v in zip(state, vec)),
+                   spent + k * cost[j], picks + ((j, k),) if k else picks)
+
+    search(0, start, 0.0, ())
+    return {usable[j][1]: k for j, k in best[1]}, nodes[0] <= max_nodes
+
+
+def suggest(cart, combos, prices):
+    # What to tell the cashier: {"add": {combo: n}, "remove": {part: n},
+    # "saving": amount, "exact": bool}, or None when nothing is cheaper.
+    add, exact = cheapest_bundles(cart, combos, prices)
+    if not add:
+        return None
+    remove = {}
+    for combo, n in add.items():
+        for part, q in combos[combo].items():
+            remove[part] = remove.get(part, 0) + q * n
+    saving = (sum(prices[p] * q for p, q in remove.items())
+              - sum(prices[c] * n for c, n in add.items()))
+    return {"add": add, "remove": remove, "saving": saving, "exact": exact}
+
+
+def describe(suggestion, names):
+    ring = ", ".join(f"{n} x {names.get(c, f'Item #{c}')}"
+                     for c, n in suggestion["add"].items())
+    return f"Ring up {ring} instead of the separate items"
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+
+    from billing import init_db, load_menu_items
+
+    parser = argparse.ArgumentParser(
+        description="Time the combo optimizer on random group orders.")
+    parser.add_argument("--items", type=int, default=60,
+                        help="units per order")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    init_db()
+    items = load_menu_items()
+    prices = {it.item_id: it.price for it in items}
+    combos, _unmatched = load_combos({it.name: it.item_id for it in items})
+    parts = sorted({p for c in combos.values() for p in c if p in prices})
+    rng = random.Random(1)
+    worst = total = saved = 0.0
+    for _ in range(args.runs):
+        cart = {}
+        for _unit in range(args.items):
+            item_id = rng.choice(parts)
+            cart[item_id] = cart.get(item_id, 0) + 1
+        started = time.perf_counter()
+        s = suggest(cart, combos, prices)
+        elapsed = time.perf_counter() - started
+        worst, total = max(worst, elapsed), total + elapsed
+        saved += s["saving"] if s else 0.0
+    print(f"{args.runs} orders of {args.items} units: mean "
+          f"{total / args.runs * 1000:.2f} ms, worst {worst * 1000:.2f} ms, "
+          f"mean saving Tk {saved / args.runs:,.2f}")
@@ -0,0 +1,254 @@
+import csv
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from billing import ORDER_FILE, DB_FILE, load_catalog, order_amounts, order_lines
+from history import iter_history
+
+# ---------- Files ----------
+
+CONSOLIDATED_DB = "consolidated.db"
+REPORT_DIR = "reports"
+
+
+# ---------- Merged store ----------
+
+def init_consolidated_db(path=CONSOLIDATED_DB):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            branch TEXT NOT NULL,
+            bill_no TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            employee TEXT,
+            method TEXT,
+            food_cost REAL NOT NULL,
+            discount REAL NOT NULL,
+            vat REAL NOT NULL,
+            total_bill REAL NOT NULL,
+            paid REAL,
+            voucher_code TEXT,
+            discount_percent REAL,
+            UNIQUE (branch, bill_no, datetime)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_id INTEGER NOT NULL REFERENCES orders(id),
+            category TEXT,
+            name TEXT NOT NULL,
+            price REAL NOT NULL,
+            qty INTEGER NOT NULL,
+            line_total REAL NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS branch_employees (
+            branch TEXT NOT NULL,
+            id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            PRIMARY KEY (branch, id)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_day "
+                "ON orders(substr(datetime, 1, 10))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_items_order "
+                "ON order_items(order_id)")
+    con.commit()
+    return con
+
+
+# ---------- Branch ingestion (runs in worker processes) ----------
+
+def _ingest_branch(job):
+    # Parse one branch store into its own shard database, so the parsing and
+    # row inserts happen in parallel. Duplicates inside the branch are dropped
+    # by the same UNIQUE key the merged store uses.
+    branch, folder, shard_path = job
+    if os.path.exists(shard_path):
+        os.remove(shard_path)
+    con = init_consolidated_db(shard_path)
+    cur = con.cursor()
+    skipped = 0
+    # item ids are per branch, so lines are resolved against the branch's
+    # own menu and stored by name
+    catalog = load_catalog(os.path.join(folder, DB_FILE))
+    for o in iter_history(os.path.join(folder, ORDER_FILE)):
+        lines = order_lines(o, catalog)
+        food_cost, discount, vat = order_amounts(o, catalog)
+        cur.execute(
+            "INSERT OR IGNORE INTO orders(branch, bill_no, datetime, "
+            "employee, method, food_cost, discount, vat, total_bill, "
+            "paid, voucher_code, discount_percent) "
+            "VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+            (
+                branch, str(o.get("bill_no", "")), o.get("datetime", ""),
+                o.get("employee"), o.get("method"),
+                food_cost, discount, vat,
+                float(o.get("total_bill", 0) or 0),
+                float(o.get("paid", 0) or 0),
+                o.get("voucher_code"),
+                float(o.get("discount_percent", 0) or 0),
+            ),
+        )
+        if cur.rowcount == 0:
+            skipped += 1
+            continue
+        order_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO order_items(order_id, category, name, price, "
+            "qty, line_total) VALUES (?,?,?,?,?,?)",
+            [(order_id, it.get("category"), it.get("name", ""),
+              float(it.get("price", 0) or 0), int(it.get("qty", 0) or 0),
+              float(it.get("line_total", 0) or 0))
+             for it in lines],
+        )
+
+    db_path = os.path.join(folder, DB_FILE)
+    if os.path.exists(db_path):
+        src = sqlite3.connect(db_path)
+        try:
+            cur.executemany(
+                "INSERT OR REPLACE INTO branch_employees(branch, id, name) "
+                "VALUES (?,?,?)",
+                [(branch, eid, name) for eid, name in
+                 src.execute("SELECT id, name FROM employees")],
+            )
+        except sqlite3.Error:
+            pass
+        src.close()
+    con.commit()
+    con.close()
+    return branch, shard_path, skipped
+
+
+# ---------- Consolidation ----------
+
+def _merge_shard(con, shard_path):
+    # Set-based merge: the parent never touches individual orders.
+    cur = con.cursor()
+    cur.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+    before = cur.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0]
+    cur.execute(
+        "INSERT OR IGNORE INTO orders(branch, bill_no, datetime, employee, "
+        "method, food_cost, discount, vat, total_bill, paid, voucher_code, "
+        "discount_percent) "
+        "SELECT branch, bill_no, datetime, employee, method, food_cost, "
+        "discount, vat, total_bill, paid, voucher_code, discount_percent "
+        "FROM shard.orders ORDER BY id"
+    )
+    added = cur.rowcount
+    cur.execute(
+        "INSERT INTO order_items(order_id, category, name, price, qty, "
+        "line_total) "
+        "SELECT o.id, i.category, i.name, i.price, i.qty, i.line_total "
+        "FROM shard.order_items i "
+        "JOIN shard.orders so ON so.id = i.order_id "
+        "JOIN orders o ON o.branch = so.branch AND o.bill_no = so.bill_no "
+        "AND o.datetime = so.datetime "
+        "WHERE o.id > ?",
+        (before,),
+    )
+    cur.execute(
+        "INSERT OR REPLACE INTO branch_employees "
+        "SELECT branch, id, name FROM shard.branch_employees"
+    )
+    shard_total = cur.execute("SELECT COUNT(*) FROM shard.orders").fetchone()[0]
+    con.commit()
+    cur.execute("DETACH DATABASE shard")
+    return added, shard_total - added
+
+
+def consolidate(branches, out_db=CONSOLIDATED_DB, workers=None):
+    # branches: {branch name: folder holding orders.json / restaurant.db}.
+    # Each worker builds a shard for its branch; the parent merges shards as
+    # they arrive and dedupes across runs through the
+    # UNIQUE(branch, bill_no, datetime) key.
+    con = init_consolidated_db(out_db)
+    stats = {}
+    jobs = [(name, folder, f"{out_db}.{idx}.part")
+            for idx, (name, folder) in enumerate(sorted(branches.items()))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for branch, shard_path, skipped in pool.map(_ingest_branch, jobs):
+            added, dupes = _merge_shard(con, shard_path)
+            os.remove(shard_path)
+            stats[branch] = {"added": added, "duplicates": skipped + dupes}
+    con.close()
+    return stats
+
+
+# ---------- Consolidated reports ----------
+
+REPORT_QUERIES = {
+    "branch_daily": (
+        ["branch", "day", "orders", "food_cost", "discount", "vat", "total"],
+        "SELECT branch, substr(datetime, 1, 10) AS day, COUNT(*), "
+        "ROUND(SUM(food_cost), 2), ROUND(SUM(discount), 2), "
+        "ROUND(SUM(vat), 2), ROUND(SUM(total_bill), 2) "
+        "FROM orders GROUP BY branch, day ORDER BY day, branch",
+    ),
+    "branch_methods": (
+        ["branch", "method", "orders", "total"],
+        "SELECT branch, method, COUNT(*), ROUND(SUM(total_bill), 2) "
+        "FROM orders GROUP BY branch, method ORDER BY branch, method",
+    ),
+    "items": (
+        ["name", "branches", "qty", "amount"],
+        "SELECT i.name, COUNT(DISTINCT o.branch), SUM(i.qty), "
+        "ROUND(SUM(i.line_total), 2) "
+        "FROM order_items i JOIN orders o ON o.id = i.order_id "
+        "GROUP BY i.name ORDER BY SUM(i.qty) DESC",
+    ),
+}
+
+
+def write_reports(db_path=CONSOLIDATED_DB, out_dir=REPORT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    con = sqlite3.connect(db_path)
+    written = []
+    for name, (header, sql) in REPORT_QUERIES.items():
+        path = os.path.join(out_dir, f"consolidated_{name}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(con.execute(sql))
+        written.append(path)
+    con.close()
+    return written
+
+
+def parse_branch_args(args):
+    # "Gulshan=/data/gulshan" or just "/data/gulshan" (named after folder)
+    branches = {}
+    for arg in args:
+        name, sep, folder = arg.partition("=")
+        if not sep:
+            folder = name
+            name = os.path.basename(os.path.normpath(folder))
+        branches[name] = folder
+    return branches
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Merge several branch stores into one database.")
+    parser.add_argument("branches", nargs="+",
+                        help="branch folders, optionally as NAME=FOLDER")
+    parser.add_argument("--out", default=CONSOLIDATED_DB)
+    parser.add_argument("--reports", default=REPORT_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = consolidate(parse_branch_args(args.branches), args.out,
+                         args.workers)
+    for b, st in result.items():
+        print(f"{b}: {st['added']} added, {st['duplicates']} duplicates")
+    print("Reports:", ", ".join(write_reports(args.out, args.reports)))
+    print(f"Done in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,213 @@
+import warnings
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from billing import ORDER_FILE, order_lines
+from history import iter_history
+
+# ---------- Files ----------
+
+FORECAST_FILE = "forecast.npz"
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+# ---------- Time-series matrix ----------
+
+def build_matrix(orders, items=None):
+    # Returns (item names, first day, counts) where counts[d, h, i] is the
+    # quantity of item i sold on day d (offset from first day) in hour h.
+    # The Python loop only collects flat columns; binning is one bincount.
+    index = {name: i for i, name in enumerate(items)} if items else {}
+    fixed = bool(items)
+    names = list(items) if items else []
+    days, hours, per_order = [], [], []
+    item_idx, qtys = [], []
+
+    for o in orders:
+        stamp = o.get("datetime", "")
+        if len(stamp) < 13:
+            continue
+        n = 0
+        for it in order_lines(o):
+            name = it.get("name", "")
+            i = index.get(name)
+            if i is None:
+                if fixed:
+                    continue
+                i = index[name] = len(names)
+                names.append(name)
+            item_idx.append(i)
+            qtys.append(it.get("qty", 0))
+            n += 1
+        if n:
+            days.append(stamp[:10])
+            hours.append(int(stamp[11:13]))
+            per_order.append(n)
+
+    n_items = len(names)
+    if not days or not n_items:
+        return names, None, np.zeros((0, 24, n_items))
+
+    day_arr = np.array(days, dtype="datetime64[D]")
+    first = day_arr.min()
+    day_off = (day_arr - first).astype(np.int64)
+    n_days = int(day_off.max()) + 1
+
+    counts = np.asarray(per_order)
+    line_day = np.repeat(day_off, counts)
+    line_hour = np.repeat(np.asarray(hours, dtype=np.int64), counts)
+    flat = (line_day * 24 + line_hour) * n_items + np.asarray(item_idx)
+    mat = np.bincount(flat, weights=np.asarray(qtys, dtype=float),
+                      minlength=n_days * 24 * n_items)
+    return names, first, mat.reshape(n_days, 24, n_items)
+
+
+def _weekday(day):
+    # 1970-01-01 was a Thursday; Monday == 0
+    return int((day.astype(np.int64) + 3) % 7)
+
+
+def to_weeks(first, mat):
+    # Pads the day axis so it starts on a Monday and covers whole weeks;
+    # days outside the history are NaN so they don't count as zero sales.
+    lead = _weekday(first)
+    n_days, _, n_items = mat.shape
+    n_weeks = -(-(lead + n_days) // 7)
+    padded = np.full((n_weeks * 7, 24, n_items), np.nan)
+    padded[lead:lead + n_days] = mat
+    return padded.reshape(n_weeks, 7, 24, n_items)
+
+
+# ---------- Seasonal model ----------
+
+def _seasonal_fit(weeks, alpha, quantile):
+    n_weeks = weeks.shape[0]
+    weights = (1.0 - alpha) ** np.arange(n_weeks - 1, -1, -1)
+    seen = ~np.isnan(weeks)
+    wsum = np.tensordot(weights, seen, axes=1)
+    total = np.tensordot(weights, np.nan_to_num(weeks), axes=1)
+    mean = np.divide(total, wsum, out=np.zeros_like(total), where=wsum > 0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # unseen weekdays
+        high = np.nan_to_num(np.nanpercentile(weeks, quantile, axis=0))
+    return mean, high
+
+
+def fit(orders=None, items=None, alpha=0.3, quantile=80, path=ORDER_FILE):
+    # Weekday x hour profile per item: an exponentially weighted mean over
+    # past weeks (recent weeks count more) plus an upper quantile for prep.
+    if orders is None:
+        orders = iter_history(path)
+    names, first, mat = build_matrix(orders, items)
+    model = {
+        "items": names,
+        "first_day": None if first is None else str(first),
+        "days": int(mat.shape[0]),
+        "alpha": alpha,
+        "quantile": quantile,
+        "mean": np.zeros((7, 24, len(names))),
+        "high": np.zeros((7, 24, len(names))),
+        "mae": None,
+    }
+    if first is None:
+        return model
+
+    weeks = to_weeks(first, mat)
+    model["mean"], model["high"] = _seasonal_fit(weeks, alpha, quantile)
+
+    if weeks.shape[0] >= 2:
+        # one-step backtest: predict the last week from the ones before it
+        held_out = weeks[-1]
+        pred, _ = _seasonal_fit(weeks[:-1], alpha, quantile)
+        mask = ~np.isnan(held_out)
+        if mask.any():
+            model["mae"] = float(np.abs(pred - np.nan_to_num(held_out))[mask].mean())
+    return model
+
+
+def _item_index(model, item):
+    try:
+        return model["items"].index(item)
+    except ValueError:
+        raise KeyError(f"No history for item '{item}'") from None
+
+
+def weekly_profile(model, item, high=False):
+    # 7 x 24 array of expected quantity for one item.
+    return model["high" if high else "mean"][:, :, _item_index(model, item)]
+
+
+def forecast_window(model, start=None, hours=12, items=None, high=False):
+    # [(hour start, {item: expected qty})] for the next `hours` hours.
+    start = (start or datetime.now()).replace(minute=0, second=0, microsecond=0)
+    table = model["high" if high else "mean"]
+    cols = ([_item_index(model, it) for it in items] if items
+            else range(len(model["items"])))
+    out = []
+    for step in range(hours):
+        t = start + timedelta(hours=step)
+        row = table[t.weekday(), t.hour]
+        out.append((t, {model["items"][c]: float(row[c]) for c in cols}))
+    return out
+
+
+def prep_plan(model, day=None, items=None):
+    # Units to prepare per item for a whole day, rounded up, using the
+    # upper quantile so the kitchen rarely runs short.
+    day = day or datetime.now()
+    table = model["high"][day.weekday()]
+    cols = ([_item_index(model, it) for it in items] if items
+            else range(len(model["items"])))
+    return {model["items"][c]: int(np.ceil(table[:, c].sum())) for c in cols}
+
+
+# ---------- Persistence ----------
+
+def save_model(model, path=FORECAST_FILE):
+    np.savez_compressed(
+        path,
+        items=np.array(model["items"], dtype=str),
+        mean=model["mean"],
+        high=model["high"],
+        meta=np.array([model["first_day"] or "", str(model["days"]),
+                       str(model["alpha"]), str(model["quantile"]),
+                       "" if model["mae"] is None else str(model["mae"])]),
+    )
+
+
+def load_model(path=FORECAST_FILE):
+    with np.load(path) as data:
+        first_day, days, alpha, quantile, mae = data["meta"].tolist()
+        return {
+            "items": data["items"].tolist(),
+            "first_day": first_day or None,
+            "days": int(days),
+            "alpha": float(alpha),
+            "quantile": float(quantile),
+            "mean": data["mean"],
+            "high": data["high"],
+            "mae": float(mae) if mae else None,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Train the demand forecast.")
+    parser.add_argument("--orders", default=ORDER_FILE)
+    parser.add_argument("--out", default=FORECAST_FILE)
+    parser.add_argument("--alpha", type=float, default=0.3)
+    parser.add_argument("--item", action="append", default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    m = fit(items=args.item, alpha=args.alpha, path=args.orders)
+    elapsed = time.perf_counter() - started
+    save_model(m, args.out)
+    print(f"Trained on {m['days']} days, {len(m['items'])} items "
+          f"in {elapsed:.2f}s (backtest MAE per slot: {m['mae']})")
+    for name, qty in prep_plan(m).items():
+        print(f"  {name:<34}{qty:>6}")
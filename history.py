@@ -0,0 +1,306 @@
+import json
+import os
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from billing import ORDER_FILE, iter_orders, load_json, save_json
+
+# ---------- Files ----------
+
+# Closed months are moved out of orders.json into history/orders-YYYY-MM.seg
+# (zlib-compressed blocks of orders, appended back to back) with a sidecar
+# orders-YYYY-MM.idx holding block offsets plus one header row per order.
+HISTORY_DIR = "history"
+
+BLOCK_ORDERS = 64           # orders per compressed block
+
+# header row kept in the index for every order, followed by the offset and
+# length of its block and its position inside the block
+HEADER_FIELDS = ("datetime", "bill_no", "employee", "method", "total_bill",
+                 "voucher_code")
+
+# KACCHI_RETENTION_DAYS=0 keeps history forever. Past that age a segment is
+# either anonymized (staff, voucher and customer phone scrubbed, amounts kept
+# for reports) or deleted outright.
+RETENTION_DAYS = int(os.environ.get("KACCHI_RETENTION_DAYS", "0") or 0)
+RETENTION_MODE = os.environ.get("KACCHI_RETENTION_MODE", "anonymize")
+
+ANONYMIZED_FIELDS = {"employee": "", "voucher_code": "None", "customer": ""}
+
+
+def history_dir(path=ORDER_FILE):
+    # The segments live next to the order file they were rotated out of.
+    return os.path.join(os.path.dirname(path), HISTORY_DIR)
+
+
+def period_of(order):
+    return order.get("datetime", "")[:7]
+
+
+def _segment_paths(period, folder):
+    base = os.path.join(folder, f"orders-{period}")
+    return base + ".seg", base + ".idx"
+
+
+def periods(folder=HISTORY_DIR):
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name[7:-4] for name in os.listdir(folder)
+                  if name.startswith("orders-") and name.endswith(".idx"))
+
+
+# ---------- Index ----------
+
+def load_index(period, folder=HISTORY_DIR):
+    return load_json(_segment_paths(period, folder)[1],
+                     {"period": period, "anonymized": False,
+                      "blocks": [], "orders": []})
+
+
+def _save_index(index, folder):
+    # Compact and atomic: the index is the only thing that makes segment
+    # bytes visible, so a crash mid-append just leaves unused bytes behind.
+    path = _segment_paths(index["period"], folder)[1]
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _header(order, offset, length, pos):
+    return [order.get(k, "") for k in HEADER_FIELDS] + [offset, length, pos]
+
+
+def header_dict(row):
+    h = dict(zip(HEADER_FIELDS, row))
+    h["offset"], h["length"], h["pos"] = row[-3:]
+    return h
+
+
+# ---------- Segments ----------
+
+def _write_blocks(f, index, orders):
+    for start in range(0, len(orders), BLOCK_ORDERS):
+        chunk = orders[start:start + BLOCK_ORDERS]
+        data = zlib.compress(
+            json.dumps(chunk, separators=(",", ":")).encode("utf-8"), 6)
+        offset = f.tell()
+        index["blocks"].append([offset, len(data)])
+        index["orders"].extend(_header(o, offset, len(data), pos)
+                               for pos, o in enumerate(chunk))
+        f.write(data)
+
+
+def append_segment(period, orders, folder=HISTORY_DIR):
+    # Adds orders to a month's segment, skipping any already indexed there
+    # (a rotation interrupted before orders.json was rewritten).
+    os.makedirs(folder, exist_ok=True)
+    index = load_index(period, folder)
+    seen = {(row[0], row[1]) for row in index["orders"]}
+    orders = [o for o in orders
+              if (o.get("datetime", ""), o.get("bill_no", "")) not in seen]
+    if not orders:
+        return 0
+    with open(_segment_paths(period, folder)[0], "ab") as f:
+        f.seek(0, os.SEEK_END)
+        _write_blocks(f, index, orders)
+        f.flush()
+        os.fsync(f.fileno())
+    _save_index(index, folder)
+    return len(orders)
+
+
+def read_block(period, offset, length, folder=HISTORY_DIR):
+    with open(_segment_paths(period, folder)[0], "rb") as f:
+        f.seek(offset)
+        return json.loads(zlib.decompress(f.read(length)).decode("utf-8"))
+
+
+def fetch_order(period, row, folder=HISTORY_DIR):
+    # `row` is the order's header row. One seek and one block decompressed,
+    # however big the month is; the index itself is not read.
+    offset, length, pos = row[-3:]
+    return read_block(period, offset, length, folder)[pos]
+
+
+def iter_segment(period, folder=HISTORY_DIR):
+    for offset, length in load_index(period, folder)["blocks"]:
+        yield from read_block(period, offset, length, folder)
+
+
+def iter_history(path=ORDER_FILE, folder=None, first_day=None, last_day=None,
+                 live=None):
+    # Every order: the segments overlapping [first_day, last_day] (whole
+    # history when not given), then the live orders - `live` if passed,
+    # otherwise streamed from `path`. Day filtering is left to the caller.
+    folder = history_dir(path) if folder is None else folder
+    lo = first_day[:7] if first_day else ""
+    hi = last_day[:7] if last_day else "9999-99"
+    for period in periods(folder):
+        if lo <= period <= hi:
+            yield from iter_segment(period, folder)
+    yield from (iter_orders(path) if live is None else live)
+
+
+def history_headers(folder=HISTORY_DIR):
+    # [(period, header row)] for all archived orders without decompressing
+    # a single block.
+    out = []
+    for period in periods(folder):
+        out.extend((period, row) for row in load_index(period, folder)["orders"])
+    return out
+
+
+# ---------- Order body cache ----------
+
+# KACCHI_ORDER_CACHE caps how many full archived orders stay decompressed
+# in memory; lists and searches only ever hold the header rows.
+CACHE_ORDERS = int(os.environ.get("KACCHI_ORDER_CACHE", "256") or 0)
+
+
+class OrderCache:
+    # Least-recently-used map of order bodies keyed by (datetime, bill_no).
+    # get() calls `load` on a miss and evicts the oldest entry once full.
+
+    def __init__(self, size=CACHE_ORDERS):
+        self.size = size
+        self.orders = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        order = self.orders.get(key)
+        if order is not None:
+            self.orders.move_to_end(key)
+            self.hits += 1
+            return order
+        self.misses += 1
+        order = load()
+        if order is not None and self.size > 0:
+            self.orders[key] = order
+            while len(self.orders) > self.size:
+                self.orders.popitem(last=False)
+        return order
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "cached": len(self.orders), "size": self.size}
+
+
+# ---------- Rotation ----------
+
+def rotate(path=ORDER_FILE, folder=None, now=None):
+    # Moves every order from a month before the current one into its
+    # segment, then rewrites orders.json with what is left. Returns the
+    # number of orders moved.
+    folder = history_dir(path) if folder is None else folder
+    current = (now or datetime.now()).strftime("%Y-%m")
+    orders = load_json(path, [])
+    by_period, keep = {}, []
+    for o in orders:
+        p = period_of(o)
+        if p and p < current:
+            by_period.setdefault(p, []).append(o)
+        else:
+            keep.append(o)
+    if not by_period:
+        return 0
+    for p in sorted(by_period):
+        append_segment(p, by_period[p], folder)
+    save_json(path, keep)
+    return len(orders) - len(keep)
+
+
+# ---------- Retention ----------
+
+def _rewrite_segment(period, orders, folder, anonymized):
+    seg, _ = _segment_paths(period, folder)
+    index = {"period": period, "anonymized": anonymized,
+             "blocks": [], "orders": []}
+    with open(seg + ".tmp", "wb") as f:
+        _write_blocks(f, index, orders)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(seg + ".tmp", seg)
+    _save_index(index, folder)
+
+
+def anonymize_segment(period, folder=HISTORY_DIR):
+    orders = list(iter_segment(period, folder))
+    for o in orders:
+        o.update(ANONYMIZED_FIELDS)
+    _rewrite_segment(period, orders, folder, True)
+
+
+def delete_segment(period, folder=HISTORY_DIR):
+    for p in _segment_paths(period, folder):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def apply_retention(days=RETENTION_DAYS, mode=RETENTION_MODE,
+                    folder=HISTORY_DIR, today=None):
+    # A month is past retention once its last day is older than `days`.
+    # Returns [(period, action)] for the segments touched.
+    if days <= 0:
+        return []
+    if mode not in ("anonymize", "delete"):
+        raise ValueError(f"Unknown retention mode '{mode}'")
+    cutoff = ((today or datetime.now()) - timedelta(days=days)).strftime("%Y-%m")
+    done = []
+    for period in periods(folder):
+        if period >= cutoff:
+            break
+        if mode == "delete":
+            delete_segment(period, folder)
+        elif not load_index(period, folder).get("anonymized"):
+            anonymize_segment(period, folder)
+        else:
+            continue
+        done.append((period, mode))
+    return done
+
+
+def segment_stats(folder=HISTORY_DIR):
+    out = []
+    for period in periods(folder):
+        seg, idx = _segment_paths(period, folder)
+        index = load_index(period, folder)
+        out.append({
+            "period": period,
+            "orders": len(index["orders"]),
+            "blocks": len(index["blocks"]),
+            "seg_kb": os.path.getsize(seg) / 1024 if os.path.exists(seg) else 0.0,
+            "idx_kb": os.path.getsize(idx) / 1024,
+            "anonymized": bool(index.get("anonymized")),
+        })
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Rotate orders.json into monthly segments and apply retention.")
+    parser.add_argument("--orders", default=ORDER_FILE)
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--mode", choices=["anonymize", "delete"],
+                        default=RETENTION_MODE)
+    parser.add_argument("--stats", action="store_true")
+    args = parser.parse_args()
+
+    folder = history_dir(args.orders)
+    moved = rotate(args.orders, folder)
+    print(f"Rotated {moved} orders into {folder}")
+    for period, action in apply_retention(args.retention_days, args.mode, folder):
+        print(f"  {period}: {action}")
+    if args.stats:
+        print(f"{'month':<10}{'orders':>8}{'blocks':>8}{'seg KB':>10}"
+              f"{'idx KB':>10}  anonymized")
+        for st in segment_stats(folder):
+            print(f"{st['period']:<10}{st['orders']:>8}{st['blocks']:>8}"
+                  f"{st['seg_kb']:>10.1f}{st['idx_kb']:>10.1f}  "
+                  f"{'yes' if st['anonymized'] else 'no'}")
@@ -0,0 +1,405 @@
+import sqlite3
+from datetime import datetime
+
+from billing import DB_FILE, load_catalog, order_lines
+
+# ---------- Default recipes (first run only) ----------
+
+# ingredient: (unit, opening stock, low-stock level)
+DEFAULT_INGREDIENTS = {
+    "Kacchi portion": ("plate", 120, 15),
+    "Polao rice": ("plate", 60, 10),
+    "Chicken roast": ("pcs", 80, 10),
+    "Beef rezala": ("bowl", 40, 5),
+    "Jali kabab": ("pcs", 100, 15),
+    "Borhani": ("glass", 150, 20),
+    "Firni": ("bowl", 100, 15),
+    "Jorda": ("bowl", 60, 10),
+    "Soft drink": ("can", 120, 20),
+    "Mineral water": ("bottle", 200, 30),
+    "Salad": ("bowl", 80, 10),
+    "Chatni": ("cup", 150, 20),
+}
+
+# menu item name: [(ingredient, qty per item)]; resolved to item ids on seeding
+DEFAULT_RECIPES = {
+    "Basic Kacchi": [("Kacchi portion", 1)],
+    "Kacchi Meal": [("Kacchi portion", 1), ("Salad", 1), ("Mineral water", 1)],
+    "Kacchi + Borhani + Firni": [
+        ("Kacchi portion", 1), ("Borhani", 1), ("Firni", 1)],
+    "Kacchi + Roast + Borhani": [
+        ("Kacchi portion", 1), ("Chicken roast", 1), ("Borhani", 1)],
+    "Kacchi + Roast + Borhani + Firni": [
+        ("Kacchi portion", 1), ("Chicken roast", 1), ("Borhani", 1),
+        ("Firni", 1)],
+    "Borhani": [("Borhani", 1)],
+    "Soft Drink": [("Soft drink", 1)],
+    "Mineral Water": [("Mineral water", 1)],
+    "Firni": [("Firni", 1)],
+    "Jorda": [("Jorda", 1)],
+    "Plain Polao": [("Polao rice", 1)],
+    "Chicken Roast": [("Chicken roast", 1)],
+    "Beef Rezala": [("Beef rezala", 1)],
+    "Jali Kabab": [("Jali kabab", 1)],
+    "Salad": [("Salad", 1)],
+    "Chatni": [("Chatni", 1)],
+    "Sharing Platter 1": [
+        ("Kacchi portion", 2), ("Borhani", 2), ("Firni", 2)],
+    "Sharing Platter 2": [
+        ("Kacchi portion", 4), ("Chicken roast", 4), ("Jali kabab", 4),
+        ("Borhani", 4), ("Firni", 4)],
+}
+
+
+def init_inventory_db(path=DB_FILE):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingredients (
+            name TEXT PRIMARY KEY,
+            unit TEXT NOT NULL DEFAULT '',
+            stock REAL NOT NULL DEFAULT 0,
+            low_level REAL NOT NULL DEFAULT 0
+        )
+    """)
+
+    # Recipes hang off the menu item id, so renaming an item keeps its
+    # recipe. The older name-keyed table only holds rows waiting for an item
+    # with that name; they are moved over below and warned about until then.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS item_recipes (
+            item_id INTEGER NOT NULL REFERENCES menu_items(id),
+            ingredient TEXT NOT NULL REFERENCES ingredients(name),
+            qty REAL NOT NULL,
+            PRIMARY KEY (item_id, ingredient)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS recipes (
+            item_name TEXT NOT NULL,
+            ingredient TEXT NOT NULL REFERENCES ingredients(name),
+            qty REAL NOT NULL,
+            PRIMARY KEY (item_name, ingredient)
+        )
+    """)
+
+    # one row per order already taken out of stock, so a commit is applied
+    # exactly once even if the app dies between saving the order and here
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS stock_moves (
+            order_key TEXT PRIMARY KEY,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # tracking_since: orders placed before it were never taken out of stock
+    # and never will be. A store that already has stock moves keeps "", so
+    # every order it has not applied yet still is.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+    cur.execute("SELECT 1 FROM inventory_meta WHERE key = 'tracking_since'")
+    if cur.fetchone() is None:
+        cur.execute("SELECT 1 FROM stock_moves LIMIT 1")
+        since = ("" if cur.fetchone()
+                 else datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        cur.execute("INSERT INTO inventory_meta(key, value) "
+                    "VALUES ('tracking_since', ?)", (since,))
+
+    cur.execute("SELECT COUNT(*) FROM ingredients")
+    if cur.fetchone()[0] == 0:
+        cur.executemany(
+            "INSERT INTO ingredients(name, unit, stock, low_level) "
+            "VALUES (?,?,?,?)",
+            [(n, u, float(s), float(low))
+             for n, (u, s, low) in DEFAULT_INGREDIENTS.items()],
+        )
+        cur.executemany(
+            "INSERT INTO recipes(item_name, ingredient, qty) VALUES (?,?,?)",
+            [(item, ing, float(q))
+             for item, lines in DEFAULT_RECIPES.items()
+             for ing, q in lines],
+        )
+
+    ids = _item_ids(cur)
+    moved = [(item, ing, q) for item, ing, q in cur.execute(
+        "SELECT item_name, ingredient, qty FROM recipes").fetchall()
+        if item in ids]
+    cur.executemany(
+        "INSERT OR IGNORE INTO item_recipes(item_id, ingredient, qty) "
+        "VALUES (?,?,?)", [(ids[item], ing, q) for item, ing, q in moved])
+    cur.executemany("DELETE FROM recipes WHERE item_name = ? AND ingredient = ?",
+                    [(item, ing) for item, ing, _q in moved])
+    con.commit()
+    con.close()
+
+
+def _item_ids(cur):
+    # name -> menu item id; a listed item wins over a retired one.
+    try:
+        return dict(cur.execute(
+            "SELECT name, id FROM menu_items ORDER BY active, id DESC"))
+    except sqlite3.Error:
+        return {}       # no menu in this database (yet)
+
+
+def item_ids(path=DB_FILE):
+    con = sqlite3.connect(path)
+    try:
+        return _item_ids(con)
+    finally:
+        con.close()
+
+
+def item_names(path=DB_FILE):
+    # menu item id -> current name, retired items included.
+    return {item_id: name
+            for item_id, (_cat, name) in load_catalog(path)["items"].items()}
+
+
+def order_key(order):
+    return f'{order.get("bill_no", "")}@{order.get("datetime", "")}'
+
+
+# ---------- Incrementally maintained stock view ----------
+
+class Inventory:
+    # Keeps stock levels and the set of low-stock menu item ids in memory.
+    # Every change goes to the DB and is then applied to the view as a delta;
+    # nothing is ever recomputed from order history.
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        init_inventory_db(path)
+        con = sqlite3.connect(path)
+        self.stock = {}
+        self.units = {}
+        self.low_level = {}
+        for name, unit, stock, low in con.execute(
+                "SELECT name, unit, stock, low_level FROM ingredients"):
+            self.stock[name] = stock
+            self.units[name] = unit
+            self.low_level[name] = low
+        self.recipes = {}
+        for item_id, ing, qty in con.execute(
+                "SELECT item_id, ingredient, qty FROM item_recipes"):
+            self.recipes.setdefault(item_id, []).append((ing, qty))
+        # legacy recipes whose name matches no menu item; never applied
+        self.unmatched = {}
+        for item, ing, qty in con.execute(
+                "SELECT item_name, ingredient, qty FROM recipes"):
+            self.unmatched.setdefault(item, []).append((ing, qty))
+        con.close()
+
+        self._rebuild_users()
+        self.low_items = set()
+        for item in self.recipes:
+            if self._item_is_low(item):
+                self.low_items.add(item)
+
+    def _rebuild_users(self):
+        self.used_by = {}
+        for item, lines in self.recipes.items():
+            for ing, _qty in lines:
+                self.used_by.setdefault(ing, set()).add(item)
+
+    def _item_is_low(self, item):
+        for ing, qty in self.recipes.get(item, []):
+            level = self.stock.get(ing, 0.0)
+            if level < qty or level <= self.low_level.get(ing, 0.0):
+                return True
+        return False
+
+    def _refresh(self, ingredients):
+        # Re-evaluate only items that use the touched ingredients; returns the
+        # items whose low-stock state flipped.
+        changed = set()
+        for ing in ingredients:
+            for item in self.used_by.get(ing, ()):
+                low = self._item_is_low(item)
+                if low != (item in self.low_items):
+                    changed.add(item)
+                    if low:
+                        self.low_items.add(item)
+                    else:
+                        self.low_items.discard(item)
+        return changed
+
+    def is_low(self, item_id):
+        return item_id in self.low_items
+
+    def deltas_for(self, items):
+        # Collapse all order lines into one decrement per ingredient. Lines of
+        # orders from before item ids only have a name to go by.
+        deltas = {}
+        ids = None
+        for it in items:
+            q = it.get("qty", 0)
+            item_id = it.get("item_id")
+            if item_id is None:
+                if ids is None:
+                    ids = item_ids(self.path)
+                item_id = ids.get(it.get("name"))
+            for ing, per_item in self.recipes.get(item_id, []):
+                deltas[ing] = deltas.get(ing, 0.0) + per_item * q
+        return deltas
+
+    def commit_order(self, order, con=None):
+        # Batched decrement for one order in a single transaction. Pass an open
+        # connection to fold the decrement into a caller's transaction.
+        deltas = self.deltas_for(order_lines(order, path=self.path))
+        own = con is None
+        if own:
+            con = sqlite3.connect(self.path)
+        try:
+            cur = con.cursor()
+            cur.execute("INSERT OR IGNORE INTO stock_moves(order_key) VALUES (?)",
+                        (order_key(order),))
+            if cur.rowcount == 0:
+                return set()    # already applied
+            cur.executemany(
+                "UPDATE ingredients SET stock = stock - ? WHERE name = ?",
+                [(q, ing) for ing, q in deltas.items()],
+            )
+            if own:
+                con.commit()
+        except sqlite3.Error:
+            if own:
+                con.rollback()
+            raise
+        finally:
+            if own:
+                con.close()
+
+        for ing, q in deltas.items():
+            self.stock[ing] = self.stock.get(ing, 0.0) - q
+        return self._refresh(deltas)
+
+    def catch_up(self, orders):
+        # Apply orders saved after the last stock commit (e.g. a crash between
+        # save_orders() and commit_order()). Walks back from the newest order
+        # and stops at the first one already applied, or placed before stock
+        # was tracked at all.
+        con = sqlite3.connect(self.path)
+        since = con.execute("SELECT value FROM inventory_meta "
+                            "WHERE key = 'tracking_since'").fetchone()[0]
+        pending = []
+        for o in reversed(orders):
+            if o.get("datetime", "") < since:
+                break
+            hit = con.execute("SELECT 1 FROM stock_moves WHERE order_key = ?",
+                              (order_key(o),)).fetchone()
+            if hit:
+                break
+            pending.append(o)
+        con.close()
+        changed = set()
+        for o in reversed(pending):
+            changed |= self.commit_order(o)
+        return changed
+
+    def receive(self, ingredient, qty, unit=""):
+        con = sqlite3.connect(self.path)
+        con.execute(
+            "INSERT INTO ingredients(name, unit, stock) VALUES (?,?,?) "
+            "ON CONFLICT(name) DO UPDATE SET stock = stock + excluded.stock",
+            (ingredient, unit, float(qty)),
+        )
+        con.commit()
+        con.close()
+        if ingredient not in self.stock:
+            self.units[ingredient] = unit
+            self.low_level[ingredient] = 0.0
+        self.stock[ingredient] = self.stock.get(ingredient, 0.0) + float(qty)
+        return self._refresh([ingredient])
+
+    def set_low_level(self, ingredient, level):
+        con = sqlite3.connect(self.path)
+        con.execute("UPDATE ingredients SET low_level = ? WHERE name = ?",
+                    (float(level), ingredient))
+        con.commit()
+        con.close()
+        self.low_level[ingredient] = float(level)
+        return self._refresh([ingredient])
+
+    def set_recipes(self, recipes):
+        # Replace the full bill of materials {item id: [(ingredient, qty)]}.
+        # Unmatched legacy recipes were shown in the editor and go too.
+        con = sqlite3.connect(self.path)
+        cur = con.cursor()
+        cur.execute("DELETE FROM item_recipes")
+        cur.execute("DELETE FROM recipes")
+        for item_id, lines in recipes.items():
+            for ing, qty in lines:
+                cur.execute("INSERT OR IGNORE INTO ingredients(name) VALUES (?)",
+                            (ing,))
+                cur.execute(
+                    "INSERT OR REPLACE INTO item_recipes(item_id, ingredient, qty) "
+                    "VALUES (?,?,?)", (item_id, ing, float(qty)))
+        con.commit()
+        con.close()
+        self.unmatched = {}
+
+        old_low = set(self.low_items)
+        for lines in recipes.values():
+            for ing, _qty in lines:
+                self.stock.setdefault(ing, 0.0)
+                self.units.setdefault(ing, "")
+                self.low_level.setdefault(ing, 0.0)
+        self.recipes = {item: list(lines) for item, lines in recipes.items()}
+        self._rebuild_users()
+        self.low_items = {item for item in self.recipes
+                          if self._item_is_low(item)}
+        return old_low ^ self.low_items
+
+
+# ---------- Recipe text format ----------
+
+# The editor shows item names; recipes are stored by item id. names is
+# {item id: name} (see item_names), ids is {name: item id} (see item_ids).
+
+def format_recipes(recipes, names):
+    lines = []
+    for item_id in sorted(recipes, key=lambda i: names.get(i, "")):
+        parts = [f"{ing} x {qty:g}" for ing, qty in recipes[item_id]]
+        lines.append(f"{names.get(item_id, f'Item #{item_id}')}: "
+                     + "; ".join(parts))
+    return "\n".join(lines)
+
+
+def parse_recipes(text, ids):
+    # "Kacchi Meal: Kacchi portion x 1; Salad x 1"
+    recipes = {}
+    errors = []
+    for lineno, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        item, sep, rest = line.partition(":")
+        if not sep or not item.strip():
+            errors.append(f"line {lineno}: expected 'Item: ingredient x qty'")
+            continue
+        parts = []
+        for chunk in rest.split(";"):
+            chunk = chunk.strip()
+            if not chunk:
+                continue
+            ing, sep, qty = chunk.rpartition(" x ")
+            try:
+                q = float(qty)
+            except ValueError:
+                q = None
+            if not sep or not ing.strip() or q is None:
+                errors.append(f"line {lineno}: bad ingredient '{chunk}'")
+                continue
+            parts.append((ing.strip(), q))
+        item = item.strip()
+        if item not in ids:
+            errors.append(f"line {lineno}: no menu item '{item}'")
+            continue
+        recipes[ids[item]] = parts
+    return recipes, errors
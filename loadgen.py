@@ -0,0 +1,257 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+import billing
+from billing import (
+    ORDER_FILE,
+    init_db, load_menu_items, save_vouchers, load_vouchers,
+    authenticate, generate_bill_no, check_voucher, change_text,
+    build_order, record_order,
+)
+from pricing import Cart, compile_rules, load_rules
+from staff import StaffDirectory
+
+# ---------- Basket model ----------
+
+# how many distinct lines a ticket has
+LINE_COUNT_WEIGHTS = {1: 30, 2: 30, 3: 20, 4: 10, 5: 6, 8: 3, 12: 1}
+
+# relative popularity per category; combos sell most
+CATEGORY_WEIGHTS = {
+    "Kacchi Combo": 5,
+    "Drinks & Dessert": 4,
+    "Add-ons": 2,
+    "Sharing Platter": 1,
+}
+
+QTY_WEIGHTS = {1: 70, 2: 20, 3: 6, 4: 3, 6: 1}
+
+METHOD_WEIGHTS = {"Cash": 50, "bKash": 25, "Nagad": 10, "Rocket": 5, "Card": 10}
+
+VOUCHER_RATE = 0.15
+VOUCHERS = {"LOAD10": 10.0, "LOAD15": 15.0, "LOAD20": 20.0}
+
+
+def menu_catalog(items=None):
+    items = load_menu_items() if items is None else items
+    return items, [CATEGORY_WEIGHTS.get(it.category, 1) for it in items]
+
+
+def _pick(rng, table):
+    return rng.choices(list(table), weights=list(table.values()))[0]
+
+
+def random_basket(rng, catalog):
+    items, weights = catalog
+    n = min(_pick(rng, LINE_COUNT_WEIGHTS), len(items))
+    chosen = set()
+    while len(chosen) < n:
+        chosen.add(rng.choices(range(len(items)), weights=weights)[0])
+    return [(idx, _pick(rng, QTY_WEIGHTS)) for idx in sorted(chosen)]
+
+
+# ---------- Recording ----------
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, op, seconds):
+        with self.lock:
+            self.samples.setdefault(op, []).append(seconds)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100.0 * (len(values) - 1))))]
+
+
+# ---------- Synthetic cashier ----------
+
+def run_cashier(cashier_id, n_orders, ctx, rec, seed):
+    rng = random.Random(seed)
+    catalog = ctx["catalog"]
+    items = catalog[0]
+
+    t = time.perf_counter()
+    display_name, error = authenticate(ctx["staff"], "Employee",
+                                       cashier_id, "pw" + cashier_id)
+    rec.add("login", time.perf_counter() - t)
+    if error:
+        raise RuntimeError(f"cashier {cashier_id}: {error}")
+
+    for _ in range(n_orders):
+        started = time.perf_counter()
+
+        # one "+" click per unit, re-pricing the cart each time like
+        # calculate_totals() does
+        cart = {}
+        pricer = Cart(ctx["plan"])
+        for idx, qty in random_basket(rng, catalog):
+            for _click in range(qty):
+                t = time.perf_counter()
+                cart[idx] = cart.get(idx, 0) + 1
+                pricer.set(idx, cart[idx])
+                subtotal = pricer.price()["subtotal"]
+                rec.add("qty_change", time.perf_counter() - t)
+
+        code, percent = None, 0.0
+        if rng.random() < VOUCHER_RATE:
+            t = time.perf_counter()
+            code = rng.choice(list(VOUCHERS))
+            percent, error = check_voucher(ctx["vouchers"], code, subtotal)
+            if error:
+                code, percent = None, 0.0
+            rec.add("apply_voucher", time.perf_counter() - t)
+        priced = pricer.price((code, percent, False) if code else None)
+        total = priced["total"]
+
+        method = _pick(rng, METHOD_WEIGHTS)
+        paid = (int(total // 100) + 1) * 100.0 if method == "Cash" else total
+
+        t = time.perf_counter()
+        order = build_order(
+            [(items[i].item_id, items[i].price_id, q) for i, q in cart.items()],
+            generate_bill_no(), display_name, method, round(total, 2), paid,
+            change_text(paid, total) if method == "Cash" else "",
+            code if priced["voucher_applied"] else None,
+            priced["discount"] / subtotal * 100.0 if subtotal else 0.0,
+            discount=priced["discount"], promotions=priced["promotions"],
+        )
+        with ctx["store_lock"]:
+            record_order(order, ctx["orders"], ctx["vouchers"])
+            if ctx["inventory"] is not None:
+                ctx["inventory"].commit_order(order)
+        rec.add("payment_complete", time.perf_counter() - t)
+        rec.add("order_total", time.perf_counter() - started)
+
+        with ctx["store_lock"]:
+            ctx["growth"].append((time.perf_counter(), len(ctx["orders"]),
+                                  os.path.getsize(ORDER_FILE)))
+
+
+# ---------- Driver ----------
+
+def prepare_store(workdir, cashiers):
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    init_db()
+    directory = StaffDirectory()
+    for i in range(cashiers):
+        if directory.get(f"C{i:03d}") is None:     # a reused workdir
+            directory.add(f"C{i:03d}", f"Cashier {i}", f"pwC{i:03d}")
+    save_vouchers({code: {"code": code, "discount": pct, "max_uses": 0,
+                          "used": 0, "deleted": False}
+                   for code, pct in VOUCHERS.items()})
+    billing.save_orders([])
+
+
+def run(cashiers=4, orders_per_cashier=200, workdir=None, seed=1,
+        with_inventory=True):
+    workdir = os.path.abspath(workdir or tempfile.mkdtemp(prefix="kacchi_load_"))
+    prepare_store(workdir, cashiers)
+
+    inventory = None
+    if with_inventory:
+        from inventory import Inventory
+        inventory = Inventory()
+
+    catalog = menu_catalog()
+    ctx = {
+        "catalog": catalog,
+        "plan": compile_rules(load_rules(), catalog[0]),
+        "staff": StaffDirectory(),
+        "vouchers": load_vouchers(),
+        "orders": [],
+        "inventory": inventory,
+        "store_lock": threading.Lock(),
+        "growth": [],
+    }
+    rec = Recorder()
+    errors = []
+
+    def worker(i):
+        try:
+            run_cashier(f"C{i:03d}", orders_per_cashier, ctx, rec, seed + i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(cashiers)]
+    started = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "workdir": workdir,
+        "cashiers": cashiers,
+        "orders": len(ctx["orders"]),
+        "elapsed": elapsed,
+        "throughput": len(ctx["orders"]) / elapsed if elapsed else 0.0,
+        "latency": {op: {"count": len(v),
+                         "p50": percentile(v, 50),
+                         "p95": percentile(v, 95),
+                         "p99": percentile(v, 99),
+                         "max": max(v)}
+                    for op, v in rec.samples.items()},
+        "growth": ctx["growth"],
+        "errors": [str(e) for e in errors],
+    }
+
+
+def format_result(result):
+    lines = [
+        f"Store:       {result['workdir']}",
+        f"Cashiers:    {result['cashiers']}",
+        f"Orders:      {result['orders']} in {result['elapsed']:.2f}s "
+        f"({result['throughput']:.1f} orders/s)",
+        "",
+        f"{'operation':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for op in ("login", "qty_change", "apply_voucher", "payment_complete",
+               "order_total"):
+        st = result["latency"].get(op)
+        if not st:
+            continue
+        lines.append(f"{op:<18}{st['count']:>8}{st['p50'] * 1000:>10.3f}"
+                     f"{st['p95'] * 1000:>10.3f}{st['p99'] * 1000:>10.3f}"
+                     f"{st['max'] * 1000:>10.3f}")
+
+    growth = result["growth"]
+    if growth:
+        lines += ["", "Store growth", f"{'orders':>10}{'size KB':>12}"
+                  f"{'bytes/order':>14}"]
+        step = max(1, len(growth) // 8)
+        for _t, n, size in growth[step - 1::step]:
+            lines.append(f"{n:>10}{size / 1024:>12.1f}{size / n:>14.0f}")
+    if result["errors"]:
+        lines += ["", "Errors:"] + [f"  {e}" for e in result["errors"]]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Simulate concurrent cashiers against a scratch store.")
+    parser.add_argument("--cashiers", type=int, default=4)
+    parser.add_argument("--orders", type=int, default=200,
+                        help="orders per cashier")
+    parser.add_argument("--workdir", default=None,
+                        help="scratch folder for the store (default: temp)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-inventory", action="store_true")
+    args = parser.parse_args()
+
+    print(format_result(run(args.cashiers, args.orders, args.workdir,
+                            args.seed, not args.no_inventory)))
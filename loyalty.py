@@ -0,0 +1,288 @@
+import sqlite3
+from datetime import datetime
+
+from billing import DB_FILE
+from history import HISTORY_DIR, header_dict, load_index, periods
+from inventory import order_key
+
+# ---------- Rules ----------
+
+EARN_PER_TK = 0.01      # 1 point per Tk 100 paid, after discounts
+POINT_VALUE = 1.0       # Tk off the bill per point redeemed
+MIN_REDEEM = 50         # points needed before any can be spent
+
+SUGGEST_LIMIT = 8
+
+
+def normalize_phone(text):
+    # Returns (phone, None) or (None, error message). Stored as the local
+    # 11-digit form, so "+880 1712-345678" and "01712345678" are one customer.
+    digits = "".join(ch for ch in str(text or "") if ch.isdigit())
+    if digits.startswith("880"):
+        digits = "0" + digits[3:]
+    if len(digits) != 11 or not digits.startswith("01"):
+        return None, "Enter an 11-digit mobile number (01XXXXXXXXX)."
+    return digits, None
+
+
+def points_for(total):
+    return int(max(0.0, total) * EARN_PER_TK)
+
+
+def redeem_value(points):
+    return points * POINT_VALUE
+
+
+def init_loyalty_db(path=DB_FILE):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    # the phone number is the key, so lookups and prefix search both run
+    # on the primary key index
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS customers (
+            phone TEXT PRIMARY KEY,
+            name TEXT NOT NULL DEFAULT '',
+            points INTEGER NOT NULL DEFAULT 0,
+            joined_at TEXT NOT NULL,
+            last_visit TEXT
+        ) WITHOUT ROWID
+    """)
+    # one row per order, so earning and spending are applied exactly once
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS points_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_key TEXT NOT NULL UNIQUE,
+            phone TEXT NOT NULL,
+            earned INTEGER NOT NULL,
+            redeemed INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            at TEXT NOT NULL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_points_ledger_phone "
+                "ON points_ledger(phone, id)")
+    con.commit()
+    con.close()
+
+
+# ---------- Accounts ----------
+
+class LoyaltyBook:
+    # Customer accounts and their points. Balances change only through
+    # commit_order(), in the same transaction as the ledger row.
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        init_loyalty_db(path)
+
+    def lookup(self, phone):
+        con = sqlite3.connect(self.path)
+        row = con.execute("SELECT phone, name, points, last_visit FROM "
+                          "customers WHERE phone = ?", (phone,)).fetchone()
+        con.close()
+        if row is None:
+            return None
+        return {"phone": row[0], "name": row[1], "points": row[2],
+                "last_visit": row[3]}
+
+    def suggest(self, prefix, limit=SUGGEST_LIMIT):
+        # Customers whose number starts with the digits typed so far, as a
+        # range scan of the primary key: [(phone, name, points)]
+        digits = "".join(ch for ch in prefix if ch.isdigit())
+        if digits.startswith("880"):
+            digits = "0" + digits[3:]
+        if len(digits) < 3:
+            return []
+        con = sqlite3.connect(self.path)
+        rows = con.execute(
+            "SELECT phone, name, points FROM customers "
+            "WHERE phone >= ? AND phone < ? ORDER BY phone LIMIT ?",
+            (digits, digits + ":", limit)).fetchall()    # ":" follows "9"
+        con.close()
+        return rows
+
+    def enroll(self, phone, name=""):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        con = sqlite3.connect(self.path)
+        try:
+            con.execute("INSERT INTO customers(phone, name, joined_at) "
+                        "VALUES (?,?,?)", (phone, name.strip(), now))
+            con.commit()
+        except sqlite3.IntegrityError:
+            raise ValueError(f"{phone} is already a member.") from None
+        finally:
+            con.close()
+        return self.lookup(phone)
+
+    def commit_order(self, order, con=None):
+        # Earn and spend the order's points in one transaction with its
+        # ledger row, before the order itself is saved. Returns the new
+        # balance, or None when the order has no customer or was already
+        # applied. Spending more than the balance (e.g. the same points used
+        # at another till meanwhile) fails the whole commit with ValueError.
+        phone = order.get("customer")
+        if not phone:
+            return None
+        earned = int(order.get("points_earned", 0))
+        redeemed = int(order.get("points_redeemed", 0))
+        own = con is None
+        if own:
+            con = sqlite3.connect(self.path)
+        try:
+            cur = con.cursor()
+            cur.execute(
+                "INSERT OR IGNORE INTO points_ledger(order_key, phone, earned, "
+                "redeemed, balance, at) VALUES (?,?,?,?,0,?)",
+                (order_key(order), phone, earned, redeemed,
+                 order.get("datetime", "")))
+            if cur.rowcount == 0:
+                return None     # already applied
+            entry = cur.lastrowid
+            cur.execute(
+                "UPDATE customers SET points = points + ? - ?, last_visit = ? "
+                "WHERE phone = ? AND points >= ?",
+                (earned, redeemed, order.get("datetime", ""), phone, redeemed))
+            if cur.rowcount == 0:
+                cur.execute("DELETE FROM points_ledger WHERE id = ?", (entry,))
+                raise ValueError(f"Not enough points on {phone}.")
+            balance = cur.execute("SELECT points FROM customers WHERE phone = ?",
+                                  (phone,)).fetchone()[0]
+            cur.execute("UPDATE points_ledger SET balance = ? WHERE id = ?",
+                        (balance, entry))
+            if own:
+                con.commit()
+        except sqlite3.Error:
+            if own:
+                con.rollback()
+            raise
+        finally:
+            if own:
+                con.close()
+        return balance
+
+    def revert_order(self, order):
+        # Undo commit_order() for an order that was never saved (payment
+        # declined, or a crash before save_orders()). Returns True if there
+        # was anything to undo.
+        return self._revert(order_key(order))
+
+    def _revert(self, key):
+        con = sqlite3.connect(self.path)
+        try:
+            cur = con.cursor()
+            row = cur.execute("SELECT id, phone, earned, redeemed FROM "
+                              "points_ledger WHERE order_key = ?",
+                              (key,)).fetchone()
+            if row is None:
+                return False
+            cur.execute("DELETE FROM points_ledger WHERE id = ?", (row[0],))
+            cur.execute("UPDATE customers SET points = points - ? + ? "
+                        "WHERE phone = ?", (row[2], row[3], row[1]))
+            con.commit()
+        finally:
+            con.close()
+        return True
+
+    def catch_up(self, orders, folder=HISTORY_DIR):
+        # Reconcile the ledger with the saved orders after a crash. Entries
+        # committed at or after the newest order but never saved with it are
+        # reverted; orders saved but missing from the ledger are applied,
+        # walking back from the newest until one is found already applied.
+        # Right after a monthly rotation the live orders are empty, and the
+        # newest saved order is the last archived one (its index header
+        # carries the datetime and bill number, so nothing is decompressed).
+        con = sqlite3.connect(self.path)
+        orphans = []
+        tail = orders or [header_dict(row) for period in periods(folder)[-1:]
+                          for row in load_index(period, folder)["orders"]]
+        if tail:
+            newest = tail[-1].get("datetime", "")
+            saved = set()
+            for o in reversed(tail):
+                if o.get("datetime", "") < newest:
+                    break
+                saved.add(order_key(o))
+            orphans = [key for (key,) in con.execute(
+                "SELECT order_key FROM points_ledger WHERE at >= ?", (newest,))
+                if key not in saved]
+        pending = []
+        for o in reversed(orders):
+            if not o.get("customer"):
+                continue
+            if con.execute("SELECT 1 FROM points_ledger WHERE order_key = ?",
+                           (order_key(o),)).fetchone():
+                break
+            pending.append(o)
+        con.close()
+        for key in orphans:
+            self._revert(key)
+        applied = 0
+        for o in reversed(pending):
+            try:
+                if self.commit_order(o) is not None:
+                    applied += 1
+            except ValueError:
+                pass    # points already spent elsewhere; nothing to undo
+        return applied
+
+    def history(self, phone, limit=20):
+        con = sqlite3.connect(self.path)
+        rows = con.execute(
+            "SELECT at, order_key, earned, redeemed, balance FROM points_ledger "
+            "WHERE phone = ? ORDER BY id DESC LIMIT ?", (phone, limit)).fetchall()
+        con.close()
+        return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import random
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Time customer lookups on a synthetic member base.")
+    parser.add_argument("--customers", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        book = LoyaltyBook(os.path.join(tmp, "loyalty.db"))
+        phones = sorted({f"01{rng.randint(300000000, 999999999)}"
+                         for _ in range(args.customers)})
+        con = sqlite3.connect(book.path)
+        con.executemany("INSERT INTO customers(phone, name, points, joined_at) "
+                        "VALUES (?,?,?,?)",
+                        [(p, f"Customer {i}", rng.randint(0, 500),
+                          "2025-01-01 00:00:00") for i, p in enumerate(phones)])
+        con.commit()
+        con.close()
+
+        def timed(fn, values):
+            samples = []
+            for v in values:
+                t = time.perf_counter()
+                fn(v)
+                samples.append(time.perf_counter() - t)
+            samples.sort()
+            return (samples[len(samples) // 2] * 1000,
+                    samples[int(len(samples) * 0.99) - 1] * 1000)
+
+        probe = [rng.choice(phones) for _ in range(args.runs)]
+        # every keystroke from the 3rd digit on, as typed at the till
+        typed = [p[:n] for p in probe[:args.runs // 9 + 1] for n in range(3, 12)]
+        for label, fn, values in [
+            ("lookup", book.lookup, probe),
+            ("as-you-type", book.suggest, typed),
+        ]:
+            p50, p99 = timed(fn, values)
+            print(f"{label:<12} {len(phones)} customers: "
+                  f"p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+
+        orders = [{"customer": p, "datetime": "2025-01-02 12:00:00",
+                   "bill_no": str(n), "points_earned": 5, "points_redeemed": 0}
+                  for n, p in enumerate(probe)]
+        p50, p99 = timed(book.commit_order, orders)
+        print(f"{'commit':<12} p50 {p50:.3f} ms, p99 {p99:.3f} ms")
@@ -0,0 +1,305 @@
+import csv
+import json
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from billing import CATEGORIES, DB_FILE, CURRENT_MENU_SQL, load_catalog, set_price
+
+# ---------- Format ----------
+
+# One row per item, in menu order. CSV needs a header; "code" is optional.
+# JSON may be an array of objects (.json) or one object per line (.jsonl).
+FIELDS = ("category", "code", "name", "price")
+
+MAX_NAME = 80
+MAX_ERRORS = 200        # stop collecting after this many bad lines
+
+
+# ---------- Reading + validation ----------
+
+def read_rows(path):
+    # Yields (line, row dict or None, error or None) from a menu file. CSV
+    # and JSONL are streamed line by line.
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            missing = {"category", "name", "price"} - set(reader.fieldnames or [])
+            if missing:
+                yield 1, None, f"missing column(s): {', '.join(sorted(missing))}"
+                return
+            for row in reader:
+                yield reader.line_num, row, None
+    elif ext == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield n, json.loads(line), None
+                except ValueError as e:
+                    yield n, None, f"bad JSON: {e}"
+    elif ext == ".json":
+        # A JSON array has to parse as a whole, or a truncated file would
+        # silently look like a shorter menu; use .jsonl for huge imports.
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError as e:
+            yield getattr(e, "lineno", 0), None, f"bad JSON: {e}"
+            return
+        if not isinstance(data, list):
+            yield 1, None, "expected a JSON array of items"
+            return
+        for n, obj in enumerate(data, 1):
+            yield n, obj, None
+    else:
+        yield 0, None, f"unsupported file type '{ext}' (use .csv, .json or .jsonl)"
+
+
+def validate(rows):
+    # Returns (items, errors). Every problem is reported with its line;
+    # nothing is dropped silently.
+    items, errors = [], []
+    codes, names, per_cat = {}, {}, {}
+    for line, row, error in rows:
+        if error is None and not isinstance(row, dict):
+            error = "expected an object"
+        if error is None:
+            category = str(row.get("category") or "").strip()
+            name = str(row.get("name") or "").strip()
+            code = str(row.get("code") or "").strip() or None
+            try:
+                price = float(str(row.get("price")).replace(",", "").strip())
+            except ValueError:
+                price = -1.0
+            if category not in CATEGORIES:
+                error = f"unknown category '{category}'"
+            elif not name:
+                error = "empty name"
+            elif len(name) > MAX_NAME:
+                error = f"name longer than {MAX_NAME} characters"
+            elif not math.isfinite(price) or price < 0:
+                error = f"invalid price '{row.get('price')}'"
+            elif code and code in codes:
+                error = f"duplicate code '{code}' (first on line {codes[code]})"
+            elif (category, name) in names:
+                error = (f"duplicate item '{name}' in {category} "
+                         f"(first on line {names[(category, name)]})")
+        if error:
+            errors.append((line, error))
+            if len(errors) >= MAX_ERRORS:
+                break
+            continue
+        if code:
+            codes[code] = line
+        names[(category, name)] = line
+        items.append({"line": line, "category": category, "code": code,
+                      "name": name, "price": price,
+                      "sort_order": per_cat.get(category, 0)})
+        per_cat[category] = per_cat.get(category, 0) + 1
+    return items, errors
+
+
+# ---------- Diff ----------
+
+def compute_diff(items, con, retire_missing=True):
+    # Matches each row to an existing item by code, else by category and
+    # name (listed items before retired ones), and sorts the result into
+    # add / update / reprice / retire. Ids of matched items never change.
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    effective = {row[0]: row[4] for row in con.execute(CURRENT_MENU_SQL, (now,))}
+    existing = {}
+    by_code, by_name = {}, {}
+    for item_id, cat, name, code, price, sort_order, active in con.execute(
+            "SELECT id, category, name, code, price, sort_order, active "
+            "FROM menu_items ORDER BY active DESC, id"):
+        existing[item_id] = {"category": cat, "name": name, "code": code,
+                             "price": effective.get(item_id, price),
+                             "sort_order": sort_order, "active": active}
+        if code:
+            by_code[code] = item_id
+        by_name.setdefault((cat, name), item_id)
+
+    diff = {"add": [], "update": [], "reprice": [], "retire": [],
+            "unchanged": 0}
+    seen = set()
+    for it in items:
+        item_id = by_code.get(it["code"]) if it["code"] else None
+        if item_id is None:
+            item_id = by_name.get((it["category"], it["name"]))
+            if item_id is not None and existing[item_id]["code"] \
+                    and it["code"] and existing[item_id]["code"] != it["code"]:
+                item_id = None      # same name, different product code
+        if item_id is None or item_id in seen:
+            diff["add"].append(it)
+            continue
+        seen.add(item_id)
+        old = existing[item_id]
+        changes = {k: it[k] for k in ("category", "name", "code", "sort_order")
+                   if it[k] != old[k] and not (k == "code" and not it[k])}
+        if not old["active"]:
+            changes["active"] = 1
+        if changes:
+            diff["update"].append((item_id, changes))
+        if it["price"] != old["price"]:
+            diff["reprice"].append((item_id, it["price"]))
+        if not changes and it["price"] == old["price"]:
+            diff["unchanged"] += 1
+    if retire_missing:
+        diff["retire"] = [i for i, old in existing.items()
+                          if old["active"] and i not in seen]
+    return diff
+
+
+def apply_diff(diff, con):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cur = con.cursor()
+    cur.executemany("UPDATE menu_items SET active=0 WHERE id=?",
+                    [(i,) for i in diff["retire"]])
+    for item_id, changes in diff["update"]:
+        cols = ", ".join(f"{k}=?" for k in changes)
+        cur.execute(f"UPDATE menu_items SET {cols} WHERE id=?",
+                    list(changes.values()) + [item_id])
+    for it in diff["add"]:
+        cur.execute(
+            "INSERT INTO menu_items(category, name, code, price, sort_order) "
+            "VALUES (?,?,?,?,?)",
+            (it["category"], it["name"], it["code"], it["price"],
+             it["sort_order"]),
+        )
+        set_price(cur.lastrowid, it["price"], now, con)
+    for item_id, price in diff["reprice"]:
+        set_price(item_id, price, now, con)
+
+
+def diff_counts(diff):
+    return {k: (v if isinstance(v, int) else len(v)) for k, v in diff.items()}
+
+
+# ---------- Import / export ----------
+
+def import_menu(path, apply=True, retire_missing=True, db=DB_FILE):
+    # Validate the whole file first; the menu is only touched when every
+    # line is good, and then in a single transaction.
+    report = {"file": path, "rows": 0, "errors": [], "diff": None,
+              "applied": False, "timings": {}}
+    started = time.perf_counter()
+    items, errors = validate(read_rows(path))
+    report["timings"]["read_validate"] = time.perf_counter() - started
+    report["rows"] = len(items) + len(errors)
+    report["errors"] = errors
+    if errors:
+        return report
+
+    con = sqlite3.connect(db)
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        t = time.perf_counter()
+        diff = compute_diff(items, con, retire_missing)
+        report["timings"]["diff"] = time.perf_counter() - t
+        report["diff"] = diff_counts(diff)
+        if apply:
+            t = time.perf_counter()
+            apply_diff(diff, con)
+            con.commit()
+            report["timings"]["apply"] = time.perf_counter() - t
+            report["applied"] = True
+        else:
+            con.rollback()
+    except sqlite3.Error as e:
+        con.rollback()
+        report["errors"] = [(0, f"database error, nothing applied: {e}")]
+    finally:
+        con.close()
+    if report["applied"]:
+        load_catalog(db, reload=True)
+    report["timings"]["total"] = time.perf_counter() - started
+    return report
+
+
+def export_menu(path, db=DB_FILE, include_retired=False):
+    # Writes the menu in the import format, category by category in menu
+    # order, streaming rows straight from the database.
+    ext = os.path.splitext(path)[1].lower()
+    con = sqlite3.connect(db)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    effective = {row[0]: row[4] for row in con.execute(CURRENT_MENU_SQL, (now,))}
+    rank = {cat: i for i, cat in enumerate(CATEGORIES)}
+    rows = sorted(
+        con.execute("SELECT id, category, code, name, price, sort_order, "
+                    "active FROM menu_items"
+                    + ("" if include_retired else " WHERE active=1")),
+        key=lambda r: (rank.get(r[1], len(rank)), r[5], r[0]))
+    con.close()
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        if ext == ".csv":
+            w = csv.writer(f)
+            w.writerow(FIELDS)
+            for item_id, cat, code, name, price, _s, _a in rows:
+                w.writerow([cat, code or "", name,
+                            f"{effective.get(item_id, price):g}"])
+        elif ext in (".json", ".jsonl"):
+            sep = "\n" if ext == ".jsonl" else ",\n"
+            if ext == ".json":
+                f.write("[\n")
+            for n, (item_id, cat, code, name, price, _s, _a) in enumerate(rows):
+                if n:
+                    f.write(sep)
+                f.write(json.dumps({"category": cat, "code": code, "name": name,
+                                    "price": effective.get(item_id, price)},
+                                   ensure_ascii=False))
+            f.write("\n]\n" if ext == ".json" else "\n")
+        else:
+            raise ValueError(f"unsupported file type '{ext}'")
+    os.replace(tmp, path)
+    return len(rows)
+
+
+def format_report(report, max_errors=20):
+    lines = [f"File: {report['file']}", f"Rows read: {report['rows']}"]
+    if report["errors"]:
+        lines.append(f"{len(report['errors'])} problem(s), nothing was applied:")
+        for line, msg in report["errors"][:max_errors]:
+            lines.append(f"  line {line}: {msg}")
+        if len(report["errors"]) > max_errors:
+            lines.append(f"  ... and {len(report['errors']) - max_errors} more")
+    if report["diff"]:
+        d = report["diff"]
+        lines.append(f"Added {d['add']}, updated {d['update']}, repriced "
+                     f"{d['reprice']}, retired {d['retire']}, unchanged "
+                     f"{d['unchanged']}" + ("" if report["applied"]
+                                            else " (dry run)"))
+    t = report["timings"]
+    lines.append("Timing: " + ", ".join(f"{k} {v * 1000:.0f} ms"
+                                        for k, v in t.items()))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk menu import/export.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_imp = sub.add_parser("import")
+    p_imp.add_argument("file")
+    p_imp.add_argument("--dry-run", action="store_true")
+    p_imp.add_argument("--keep-missing", action="store_true",
+                       help="do not retire items absent from the file")
+    p_exp = sub.add_parser("export")
+    p_exp.add_argument("file")
+    p_exp.add_argument("--all", action="store_true",
+                       help="include retired items")
+    args = parser.parse_args()
+
+    if args.cmd == "import":
+        print(format_report(import_menu(args.file, not args.dry_run,
+                                        not args.keep_missing)))
+    else:
+        print(f"Exported {export_menu(args.file, include_retired=args.all)} "
+              f"items to {args.file}")
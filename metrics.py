@@ -0,0 +1,133 @@
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# ---------- Settings ----------
+
+# KACCHI_METRICS=1 turns timing on; KACCHI_METRICS_PORT additionally serves
+# the numbers on http://127.0.0.1:<port>/metrics
+ENABLED = os.environ.get("KACCHI_METRICS", "") not in ("", "0")
+HTTP_PORT = int(os.environ.get("KACCHI_METRICS_PORT", "0") or 0)
+METRICS_FILE = os.environ.get("KACCHI_METRICS_FILE", "metrics.prom")
+
+# latency buckets in seconds (upper bounds, +Inf is implicit)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_lock = threading.Lock()
+_stats = {}     # op -> {buckets (last one is +Inf), sum, count, errors}
+
+
+# ---------- Recording ----------
+
+def observe(op, seconds, failed=False):
+    with _lock:
+        st = _stats.get(op)
+        if st is None:
+            st = _stats[op] = {"buckets": [0] * (len(BUCKETS) + 1),
+                               "sum": 0.0, "count": 0, "errors": 0}
+        st["buckets"][bisect_left(BUCKETS, seconds)] += 1
+        st["sum"] += seconds
+        st["count"] += 1
+        if failed:
+            st["errors"] += 1
+
+
+def timed(op, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            observe(op, time.perf_counter() - started, failed)
+    return wrapper
+
+
+def instrument(namespace, names):
+    # Swap the named functions in `namespace` (usually globals()) for timed
+    # wrappers. When metrics are off nothing is wrapped, so the hot path
+    # pays nothing at all.
+    if not ENABLED:
+        return
+    for name in names:
+        fn = namespace.get(name)
+        if callable(fn) and not hasattr(fn, "__wrapped__"):
+            namespace[name] = timed(name, fn)
+
+
+def snapshot():
+    with _lock:
+        return {op: {"buckets": list(st["buckets"]), "sum": st["sum"],
+                     "count": st["count"], "errors": st["errors"]}
+                for op, st in _stats.items()}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+# ---------- Export ----------
+
+def render_prometheus(stats=None):
+    stats = snapshot() if stats is None else stats
+    out = [
+        "# HELP kacchi_op_duration_seconds Time spent in till operations.",
+        "# TYPE kacchi_op_duration_seconds histogram",
+    ]
+    for op in sorted(stats):
+        st = stats[op]
+        running = 0
+        for bound, n in zip(BUCKETS, st["buckets"]):
+            running += n
+            out.append(f'kacchi_op_duration_seconds_bucket{{op="{op}",'
+                       f'le="{bound}"}} {running}')
+        out.append(f'kacchi_op_duration_seconds_bucket{{op="{op}",le="+Inf"}} '
+                   f'{st["count"]}')
+        out.append(f'kacchi_op_duration_seconds_sum{{op="{op}"}} {st["sum"]:.6f}')
+        out.append(f'kacchi_op_duration_seconds_count{{op="{op}"}} {st["count"]}')
+    out += [
+        "# HELP kacchi_op_errors_total Till operations that raised.",
+        "# TYPE kacchi_op_errors_total counter",
+    ]
+    for op in sorted(stats):
+        out.append(f'kacchi_op_errors_total{{op="{op}"}} {stats[op]["errors"]}')
+    return "\n".join(out) + "\n"
+
+
+def write_prometheus(path=METRICS_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port=HTTP_PORT):
+    # Localhost only: the till is not meant to be scraped from the network.
+    server = HTTPServer(("127.0.0.1", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name="metrics-http").start()
+    return server
@@ -0,0 +1,241 @@
+import re
+import sqlite3
+
+from billing import ORDER_FILE, order_lines
+import history
+from history import iter_history, period_of
+from inventory import order_key
+
+# ---------- Files ----------
+
+# Kept apart from restaurant.db: it only holds derived data and can be
+# deleted at any time; it is rebuilt from history on the next start.
+SEARCH_DB = "search.db"
+
+RESULT_LIMIT = 500
+
+# field prefixes accepted in a query, e.g.  item:"beef rezala" staff:rahim
+FIELD_COLUMNS = {
+    "item": "items",
+    "staff": "employee",
+    "employee": "employee",
+    "voucher": "voucher",
+    "bill": "bill_no",
+}
+
+_TERM = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+
+
+def init_search_db(path=SEARCH_DB):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS order_docs (
+            id INTEGER PRIMARY KEY,
+            order_key TEXT NOT NULL UNIQUE,
+            datetime TEXT NOT NULL,
+            bill_no TEXT,
+            employee TEXT,
+            method TEXT,
+            total REAL,
+            voucher TEXT
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_order_docs_datetime "
+                "ON order_docs(datetime)")
+    # rowid = order_docs.id
+    cur.execute("CREATE VIRTUAL TABLE IF NOT EXISTS order_fts USING fts5("
+                "items, employee, voucher, bill_no, "
+                "tokenize='unicode61 remove_diacritics 2')")
+    con.commit()
+    return con
+
+
+def build_match(text):
+    # Turns the search box into an FTS5 expression. Every term must match;
+    # words may end in * for a prefix, "quoted phrases" stay together, and
+    # item:/staff:/voucher:/bill: restrict a term to one field. has:voucher
+    # is returned as a flag rather than a text term.
+    terms, has_voucher = [], False
+    for field, phrase, word in _TERM.findall(text or ""):
+        value = phrase if phrase else word
+        field = field.lower()
+        if field == "has" and value.lower() == "voucher":
+            has_voucher = True
+            continue
+        if field and field not in FIELD_COLUMNS:
+            value, field = f"{field}:{value}", ""
+        prefix = value.endswith("*") and not phrase
+        value = value.rstrip("*").replace('"', '""').strip()
+        if not value:
+            continue
+        term = f'"{value}"' + ("*" if prefix else "")
+        if field:
+            term = f"{FIELD_COLUMNS[field]} : {term}"
+        terms.append(term)
+    return " AND ".join(terms), has_voucher
+
+
+class OrderSearch:
+    # Inverted index over order contents (item names, staff, voucher code,
+    # bill number). Orders are added one at a time as they are committed;
+    # catch_up() only has to look at orders newer than the last one indexed.
+
+    def __init__(self, path=SEARCH_DB):
+        self.path = path
+        init_search_db(path).close()
+
+    def _add(self, cur, order):
+        voucher = order.get("voucher_code") or ""
+        if voucher == "None":
+            voucher = ""
+        cur.execute(
+            "INSERT OR IGNORE INTO order_docs(order_key, datetime, bill_no, "
+            "employee, method, total, voucher) VALUES (?,?,?,?,?,?,?)",
+            (order_key(order), order.get("datetime", ""),
+             str(order.get("bill_no", "")), order.get("employee", ""),
+             order.get("method", ""), float(order.get("total_bill", 0) or 0),
+             voucher),
+        )
+        if cur.rowcount == 0:
+            return False        # already indexed
+        cur.execute(
+            "INSERT INTO order_fts(rowid, items, employee, voucher, bill_no) "
+            "VALUES (?,?,?,?,?)",
+            (cur.lastrowid, " | ".join(it.get("name", "")
+                                       for it in order_lines(order)),
+             order.get("employee", ""), voucher, str(order.get("bill_no", ""))),
+        )
+        return True
+
+    def index_order(self, order):
+        con = sqlite3.connect(self.path)
+        try:
+            self._add(con.cursor(), order)
+            con.commit()
+        finally:
+            con.close()
+
+    def catch_up(self, orders=None, path=ORDER_FILE):
+        # Index whatever was committed since the newest indexed order:
+        # history segments from that month on, then the live orders.
+        con = sqlite3.connect(self.path)
+        last = con.execute("SELECT MAX(datetime) FROM order_docs").fetchone()[0] or ""
+        cur = con.cursor()
+        added = 0
+        for o in iter_history(path, first_day=last or None, live=orders):
+            if o.get("datetime", "") >= last and self._add(cur, o):
+                added += 1
+        con.commit()
+        con.close()
+        return added
+
+    def _id_range(self, con, first_day, last_day):
+        # Two probes of the datetime index, not a scan of the range.
+        lo = hi = (0,)
+        if first_day:
+            lo = con.execute("SELECT id FROM order_docs WHERE datetime >= ? "
+                             "ORDER BY datetime LIMIT 1", (first_day,)).fetchone()
+        if last_day:
+            hi = con.execute("SELECT id FROM order_docs WHERE datetime < ? "
+                             "ORDER BY datetime DESC LIMIT 1",
+                             (last_day + "~",)).fetchone()     # whole last day
+        else:
+            hi = con.execute("SELECT MAX(id) FROM order_docs").fetchone()
+        return (lo[0] if lo else None), (hi[0] if hi else None)
+
+    def search(self, text="", first_day=None, last_day=None, has_voucher=False,
+               limit=RESULT_LIMIT):
+        # Newest first: [(datetime, bill_no, employee, method, total, voucher)]
+        # Orders are indexed in commit order, so walking rowids downwards
+        # lets SQLite stop after `limit` hits instead of sorting every match;
+        # the day range is turned into a rowid range up front.
+        match, flag = build_match(text)
+        con = sqlite3.connect(self.path)
+        try:
+            lo, hi = self._id_range(con, first_day, last_day)
+            if lo is None or hi is None or lo > hi:
+                return []
+            where, args = ["d.id BETWEEN ? AND ?"], [lo, hi]
+            if match:
+                sql = ("SELECT d.datetime, d.bill_no, d.employee, d.method, "
+                       "d.total, d.voucher FROM order_fts f "
+                       "JOIN order_docs d ON d.id = f.rowid")
+                where = ["order_fts MATCH ?", "f.rowid BETWEEN ? AND ?"]
+                args = [match, lo, hi]
+                order = "f.rowid"
+            else:
+                sql = ("SELECT d.datetime, d.bill_no, d.employee, d.method, "
+                       "d.total, d.voucher FROM order_docs d")
+                order = "d.id"
+            if first_day:
+                where.append("d.datetime >= ?")
+                args.append(first_day)
+            if last_day:
+                where.append("d.datetime < ?")
+                args.append(last_day + "~")
+            if has_voucher or flag:
+                where.append("d.voucher != ''")
+            sql += f" WHERE {' AND '.join(where)} ORDER BY {order} DESC LIMIT ?"
+            args.append(limit)
+            return con.execute(sql, args).fetchall()
+        finally:
+            con.close()
+
+    def forget(self, period, action):
+        # Mirror history retention: anonymized months lose staff and voucher
+        # text, deleted months drop out of the index entirely.
+        con = sqlite3.connect(self.path)
+        ids = [(r[0],) for r in con.execute(
+            "SELECT id FROM order_docs WHERE substr(datetime, 1, 7) = ?",
+            (period,))]
+        if action == "delete":
+            con.executemany("DELETE FROM order_fts WHERE rowid = ?", ids)
+            con.executemany("DELETE FROM order_docs WHERE id = ?", ids)
+        else:
+            con.executemany("UPDATE order_fts SET employee = '', voucher = '' "
+                            "WHERE rowid = ?", ids)
+            con.execute("UPDATE order_docs SET employee = '', voucher = '' "
+                        "WHERE substr(datetime, 1, 7) = ?", (period,))
+        con.commit()
+        con.close()
+
+
+def locate(datetime_str, bill_no, live_orders, path=ORDER_FILE):
+    # Finds a search hit's full order: in the live list, else through the
+    # header index of its history month (one block read).
+    for o in reversed(live_orders):
+        if o.get("datetime") == datetime_str and str(o.get("bill_no")) == bill_no:
+            return o
+    period = period_of({"datetime": datetime_str})
+    folder = history.history_dir(path)
+    for row in history.load_index(period, folder)["orders"]:
+        if row[0] == datetime_str and str(row[1]) == bill_no:
+            return history.fetch_order(period, row, folder)
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Search order history.")
+    parser.add_argument("query", nargs="*")
+    parser.add_argument("--from", dest="first_day")
+    parser.add_argument("--to", dest="last_day")
+    parser.add_argument("--voucher", action="store_true",
+                        help="only orders that used a voucher")
+    args = parser.parse_args()
+
+    index = OrderSearch()
+    started = time.perf_counter()
+    n = index.catch_up()
+    if n:
+        print(f"Indexed {n} new orders in {time.perf_counter() - started:.2f}s")
+    started = time.perf_counter()
+    hits = index.search(" ".join(args.query), args.first_day, args.last_day,
+                        args.voucher)
+    elapsed = (time.perf_counter() - started) * 1000
+    for when, bill, staff, method, total, voucher in hits:
+        print(f"{when}  {bill:>8}  {staff:<24}{method:<8}{total:>10.2f}  {voucher}")
+    print(f"{len(hits)} orders in {elapsed:.1f} ms")
@@ -0,0 +1,340 @@
+import asyncio
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from billing import DB_FILE, format_tk
+
+# ---------- Settings ----------
+
+# seconds one gateway call may take before it is abandoned and retried
+TIMEOUT = float(os.environ.get("KACCHI_PAYMENT_TIMEOUT", "8") or 8)
+# attempts per payment, counting the first one
+ATTEMPTS = int(os.environ.get("KACCHI_PAYMENT_ATTEMPTS", "3") or 3)
+# wait before the 2nd attempt; doubles for each one after
+BACKOFF = float(os.environ.get("KACCHI_PAYMENT_BACKOFF", "0.5") or 0.5)
+
+# the mock gateways: "low,high" seconds of latency, and the share of calls
+# that drop (retried) or are declined (final)
+MOCK_LATENCY = tuple(float(x) for x in os.environ.get(
+    "KACCHI_MOCK_LATENCY", "0.3,1.2").split(","))
+MOCK_FAIL_RATE = float(os.environ.get("KACCHI_MOCK_FAIL_RATE", "0.05") or 0)
+MOCK_DECLINE_RATE = float(os.environ.get("KACCHI_MOCK_DECLINE_RATE", "0.02")
+                          or 0)
+
+# final states; anything else is still in flight
+APPROVED, DECLINED, FAILED = "approved", "declined", "failed"
+
+
+class PaymentDeclined(ValueError):
+    # The provider answered and said no; retrying the same key will not help.
+    pass
+
+
+def init_payment_db(path=DB_FILE):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    # one row per idempotency key: a payment approved once is never charged
+    # again, whatever the till retries
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS payment_auths (
+            idem_key TEXT PRIMARY KEY,
+            bill_no TEXT NOT NULL,
+            method TEXT NOT NULL,
+            amount REAL NOT NULL,
+            status TEXT NOT NULL,
+            auth_code TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_payment_auths_bill "
+                "ON payment_auths(bill_no)")
+    con.commit()
+    con.close()
+
+
+# ---------- Provider adapters ----------
+
+class MockGateway:
+    # Stands in for a provider's API: sleeps for a random latency, drops a
+    # share of calls and declines a few. Like a real gateway it remembers
+    # idempotency keys, so a retried call that had already gone through
+    # returns the same answer instead of charging twice.
+
+    def __init__(self, name, latency=MOCK_LATENCY, fail_rate=MOCK_FAIL_RATE,
+                 decline_rate=MOCK_DECLINE_RATE, seed=None):
+        self.name = name
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.decline_rate = decline_rate
+        self.rng = random.Random(seed)
+        self.seen = {}          # idempotency key -> auth code or None
+        self.charges = 0        # distinct payments actually taken
+
+    async def authorize(self, key, amount, reference):
+        await asyncio.sleep(self.rng.uniform(*self.latency))
+        if key in self.seen:
+            code = self.seen[key]
+            if code is None:
+                raise PaymentDeclined(f"{self.name} declined the payment.")
+            return code
+        roll = self.rng.random()
+        if roll < self.fail_rate:
+            raise ConnectionError(f"{self.name} did not answer")
+        if roll < self.fail_rate + self.decline_rate:
+            self.seen[key] = None
+            raise PaymentDeclined(f"{self.name} declined the payment.")
+        self.charges += 1
+        code = f"{self.name[:2].upper()}{self.rng.randrange(10 ** 8):08d}"
+        self.seen[key] = code
+        return code
+
+
+def mock_adapters(seed=None, **options):
+    return {m: MockGateway(m, seed=None if seed is None else seed + i, **options)
+            for i, m in enumerate(["bKash", "Nagad", "Rocket", "Card"])}
+
+
+# ---------- Pipeline ----------
+
+def new_payment_id():
+    # Stored on the order and reused while the till retries the same bill
+    # for the same amount, so a retry cannot charge the customer twice.
+    # Bill numbers repeat, so they cannot serve as the key.
+    return uuid.uuid4().hex
+
+
+def payment_key(payment_id, retry=0):
+    return f"{payment_id}/{retry}" if retry else payment_id
+
+
+class PaymentPipeline:
+    # Authorizations run on an asyncio loop in a background thread, so the
+    # Tk loop never waits on a gateway. submit() returns at once; progress
+    # and the final result arrive on `events` as (key, state, info) and the
+    # till drains them with poll().
+
+    def __init__(self, path=DB_FILE, adapters=None, timeout=TIMEOUT,
+                 attempts=ATTEMPTS, backoff=BACKOFF):
+        self.path = path
+        init_payment_db(path)
+        self.adapters = mock_adapters() if adapters is None else adapters
+        self.timeout = timeout
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.events = queue.Queue()
+        self.inflight = {}      # key -> concurrent future
+        # sqlite calls run here, one at a time, never on the event loop
+        self._db_pool = ThreadPoolExecutor(1, thread_name_prefix="payments-db")
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever,
+                                        daemon=True, name="payments")
+        self._thread.start()
+
+    def register(self, method, adapter):
+        # Plug in a provider: any object with
+        # `async authorize(key, amount, reference) -> auth code`.
+        self.adapters[method] = adapter
+
+    def lookup(self, key):
+        con = sqlite3.connect(self.path)
+        row = con.execute(
+            "SELECT idem_key, bill_no, method, amount, status, auth_code, "
+            "attempts, error FROM payment_auths WHERE idem_key = ?",
+            (key,)).fetchone()
+        con.close()
+        if row is None:
+            return None
+        return dict(zip(("key", "bill_no", "method", "amount", "status",
+                         "auth_code", "attempts", "error"), row))
+
+    def key_for(self, payment_id):
+        # A declined key is final at the provider, so trying the same
+        # payment again after a decline needs a fresh one.
+        retry = 0
+        while True:
+            key = payment_key(payment_id, retry)
+            row = self.lookup(key)
+            if row is None or row["status"] != DECLINED:
+                return key
+            retry += 1
+
+    def _save(self, key, bill_no, method, amount, status, attempts,
+              auth_code=None, error=None):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        con = sqlite3.connect(self.path)
+        con.execute(
+            "INSERT INTO payment_auths(idem_key, bill_no, method, amount, "
+            "status, auth_code, attempts, error, created_at, updated_at) "
+            "VALUES (?,?,?,?,?,?,?,?,?,?) ON CONFLICT(idem_key) DO UPDATE SET "
+            "status=excluded.status, auth_code=excluded.auth_code, "
+            "attempts=excluded.attempts, error=excluded.error, "
+            "updated_at=excluded.updated_at",
+            (key, bill_no, method, amount, status, auth_code, attempts, error,
+             now, now))
+        con.commit()
+        con.close()
+
+    def _db(self, fn, *args):
+        return self.loop.run_in_executor(self._db_pool, fn, *args)
+
+    async def authorize(self, key, bill_no, method, amount):
+        # One payment end to end; returns the stored row as a dict. Never
+        # raises: every outcome ends up as approved, declined or failed.
+        done = await self._db(self.lookup, key)
+        if done and done["status"] == APPROVED:
+            self.events.put((key, APPROVED, done))
+            return done
+        adapter = self.adapters.get(method)
+        if adapter is None:
+            await self._db(self._save, key, bill_no, method, amount, FAILED, 0,
+                           None, f"No gateway for {method}.")
+            result = await self._db(self.lookup, key)
+            self.events.put((key, FAILED, result))
+            return result
+        tried = done["attempts"] if done else 0
+        error = None
+        # recorded before the first call, so a crash mid-flight leaves a
+        # pending row to reconcile against the provider
+        await self._db(self._save, key, bill_no, method, amount, "pending",
+                       tried)
+        for attempt in range(1, self.attempts + 1):
+            self.events.put((key, "progress",
+                             f"Contacting {method} (try {attempt} of "
+                             f"{self.attempts})..."))
+            try:
+                code = await asyncio.wait_for(
+                    adapter.authorize(key, amount, bill_no), self.timeout)
+            except PaymentDeclined as e:
+                await self._db(self._save, key, bill_no, method, amount,
+                               DECLINED, tried + attempt, None, str(e))
+                break
+            except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+                error = str(e) or f"{method} timed out"
+                if attempt < self.attempts:
+                    wait = self.backoff * 2 ** (attempt - 1)
+                    self.events.put((key, "progress",
+                                     f"{error}; retrying in {wait:.1f}s..."))
+                    await asyncio.sleep(wait)
+                continue
+            await self._db(self._save, key, bill_no, method, amount, APPROVED,
+                           tried + attempt, code)
+            break
+        else:
+            await self._db(self._save, key, bill_no, method, amount, FAILED,
+                           tried + self.attempts, None, error)
+        result = await self._db(self.lookup, key)
+        self.events.put((key, result["status"], result))
+        return result
+
+    def submit(self, payment_id, bill_no, method, amount):
+        # Start authorizing and return the idempotency key. Submitting a key
+        # that is already in flight just follows the running attempt.
+        key = self.key_for(payment_id)
+        for k in [k for k, f in self.inflight.items() if f.done()]:
+            del self.inflight[k]
+        if key not in self.inflight:
+            self.inflight[key] = asyncio.run_coroutine_threadsafe(
+                self.authorize(key, bill_no, method, amount), self.loop)
+        return key
+
+    def poll(self):
+        # Events since the last call, oldest first; safe from the Tk thread.
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self._db_pool.shutdown()
+
+
+def payment_message(result):
+    if result["status"] == APPROVED:
+        return (f"{result['method']} approved {format_tk(result['amount'])}, "
+                f"ref {result['auth_code']}.")
+    if result["status"] == DECLINED:
+        return result["error"] or f"{result['method']} declined the payment."
+    return (f"{result['method']} could not be reached after "
+            f"{result['attempts']} tries ({result['error']}).")
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(
+        description="Load-test the payment pipeline against mock gateways.")
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", default="0.05,0.4")
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--decline-rate", type=float, default=0.02)
+    parser.add_argument("--timeout", type=float, default=0.3)
+    args = parser.parse_args()
+
+    latency = tuple(float(x) for x in args.latency.split(","))
+    with tempfile.TemporaryDirectory() as tmp:
+        adapters = mock_adapters(seed=1, latency=latency,
+                                 fail_rate=args.fail_rate,
+                                 decline_rate=args.decline_rate)
+        pipeline = PaymentPipeline(os.path.join(tmp, "payments.db"), adapters,
+                                   timeout=args.timeout, backoff=0.05)
+        rng = random.Random(1)
+        jobs = [(new_payment_id(), f"{rng.randrange(10000, 99999)}",
+                 rng.choice(list(adapters)), float(rng.randrange(200, 5000)))
+                for _ in range(args.payments)]
+
+        async def run(jobs):
+            gate = asyncio.Semaphore(args.concurrency)
+            samples = []
+
+            async def one(payment_id, bill_no, method, amount):
+                async with gate:
+                    t = time.perf_counter()
+                    result = await pipeline.authorize(
+                        payment_key(payment_id), bill_no, method, amount)
+                    samples.append(time.perf_counter() - t)
+                    return result["status"]
+
+            statuses = await asyncio.gather(*(one(*j) for j in jobs))
+            return statuses, sorted(samples)
+
+        def load(jobs):
+            started = time.perf_counter()
+            statuses, samples = asyncio.run_coroutine_threadsafe(
+                run(jobs), pipeline.loop).result()
+            return statuses, samples, time.perf_counter() - started
+
+        statuses, samples, elapsed = load(jobs)
+        counts = {s: statuses.count(s) for s in (APPROVED, DECLINED, FAILED)}
+        print(f"{len(jobs)} payments, {args.concurrency} at a time: "
+              f"{elapsed:.2f}s, {len(jobs) / elapsed:.0f} payments/s")
+        print(f"latency p50 {samples[len(samples) // 2] * 1000:.0f} ms, "
+              f"p95 {samples[int(len(samples) * 0.95)] * 1000:.0f} ms, "
+              f"max {samples[-1] * 1000:.0f} ms")
+        print("outcomes: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+
+        # the till pressing PAY again for every bill: approved bills are
+        # answered from the table, only the failed ones reach a gateway
+        charged = sum(g.charges for g in adapters.values())
+        again, _samples, elapsed = load(jobs)
+        new = sum(g.charges for g in adapters.values()) - charged
+        print(f"resubmitted all in {elapsed:.2f}s: "
+              f"{again.count(APPROVED) - counts[APPROVED]} failed bills now "
+              f"approved, {new} new charges, "
+              f"{new - (again.count(APPROVED) - counts[APPROVED])} double charges")
+        pipeline.close()
@@ -0,0 +1,341 @@
+from datetime import datetime
+
+from billing import VAT_RATE, load_json, save_json
+
+# ---------- Rules file ----------
+
+# A JSON list of rules, applied in this order:
+#   {"type": "vat", "rate": 0.05}                         whole menu
+#   {"type": "vat", "rate": 0.10, "categories": ["Drinks & Dessert"]}
+#   {"type": "happy_hour", "percent": 20, "start": "15:00", "end": "18:00",
+#    "days": ["mon", "tue"], "items": ["Soft Drink"]}
+#   {"type": "buy_x_get_y", "buy": 2, "get": 1, "percent": 100,
+#    "categories": ["Add-ons"]}
+#   {"type": "min_spend", "threshold": 2000, "percent": 5}   or "amount": 100
+# Every rule may carry "name" and "enabled": false; discounts may also have
+# a time window (start/end/days) and "exclusive": true. Later VAT rules
+# override earlier ones for the items they match.
+RULES_FILE = "pricing_rules.json"
+
+RULE_TYPES = ("vat", "happy_hour", "buy_x_get_y", "min_spend")
+
+DEFAULT_RULES = [{"type": "vat", "rate": VAT_RATE}]
+
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def load_rules(path=RULES_FILE):
+    return load_json(path, DEFAULT_RULES)
+
+
+def save_rules(rules, path=RULES_FILE):
+    save_json(path, rules)
+
+
+# ---------- Compiling ----------
+
+def _minutes(text):
+    hh, _, mm = str(text).partition(":")
+    m = int(hh) * 60 + int(mm or 0)
+    if not 0 <= m <= 24 * 60:
+        raise ValueError(f"bad time '{text}'")
+    return m
+
+
+def _window(rule):
+    # (weekday set or None, start minute, end minute) or None for always.
+    days = rule.get("days")
+    if days is None and "start" not in rule and "end" not in rule:
+        return None
+    if days is not None:
+        try:
+            days = frozenset(DAY_NAMES.index(str(d).lower()[:3]) for d in days)
+        except ValueError:
+            raise ValueError(f"days must be among {', '.join(DAY_NAMES)}")
+    return (days, _minutes(rule.get("start", "0:00")),
+            _minutes(rule.get("end", "24:00")))
+
+
+def _in_window(window, now):
+    if window is None:
+        return True
+    days, start, end = window
+    minute = now.hour * 60 + now.minute
+    if start <= end:
+        return (days is None or now.weekday() in days) and start <= minute < end
+    # past midnight: 22:00-02:00 belongs to the day it started on
+    if minute >= start:
+        return days is None or now.weekday() in days
+    return minute < end and (days is None or (now.weekday() - 1) % 7 in days)
+
+
+def _targets(rule, items):
+    # Menu positions a rule applies to; no categories/items means all.
+    cats = rule.get("categories")
+    names = rule.get("items")
+    if cats is None and names is None:
+        return [it.pos for it in items]
+    cats = set(cats or ())
+    names = {str(n) for n in (names or ())}
+    return [it.pos for it in items
+            if it.category in cats or it.name in names or str(it.item_id) in names]
+
+
+def _percent(rule, key="percent", default=None):
+    value = float(rule.get(key, default) if default is not None else rule[key])
+    if not 0 <= value <= 100:
+        raise ValueError(f"{key} must be between 0 and 100")
+    return value / 100.0
+
+
+class PricingPlan:
+    # Rules resolved against one menu: every position knows its VAT rate and
+    # the happy hours / bundle deals it takes part in, so pricing a cart
+    # never has to look at rules that cannot touch it.
+
+    def __init__(self, rules, items):
+        self.items = items
+        self.names = []
+        self.windows = []           # per rule index
+        self.exclusive = []
+        self.vat = [VAT_RATE] * len(items)
+        self.happy = [[] for _ in items]        # pos -> [(rule, fraction)]
+        self.groups = []            # (rule, buy, get, fraction, member set)
+        self.order_rules = []       # (rule, threshold, fraction, amount)
+        for n, rule in enumerate(rules, 1):
+            try:
+                self._add(rule, items)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"rule {n}: {e}") from None
+        self._active = (None, frozenset())      # (minute, rule indexes)
+
+    def _add(self, rule, items):
+        if not isinstance(rule, dict):
+            raise ValueError("expected an object")
+        kind = rule.get("type")
+        if kind not in RULE_TYPES:
+            raise ValueError(f"unknown type '{kind}'")
+        if not rule.get("enabled", True):
+            return
+        idx = len(self.names)
+        self.names.append(rule.get("name") or kind.replace("_", " ").title())
+        self.windows.append(_window(rule))
+        self.exclusive.append(bool(rule.get("exclusive", False)))
+        targets = _targets(rule, items)
+        if kind == "vat":
+            rate = float(rule["rate"])
+            if not 0 <= rate < 1:
+                raise ValueError("rate must be a fraction, e.g. 0.05")
+            for pos in targets:
+                self.vat[pos] = rate
+        elif kind == "happy_hour":
+            fraction = _percent(rule)
+            for pos in targets:
+                self.happy[pos].append((idx, fraction))
+        elif kind == "buy_x_get_y":
+            buy, get = int(rule["buy"]), int(rule["get"])
+            if buy < 1 or get < 1:
+                raise ValueError("buy and get must be at least 1")
+            self.groups.append((idx, buy, get, _percent(rule, default=100),
+                                frozenset(targets)))
+        else:
+            amount = float(rule.get("amount", 0))
+            fraction = _percent(rule, default=0)
+            if amount < 0 or (not amount and not fraction):
+                raise ValueError("needs a percent or a positive amount")
+            self.order_rules.append((idx, float(rule["threshold"]),
+                                     fraction, amount))
+
+    def active(self, now):
+        # Rule indexes whose time window is open; recomputed once a minute.
+        minute = now.strftime("%Y-%m-%d %H:%M")
+        if minute != self._active[0]:
+            self._active = (minute, frozenset(
+                i for i, w in enumerate(self.windows) if _in_window(w, now)))
+        return self._active[1]
+
+
+def compile_rules(rules, items):
+    return PricingPlan(rules, items)
+
+
+# ---------- Pricing a cart ----------
+
+class Cart:
+    # Incremental pricing state for one open ticket. set() touches only the
+    # changed line and the running subtotal; price() walks the non-empty
+    # lines once and is memoized until the cart, the voucher or the set of
+    # open time windows changes.
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.lines = {}             # pos -> qty, qty > 0 only
+        self.subtotal = 0.0
+        self.version = 0
+        self._key = None
+        self._result = None
+
+    def set(self, pos, qty):
+        old = self.lines.get(pos, 0)
+        if qty == old:
+            return
+        self.subtotal += (qty - old) * self.plan.items[pos].price
+        if qty > 0:
+            self.lines[pos] = qty
+        else:
+            self.lines.pop(pos, None)
+        self.version += 1
+
+    def load(self, qty):
+        # Replace the whole cart, e.g. from a tab's quantity array.
+        self.lines = {pos: q for pos, q in enumerate(qty) if q > 0}
+        items = self.plan.items
+        self.subtotal = sum(items[p].price * q for p, q in self.lines.items())
+        self.version += 1
+
+    def price(self, voucher=None, now=None, redeem=0.0):
+        # voucher: (code, percent, exclusive) or None; redeem: Tk of loyalty
+        # points to take off last, whatever offers apply. Returns a dict with
+        # subtotal, discount, vat, total, promotions [(name, amount)],
+        # voucher_applied and redeemed. Exclusive offers never combine: each
+        # is priced on its own against all stackable ones together, and the
+        # lowest total wins.
+        active = self.plan.active(now or datetime.now())
+        key = (self.version, voucher, active, redeem)
+        if key == self._key:
+            return self._result
+        stack = [i for i in active if not self.plan.exclusive[i]]
+        best = self._evaluate(set(stack),
+                              voucher if voucher and not voucher[2] else None,
+                              redeem)
+        for i in active:
+            if self.plan.exclusive[i]:
+                best = min(best, self._evaluate({i}, None, redeem),
+                           key=_by_total)
+        if voucher and voucher[2]:
+            best = min(best, self._evaluate(set(), voucher, redeem),
+                       key=_by_total)
+        self._key, self._result = key, best
+        return best
+
+    def _evaluate(self, rules, voucher, redeem=0.0):
+        plan = self.plan
+        items, vat = plan.items, plan.vat
+        promotions = {}
+        net = {}
+        # line rules: best happy hour per line, then bundle deals on what is left
+        for pos, qty in self.lines.items():
+            gross = items[pos].price * qty
+            cut = 0.0
+            for idx, fraction in plan.happy[pos]:
+                if idx in rules and fraction > cut:
+                    cut, rule = fraction, idx
+            if cut:
+                promotions[rule] = promotions.get(rule, 0.0) + gross * cut
+            net[pos] = gross * (1.0 - cut)
+        for idx, buy, get, fraction, members in plan.groups:
+            if idx not in rules:
+                continue
+            units = [(net[p] / q, p) for p, q in self.lines.items()
+                     if p in members for _ in range(q)]
+            free = len(units) // (buy + get) * get
+            if not free:
+                continue
+            units.sort()
+            saved = 0.0
+            for unit, pos in units[:free]:
+                net[pos] -= unit * fraction
+                saved += unit * fraction
+            promotions[idx] = promotions.get(idx, 0.0) + saved
+        # order rules scale every line alike, so VAT follows proportionally
+        line_net = sum(net.values())
+        after = line_net
+        for idx, threshold, fraction, amount in plan.order_rules:
+            if idx in rules and line_net >= threshold:
+                cut = min(after, after * fraction + amount)
+                promotions[idx] = promotions.get(idx, 0.0) + cut
+                after -= cut
+        voucher_cut = 0.0
+        if voucher:
+            voucher_cut = after * voucher[1] / 100.0
+            after -= voucher_cut
+        points_cut = min(after, redeem)
+        after -= points_cut
+        scale = after / line_net if line_net else 0.0
+        tax = scale * sum(n * vat[p] for p, n in net.items())
+        named = [(plan.names[i], amount) for i, amount in sorted(promotions.items())
+                 if amount > 0]
+        if voucher_cut:
+            named.append((f"Voucher {voucher[0]}", voucher_cut))
+        if points_cut:
+            named.append(("Loyalty points", points_cut))
+        return {
+            "subtotal": self.subtotal,
+            "discount": self.subtotal - after,
+            "vat": tax,
+            "total": after + tax,
+            "promotions": named,
+            "voucher_applied": bool(voucher_cut),
+            "redeemed": points_cut,
+        }
+
+
+def _by_total(result):
+    return round(result["total"], 6)
+
+
+def describe_rules(rules):
+    # One line per rule for the rules editor's status line.
+    out = []
+    for rule in rules:
+        kind = rule.get("type", "?")
+        name = rule.get("name") or kind
+        flags = []
+        if not rule.get("enabled", True):
+            flags.append("off")
+        if rule.get("exclusive"):
+            flags.append("exclusive")
+        if "start" in rule or "days" in rule:
+            flags.append(f"{rule.get('start', '0:00')}-{rule.get('end', '24:00')}")
+        out.append(name + (f" ({', '.join(flags)})" if flags else ""))
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+
+    from billing import init_db, load_menu_items
+
+    parser = argparse.ArgumentParser(
+        description="Time pricing a random cart against the rules file.")
+    parser.add_argument("--rules", default=RULES_FILE)
+    parser.add_argument("--lines", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    init_db()
+    items = load_menu_items()
+    rules = load_rules(args.rules)
+    started = time.perf_counter()
+    plan = compile_rules(rules, items)
+    print(f"Compiled {len(rules)} rules for {len(items)} items in "
+          f"{(time.perf_counter() - started) * 1000:.2f} ms")
+
+    rng = random.Random(1)
+    cart = Cart(plan)
+    lines = rng.sample(range(len(items)), min(args.lines, len(items)))
+    for pos in lines:
+        cart.set(pos, rng.randint(1, 4))
+    voucher = ("BENCH", 10.0, False)
+    started = time.perf_counter()
+    for n in range(args.runs):
+        cart.set(lines[n % len(lines)], rng.randint(1, 4))
+        result = cart.price(voucher)
+    elapsed = (time.perf_counter() - started) / args.runs
+    print(f"{len(cart.lines)} lines: {elapsed * 1e6:.0f} us per change + price")
+    for name, amount in result["promotions"]:
+        print(f"  {name:<30}-{amount:,.2f}")
+    print(f"  subtotal {result['subtotal']:,.2f}  discount {result['discount']:,.2f}"
+          f"  VAT {result['vat']:,.2f}  total {result['total']:,.2f}")
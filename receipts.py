@@ -0,0 +1,411 @@
+import os
+import queue
+import string
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from billing import ORDER_FILE, order_amounts, order_lines
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:     # PNG output is optional
+    Image = None
+
+# ---------- Files ----------
+
+SPOOL_DIR = "spool"
+
+# ---------- Receipt layout ----------
+
+RECEIPT_WIDTH = 42      # characters on an 80mm roll
+
+# Template lines are formatted with str.format fields taken from the order.
+# A line may start with a directive:
+#   @center <text>      centred line
+#   @rule               full-width separator
+#   @pair <left>|<right>   left text, right text flushed to the edge
+#   @item <fields>      repeated once per order line (name, price, qty, line_total)
+#   @promo <fields>     repeated once per promotion, voucher or points
+#                       redemption applied (name, amount)
+#   @bold <text>        emphasised line (ESC/POS only, plain text otherwise)
+DEFAULT_TEMPLATE = """\
+@bold @center Kacchi Bhai Style Restaurant
+@center Dhaka, Bangladesh
+@rule
+@pair Bill No: {bill_no}|{datetime}
+Cashier: {employee}
+@rule
+@pair Item x Qty|Total
+@item {name:.22} x{qty}|{line_total}
+@rule
+@pair Food Cost|{subtotal}
+@promo {name:.24}|-{amount}
+@pair VAT|{vat}
+@bold @pair TOTAL|{total_bill}
+@pair Paid ({method})|{paid}
+{change_or_due}
+Voucher: {voucher_code}
+@rule
+@center Thank you! Come again.
+"""
+
+ESC_INIT = b"\x1b@"
+ESC_BOLD_ON = b"\x1bE\x01"
+ESC_BOLD_OFF = b"\x1bE\x00"
+ESC_ALIGN_LEFT = b"\x1ba\x00"
+ESC_ALIGN_CENTER = b"\x1ba\x01"
+ESC_FEED_CUT = b"\n\n\n\x1dV\x01"
+
+_formatter = string.Formatter()
+
+
+# ---------- Template compilation ----------
+
+def _compile_format(text):
+    # Pre-split "{a} and {b:>8}" into literal/field pairs once, so rendering
+    # never re-parses the template.
+    parts = []
+    for literal, field, spec, conv in _formatter.parse(text):
+        parts.append((literal, field, spec or "", conv))
+    return parts
+
+
+def _render_format(parts, fields):
+    out = []
+    for literal, field, spec, conv in parts:
+        out.append(literal)
+        if field is None:
+            continue
+        value = fields.get(field, "")
+        if conv:
+            value = _formatter.convert_field(value, conv)
+        out.append(format(value, spec))
+    return "".join(out)
+
+
+def compile_template(template=DEFAULT_TEMPLATE, width=RECEIPT_WIDTH):
+    ops = []
+    for line in template.splitlines():
+        bold = False
+        if line.startswith("@bold "):
+            bold = True
+            line = line[len("@bold "):]
+
+        if line == "@rule":
+            ops.append(("rule", bold, None, None))
+        elif line.startswith("@center "):
+            ops.append(("center", bold, _compile_format(line[8:]), None))
+        elif line.startswith("@pair "):
+            left, _, right = line[6:].partition("|")
+            ops.append(("pair", bold, _compile_format(left),
+                        _compile_format(right)))
+        elif line.startswith(("@item ", "@promo ")):
+            kind, _, line = line[1:].partition(" ")
+            left, _, right = line.partition("|")
+            ops.append((kind, bold, _compile_format(left),
+                        _compile_format(right)))
+        else:
+            ops.append(("text", bold, _compile_format(line), None))
+    return {"width": width, "ops": ops}
+
+
+def _money(amount):
+    return f"{float(amount):,.2f}"
+
+
+def receipt_fields(order):
+    subtotal, discount, vat = order_amounts(order)
+    return {
+        "bill_no": order.get("bill_no", ""),
+        "datetime": order.get("datetime", ""),
+        "employee": order.get("employee") or "",
+        "method": order.get("method", ""),
+        "voucher_code": order.get("voucher_code", "None"),
+        "discount_percent": float(order.get("discount_percent", 0) or 0),
+        "change_or_due": order.get("change_or_due", ""),
+        "subtotal": _money(subtotal),
+        "discount": _money(discount),
+        "vat": _money(vat),
+        "total_bill": _money(order.get("total_bill", 0) or 0),
+        "paid": _money(order.get("paid", 0) or 0),
+    }
+
+
+def promotion_lines(order):
+    # [(name, amount)] of every promotion, voucher and points redemption on
+    # the order. Orders from before the pricing rules only have a percent.
+    if order.get("promotions"):
+        return [(name, float(amount)) for name, amount in order["promotions"]]
+    _subtotal, discount, _vat = order_amounts(order)
+    if discount <= 0:
+        return []
+    percent = float(order.get("discount_percent", 0) or 0)
+    return [(f"Discount ({percent:.0f}%)", discount)]
+
+
+def _pair(left, right, width):
+    gap = width - len(left) - len(right)
+    if gap < 1:
+        left = left[:max(0, width - len(right) - 1)]
+        gap = width - len(left) - len(right)
+    return left + " " * gap + right
+
+
+# ---------- Rendering ----------
+
+def render_lines(compiled, order):
+    # Returns [(kind, bold, text)] where kind is "left" or "center".
+    width = compiled["width"]
+    fields = receipt_fields(order)
+    lines = []
+    for kind, bold, left, right in compiled["ops"]:
+        if kind == "rule":
+            lines.append(("left", bold, "-" * width))
+        elif kind == "center":
+            lines.append(("center", bold,
+                          _render_format(left, fields)[:width]))
+        elif kind == "pair":
+            lines.append(("left", bold, _pair(_render_format(left, fields),
+                                              _render_format(right, fields),
+                                              width)))
+        elif kind == "item":
+            for it in order_lines(order):
+                item_fields = {
+                    "name": it.get("name", ""),
+                    "category": it.get("category", ""),
+                    "qty": it.get("qty", 0),
+                    "price": _money(it.get("price", 0)),
+                    "line_total": _money(it.get("line_total", 0)),
+                }
+                lines.append(("left", bold, _pair(
+                    _render_format(left, item_fields),
+                    _render_format(right, item_fields), width)))
+        elif kind == "promo":
+            for name, amount in promotion_lines(order):
+                promo_fields = {"name": name, "amount": _money(amount)}
+                lines.append(("left", bold, _pair(
+                    _render_format(left, promo_fields),
+                    _render_format(right, promo_fields), width)))
+        else:
+            text = _render_format(left, fields)
+            if text:
+                lines.append(("left", bold, text[:width]))
+    return lines
+
+
+def render_text(compiled, order):
+    width = compiled["width"]
+    out = []
+    for kind, _bold, text in render_lines(compiled, order):
+        out.append(text.center(width).rstrip() if kind == "center" else text)
+    return "\n".join(out) + "\n"
+
+
+def render_escpos(compiled, order):
+    out = [ESC_INIT]
+    for kind, bold, text in render_lines(compiled, order):
+        out.append(ESC_ALIGN_CENTER if kind == "center" else ESC_ALIGN_LEFT)
+        if bold:
+            out.append(ESC_BOLD_ON)
+        out.append(text.encode("ascii", "replace") + b"\n")
+        if bold:
+            out.append(ESC_BOLD_OFF)
+    out.append(ESC_ALIGN_LEFT + ESC_FEED_CUT)
+    return b"".join(out)
+
+
+def _pdf_escape(text):
+    return (text.replace("\\", "\\\\")
+                .replace("(", "\\(")
+                .replace(")", "\\)"))
+
+
+def render_pdf(compiled, order):
+    # Single-page PDF sized to the roll, Courier so columns line up.
+    text_lines = render_text(compiled, order).splitlines()
+    font_size = 8
+    leading = 10
+    margin = 12
+    page_w = int(compiled["width"] * font_size * 0.6) + 2 * margin
+    page_h = len(text_lines) * leading + 2 * margin
+
+    stream = [f"BT /F1 {font_size} Tf {leading} TL "
+              f"{margin} {page_h - margin - font_size} Td"]
+    for line in text_lines:
+        safe = _pdf_escape(line.encode("latin-1", "replace").decode("latin-1"))
+        stream.append(f"({safe}) Tj T*")
+    stream.append("ET")
+    content = "\n".join(stream).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w} {page_h}] "
+         f"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>")
+        .encode("latin-1"),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>",
+        b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n"
+        + content + b"\nendstream",
+    ]
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref_at}\n%%EOF\n").encode()
+    return bytes(out)
+
+
+def render_png(compiled, order, path):
+    if Image is None:
+        return False
+    text_lines = render_text(compiled, order).splitlines()
+    font = ImageFont.load_default()
+    line_h = 14
+    img = Image.new("L", (compiled["width"] * 7 + 20,
+                          len(text_lines) * line_h + 20), 255)
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(text_lines):
+        draw.text((10, 10 + i * line_h), line, fill=0, font=font)
+    img.save(path)
+    return True
+
+
+# ---------- Spool output ----------
+
+def _atomic_write(path, data):
+    # The printer watcher picks up files by name, so never expose a half
+    # written receipt.
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _spool_name(order):
+    stamp = "".join(ch for ch in order.get("datetime", "") if ch.isdigit())
+    return f"{stamp}_{order.get('bill_no', '') or 'nobill'}"
+
+
+def write_receipt(compiled, order, out_dir, formats=("txt", "escpos", "pdf")):
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, _spool_name(order))
+    written = []
+    if "txt" in formats:
+        _atomic_write(base + ".txt", render_text(compiled, order).encode("utf-8"))
+        written.append(base + ".txt")
+    if "escpos" in formats:
+        _atomic_write(base + ".bin", render_escpos(compiled, order))
+        written.append(base + ".bin")
+    if "pdf" in formats:
+        _atomic_write(base + ".pdf", render_pdf(compiled, order))
+        written.append(base + ".pdf")
+    if "png" in formats and render_png(compiled, order, base + ".png.tmp"):
+        os.replace(base + ".png.tmp", base + ".png")
+        written.append(base + ".png")
+    return written
+
+
+class ReceiptSpooler:
+    # Background writer standing in for the printer: submit() only queues the
+    # order, so the till never waits on rendering or disk.
+
+    def __init__(self, out_dir=SPOOL_DIR, template=DEFAULT_TEMPLATE,
+                 formats=("txt", "escpos", "pdf")):
+        self.out_dir = out_dir
+        self.formats = formats
+        self.compiled = compile_template(template)
+        self.errors = []
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="receipt-spooler")
+        self._thread.start()
+
+    def submit(self, order):
+        self._queue.put(dict(order))
+
+    def _run(self):
+        while True:
+            order = self._queue.get()
+            try:
+                if order is None:
+                    return
+                write_receipt(self.compiled, order, self.out_dir, self.formats)
+            except Exception as e:
+                self.errors.append((order.get("bill_no"), str(e)))
+                print("Error spooling receipt", order.get("bill_no"), ":", e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+# ---------- Batch re-rendering ----------
+
+_worker_compiled = None
+
+
+def _init_worker(template, width, out_dir, formats):
+    global _worker_compiled
+    _worker_compiled = (compile_template(template, width), out_dir, formats)
+
+
+def _render_chunk(chunk):
+    compiled, out_dir, formats = _worker_compiled
+    done = 0
+    for order in chunk:
+        write_receipt(compiled, order, out_dir, formats)
+        done += 1
+    return done
+
+
+def render_history(orders, out_dir, template=DEFAULT_TEMPLATE,
+                   formats=("txt",), workers=None, chunk_size=200):
+    # Each worker compiles the template once in its initializer and then
+    # renders whole chunks, so per-order IPC stays small.
+    chunks = [orders[i:i + chunk_size]
+              for i in range(0, len(orders), chunk_size)]
+    if not chunks:
+        return 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(template, RECEIPT_WIDTH, out_dir, formats),
+    ) as pool:
+        return sum(pool.map(_render_chunk, chunks))
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Re-render historical receipts into a directory.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--orders", default=ORDER_FILE)
+    parser.add_argument("--formats", default="txt",
+                        help="comma separated: txt,escpos,pdf,png")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    from history import iter_history
+
+    # rotated months live in the history segments, not in orders.json
+    history = list(iter_history(args.orders))
+    started = time.perf_counter()
+    count = render_history(history, args.out_dir,
+                           formats=tuple(args.formats.split(",")),
+                           workers=args.workers)
+    print(f"Rendered {count} receipts in "
+          f"{time.perf_counter() - started:.2f}s")
@@ -0,0 +1,275 @@
+import sqlite3
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from billing import DB_FILE
+
+# ---------- Tables ----------
+
+# table name -> seats (first run only)
+DEFAULT_TABLES = {
+    "Table 1": 2, "Table 2": 2, "Table 3": 4, "Table 4": 4, "Table 5": 4,
+    "Table 6": 4, "Table 7": 6, "Table 8": 6, "Table 9": 8, "Family Cabin": 12,
+}
+
+SLOT_FORMAT = "%Y-%m-%d %H:%M"
+DEFAULT_MINUTES = 90
+
+# booked and seated reservations hold their table; the others do not
+HOLDING = ("booked", "seated")
+
+
+def init_reservation_db(path=DB_FILE):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS dining_tables (
+            name TEXT PRIMARY KEY,
+            seats INTEGER NOT NULL
+        )
+    """)
+    # start/end are "YYYY-MM-DD HH:MM"; the slot is [start, end)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS reservations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL REFERENCES dining_tables(name),
+            guest TEXT NOT NULL,
+            phone TEXT NOT NULL DEFAULT '',
+            party INTEGER NOT NULL,
+            start TEXT NOT NULL,
+            end TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'booked',
+            created_at TEXT NOT NULL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reservations_end "
+                "ON reservations(end)")
+    cur.execute("SELECT COUNT(*) FROM dining_tables")
+    if cur.fetchone()[0] == 0:
+        cur.executemany("INSERT INTO dining_tables(name, seats) VALUES (?,?)",
+                        list(DEFAULT_TABLES.items()))
+    con.commit()
+    con.close()
+
+
+def parse_slot(day, time_text, minutes=DEFAULT_MINUTES):
+    # Returns (start, end, None) or (None, None, error message).
+    try:
+        start = datetime.strptime(f"{day.strip()} {time_text.strip()}",
+                                  SLOT_FORMAT)
+        minutes = int(minutes)
+    except ValueError:
+        return None, None, "Enter the date as YYYY-MM-DD and time as HH:MM."
+    if not 15 <= minutes <= 12 * 60:
+        return None, None, "A booking lasts between 15 minutes and 12 hours."
+    return (start.strftime(SLOT_FORMAT),
+            (start + timedelta(minutes=minutes)).strftime(SLOT_FORMAT), None)
+
+
+# ---------- Interval index ----------
+
+class TableSlots:
+    # One table's holding reservations, sorted by start. They never overlap,
+    # so the ends are sorted as well, and the only booking that can clash
+    # with [start, end) is the last one starting before `end`: one bisect.
+
+    def __init__(self):
+        self.starts = []
+        self.slots = []     # (start, end, reservation id), same order
+
+    def conflict(self, start, end):
+        # id of the booking overlapping [start, end), or None
+        i = bisect_left(self.starts, end)
+        if i and self.slots[i - 1][1] > start:
+            return self.slots[i - 1][2]
+        return None
+
+    def add(self, start, end, rid):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.slots.insert(i, (start, end, rid))
+
+    def remove(self, start, rid):
+        i = bisect_left(self.starts, start)
+        while i < len(self.slots) and self.slots[i][2] != rid:
+            i += 1
+        if i < len(self.slots):
+            del self.starts[i]
+            del self.slots[i]
+
+
+class ReservationBook:
+    # Bookings from yesterday on are indexed per table in memory; the DB
+    # keeps everything. Finding a free table checks each table that is big
+    # enough, smallest first, in O(log n) each.
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        init_reservation_db(path)
+        con = sqlite3.connect(path)
+        self.tables = dict(con.execute(
+            "SELECT name, seats FROM dining_tables ORDER BY seats, name"))
+        self.index = {name: TableSlots() for name in self.tables}
+        since = (datetime.now() - timedelta(days=1)).strftime(SLOT_FORMAT)
+        for rid, table, start, end in con.execute(
+                "SELECT id, table_name, start, end FROM reservations "
+                "WHERE end >= ? AND status IN (?, ?)", (since,) + HOLDING):
+            if table in self.index:
+                self.index[table].add(start, end, rid)
+        con.close()
+
+    def conflict(self, table, start, end):
+        return self.index[table].conflict(start, end)
+
+    def free_tables(self, party, start, end):
+        # Tables that seat the party and are free for the whole slot,
+        # smallest first.
+        return [name for name, seats in self.tables.items()
+                if seats >= party and self.index[name].conflict(start, end) is None]
+
+    def book(self, guest, party, start, end, table=None, phone=""):
+        # Returns (reservation id, table). Without a table the smallest free
+        # one that fits is taken.
+        if not guest.strip():
+            raise ValueError("Please enter the guest's name.")
+        if party < 1:
+            raise ValueError("Party size must be at least 1.")
+        if end <= start:
+            raise ValueError("The booking must end after it starts.")
+        if table is None:
+            free = self.free_tables(party, start, end)
+            if not free:
+                raise ValueError(f"No table for {party} is free then.")
+            table = free[0]
+        elif table not in self.tables:
+            raise ValueError(f"Unknown table '{table}'.")
+        elif self.tables[table] < party:
+            raise ValueError(f"{table} seats only {self.tables[table]}.")
+        else:
+            clash = self.conflict(table, start, end)
+            if clash is not None:
+                raise ValueError(f"{table} is already booked then "
+                                 f"(reservation #{clash}).")
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        con = sqlite3.connect(self.path)
+        cur = con.cursor()
+        cur.execute(
+            "INSERT INTO reservations(table_name, guest, phone, party, start, "
+            "end, created_at) VALUES (?,?,?,?,?,?,?)",
+            (table, guest.strip(), phone.strip(), int(party), start, end, now))
+        con.commit()
+        con.close()
+        self.index[table].add(start, end, cur.lastrowid)
+        return cur.lastrowid, table
+
+    def get(self, rid):
+        con = sqlite3.connect(self.path)
+        row = con.execute(
+            "SELECT id, table_name, guest, phone, party, start, end, status "
+            "FROM reservations WHERE id = ?", (rid,)).fetchone()
+        con.close()
+        if row is None:
+            return None
+        return dict(zip(("id", "table", "guest", "phone", "party", "start",
+                         "end", "status"), row))
+
+    def _set_status(self, r, status, end=None):
+        con = sqlite3.connect(self.path)
+        con.execute("UPDATE reservations SET status=?, end=? WHERE id=?",
+                    (status, end or r["end"], r["id"]))
+        con.commit()
+        con.close()
+        slots = self.index.get(r["table"])
+        if slots is not None:
+            slots.remove(r["start"], r["id"])
+            if status in HOLDING:
+                slots.add(r["start"], end or r["end"], r["id"])
+
+    def seat(self, rid):
+        r = self.get(rid)
+        if r is None or r["status"] != "booked":
+            raise ValueError("Only a booked reservation can be seated.")
+        self._set_status(r, "seated")
+        r["status"] = "seated"
+        return r
+
+    def cancel(self, rid):
+        r = self.get(rid)
+        if r is None or r["status"] not in HOLDING:
+            raise ValueError("This reservation is no longer open.")
+        self._set_status(r, "cancelled")
+
+    def finish(self, rid):
+        # The party has paid or left: the table is free again from now on.
+        r = self.get(rid)
+        if r is None or r["status"] != "seated":
+            return
+        now = datetime.now().strftime(SLOT_FORMAT)
+        self._set_status(r, "done", min(r["end"], max(now, r["start"])))
+
+    def day(self, day):
+        # Every reservation overlapping the day, by start time.
+        con = sqlite3.connect(self.path)
+        rows = con.execute(
+            "SELECT id, start, end, table_name, guest, party, phone, status "
+            "FROM reservations WHERE end > ? AND start < ? ORDER BY start, id",
+            (f"{day} 00:00", f"{day} 24:00")).fetchall()
+        con.close()
+        return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import random
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Time conflict checks on a synthetic booking diary.")
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--probes", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        book = ReservationBook(os.path.join(tmp, "bookings.db"))
+        base = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+        def slot(day, quarter):
+            start = base + timedelta(days=day, minutes=15 * quarter)
+            return (start.strftime(SLOT_FORMAT),
+                    (start + timedelta(minutes=90)).strftime(SLOT_FORMAT))
+
+        days = max(1, args.bookings // 30)
+        started = time.perf_counter()
+        made = 0
+        for _ in range(args.bookings * 3):
+            start, end = slot(rng.randrange(days), rng.randrange(40))
+            try:
+                book.book("Guest", rng.randint(1, 8), start, end)
+                made += 1
+            except ValueError:
+                pass
+            if made == args.bookings:
+                break
+        elapsed = time.perf_counter() - started
+        print(f"{made} bookings over {days} days in {elapsed:.2f}s")
+
+        probes = [slot(rng.randrange(days), rng.randrange(40))
+                  for _ in range(args.probes)]
+        t = time.perf_counter()
+        for start, end in probes:
+            book.free_tables(4, start, end)
+        per = (time.perf_counter() - t) / len(probes)
+        print(f"free_tables: {per * 1e6:.1f} us per query "
+              f"({len(book.tables)} tables)")
+
+        # the same question answered by scanning every booking of a table
+        flat = {name: list(s.slots) for name, s in book.index.items()}
+        t = time.perf_counter()
+        for start, end in probes[:2000]:
+            [name for name, seats in book.tables.items() if seats >= 4
+             and not any(s < end and e > start for s, e, _r in flat[name])]
+        per = (time.perf_counter() - t) / min(2000, len(probes))
+        print(f"linear scan: {per * 1e6:.1f} us per query")
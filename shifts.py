@@ -0,0 +1,259 @@
+import sqlite3
+from datetime import datetime
+
+from billing import DB_FILE, cash_taken, format_tk
+from inventory import order_key
+from zreport import PAYMENT_METHODS
+
+# ---------- Tables ----------
+
+def init_shift_db(path=DB_FILE):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS shifts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            opened_at TEXT NOT NULL,
+            opened_by TEXT NOT NULL,
+            opening_float REAL NOT NULL,
+            closed_at TEXT,
+            closed_by TEXT,
+            expected_cash REAL,
+            counted_cash REAL
+        )
+    """)
+    # running totals per shift: kind is "method", "employee" or "drawer"
+    # (key "cash": what Cash orders actually put in the drawer)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS shift_totals (
+            shift_id INTEGER NOT NULL REFERENCES shifts(id),
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            total REAL NOT NULL,
+            PRIMARY KEY (shift_id, kind, key)
+        )
+    """)
+    # one row per order already counted, so a commit is counted exactly once
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS shift_orders (
+            order_key TEXT PRIMARY KEY,
+            shift_id INTEGER NOT NULL
+        )
+    """)
+    con.commit()
+    con.close()
+
+
+# ---------- Running counters ----------
+
+class ShiftLedger:
+    # The open shift and its per-method / per-employee totals, kept in
+    # memory and in shift_totals. Each committed order adds to them once;
+    # nothing is recomputed from the orders file.
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        init_shift_db(path)
+        self.current = None
+        self.by_method = {}
+        self.by_employee = {}
+        self.cash_in = 0.0
+        con = sqlite3.connect(path)
+        row = con.execute(
+            "SELECT id, opened_at, opened_by, opening_float FROM shifts "
+            "WHERE closed_at IS NULL ORDER BY id DESC LIMIT 1").fetchone()
+        if row:
+            self.current = {"id": row[0], "opened_at": row[1],
+                            "opened_by": row[2], "opening_float": row[3]}
+            for kind, key, count, total in con.execute(
+                    "SELECT kind, key, count, total FROM shift_totals "
+                    "WHERE shift_id = ?", (row[0],)):
+                if kind == "drawer":
+                    self.cash_in = total
+                    continue
+                target = self.by_method if kind == "method" else self.by_employee
+                target[key] = {"count": count, "total": total}
+        con.close()
+
+    def is_open(self):
+        return self.current is not None
+
+    def open(self, opened_by, opening_float):
+        if self.current:
+            raise ValueError(f"Shift #{self.current['id']} is still open.")
+        if opening_float < 0:
+            raise ValueError("Opening float cannot be negative.")
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        con = sqlite3.connect(self.path)
+        cur = con.cursor()
+        cur.execute("INSERT INTO shifts(opened_at, opened_by, opening_float) "
+                    "VALUES (?,?,?)", (now, opened_by, float(opening_float)))
+        con.commit()
+        con.close()
+        self.current = {"id": cur.lastrowid, "opened_at": now,
+                        "opened_by": opened_by,
+                        "opening_float": float(opening_float)}
+        self.by_method, self.by_employee = {}, {}
+        self.cash_in = 0.0
+        return self.current
+
+    def commit_order(self, order, con=None):
+        # Add one paid order to the open shift. Returns False when no shift
+        # is open or the order was already counted.
+        if self.current is None:
+            return False
+        shift_id = self.current["id"]
+        total = float(order.get("total_bill", 0) or 0)
+        cash = cash_taken(order)
+        rows = [("method", order.get("method", ""), total),
+                ("employee", order.get("employee") or "", total),
+                ("drawer", "cash", cash)]
+        own = con is None
+        if own:
+            con = sqlite3.connect(self.path)
+        try:
+            cur = con.cursor()
+            cur.execute("INSERT OR IGNORE INTO shift_orders(order_key, "
+                        "shift_id) VALUES (?,?)", (order_key(order), shift_id))
+            if cur.rowcount == 0:
+                return False
+            cur.executemany(
+                "INSERT INTO shift_totals(shift_id, kind, key, count, total) "
+                "VALUES (?,?,?,1,?) ON CONFLICT(shift_id, kind, key) DO UPDATE "
+                "SET count = count + 1, total = total + excluded.total",
+                [(shift_id, kind, key, amount) for kind, key, amount in rows])
+            if own:
+                con.commit()
+        except sqlite3.Error:
+            if own:
+                con.rollback()
+            raise
+        finally:
+            if own:
+                con.close()
+
+        for kind, key, amount in rows[:2]:
+            target = self.by_method if kind == "method" else self.by_employee
+            row = target.setdefault(key, {"count": 0, "total": 0.0})
+            row["count"] += 1
+            row["total"] += amount
+        self.cash_in += cash
+        return True
+
+    def catch_up(self, orders):
+        # Count orders saved after the shift opened but never counted (e.g.
+        # a crash between save_orders() and commit_order()). Walks back from
+        # the newest order until the shift's opening time.
+        if self.current is None:
+            return 0
+        con = sqlite3.connect(self.path)
+        pending = []
+        for o in reversed(orders):
+            if o.get("datetime", "") < self.current["opened_at"]:
+                break
+            if not con.execute("SELECT 1 FROM shift_orders WHERE order_key = ?",
+                               (order_key(o),)).fetchone():
+                pending.append(o)
+        con.close()
+        for o in reversed(pending):
+            self.commit_order(o)
+        return len(pending)
+
+    def expected_cash(self):
+        # short-paid Cash orders only put what was paid in the drawer
+        return self.current["opening_float"] + self.cash_in
+
+    def summary(self, counted_cash=None):
+        # What the close-out screen shows; only reads the counters.
+        shift = dict(self.current or {})
+        expected = self.expected_cash() if self.current else 0.0
+        by_method = {m: self.by_method.get(m, {"count": 0, "total": 0.0})
+                     for m in PAYMENT_METHODS}
+        for m, row in self.by_method.items():
+            by_method.setdefault(m, row)
+        return {
+            "shift": shift,
+            "orders": sum(r["count"] for r in self.by_method.values()),
+            "takings": sum(r["total"] for r in self.by_method.values()),
+            "by_method": by_method,
+            "by_employee": dict(self.by_employee),
+            "cash": {
+                "opening_float": shift.get("opening_float", 0.0),
+                "expected": expected,
+                "counted": counted_cash,
+                "variance": (None if counted_cash is None
+                             else counted_cash - expected),
+            },
+        }
+
+    def close(self, closed_by, counted_cash):
+        if self.current is None:
+            raise ValueError("No shift is open.")
+        if counted_cash < 0:
+            raise ValueError("Counted cash cannot be negative.")
+        result = self.summary(float(counted_cash))
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        con = sqlite3.connect(self.path)
+        con.execute("UPDATE shifts SET closed_at=?, closed_by=?, "
+                    "expected_cash=?, counted_cash=? WHERE id=?",
+                    (now, closed_by, result["cash"]["expected"],
+                     float(counted_cash), self.current["id"]))
+        con.commit()
+        con.close()
+        result["shift"].update(closed_at=now, closed_by=closed_by)
+        self.current = None
+        self.by_method, self.by_employee = {}, {}
+        self.cash_in = 0.0
+        return result
+
+
+def recent_shifts(limit=20, path=DB_FILE):
+    # Closed shifts, newest first: (id, opened_at, closed_at, opened_by,
+    # closed_by, expected, counted)
+    con = sqlite3.connect(path)
+    rows = con.execute(
+        "SELECT id, opened_at, closed_at, opened_by, closed_by, expected_cash, "
+        "counted_cash FROM shifts WHERE closed_at IS NOT NULL "
+        "ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    con.close()
+    return rows
+
+
+def format_shift(summary):
+    shift = summary["shift"]
+    lines = [
+        f"SHIFT #{shift.get('id', '-')}",
+        f"Opened {shift.get('opened_at', '-')} by {shift.get('opened_by', '-')}",
+    ]
+    if shift.get("closed_at"):
+        lines.append(f"Closed {shift['closed_at']} by {shift['closed_by']}")
+    lines += [
+        "",
+        f"Orders:          {summary['orders']}",
+        f"Takings:         {format_tk(summary['takings'])}",
+        "",
+        "By payment method",
+    ]
+    for m, row in summary["by_method"].items():
+        lines.append(f"  {m:<12}{row['count']:>6}  {format_tk(row['total']):>16}")
+    lines += ["", "By employee"]
+    if not summary["by_employee"]:
+        lines.append("  (none)")
+    for name, row in sorted(summary["by_employee"].items()):
+        lines.append(f"  {name[:24]:<24}{row['count']:>6}  {format_tk(row['total']):>16}")
+    cash = summary["cash"]
+    lines += [
+        "",
+        "Cash drawer",
+        f"  Opening float: {format_tk(cash['opening_float'])}",
+        f"  Cash taken:    {format_tk(cash['expected'] - cash['opening_float'])}",
+        f"  Expected:      {format_tk(cash['expected'])}",
+    ]
+    if cash["counted"] is not None:
+        lines.append(f"  Counted:       {format_tk(cash['counted'])}")
+        variance = cash["variance"]
+        label = "balanced" if abs(variance) < 0.005 else (
+            "over" if variance > 0 else "short")
+        lines.append(f"  Over / short:  {format_tk(variance)}  ({label})")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,378 @@
+import hashlib
+import hmac
+import os
+import sqlite3
+import time
+
+from billing import DB_FILE
+
+# ---------- Password hashing ----------
+
+# PBKDF2-SHA256, stored as "pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>".
+# Raise KACCHI_HASH_ITERATIONS as hardware gets faster; older hashes are
+# upgraded on the next successful login.
+HASH_SCHEME = "pbkdf2_sha256"
+HASH_ITERATIONS = int(os.environ.get("KACCHI_HASH_ITERATIONS", "200000"))
+SALT_BYTES = 16
+
+# A verified login is remembered for this long, so a cashier coming back
+# during the shift is not made to wait for the hash again.
+SESSION_TTL = float(os.environ.get("KACCHI_SESSION_TTL", str(12 * 3600)))
+SESSION_CACHE_SIZE = 1024
+
+
+def hash_password(password, iterations=HASH_ITERATIONS, salt=None):
+    salt = salt or os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt,
+                                 iterations)
+    return f"{HASH_SCHEME}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def is_hashed(stored):
+    return stored.startswith(HASH_SCHEME + "$")
+
+
+def verify_password(password, stored):
+    try:
+        scheme, iterations, salt, digest = stored.split("$")
+        if scheme != HASH_SCHEME:
+            return False
+        check = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"),
+                                    bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(check.hex(), digest)
+
+
+def needs_rehash(stored):
+    return int(stored.split("$")[1]) < HASH_ITERATIONS
+
+
+# ---------- Tables ----------
+
+def init_staff_db(path=DB_FILE):
+    # The employees table predates hashing: plaintext passwords still in it
+    # are hashed here, once. Every change bumps "version" so another store
+    # can pull just the rows changed since its last sync; removed staff
+    # stay as tombstones (deleted=1, no password) for the same reason.
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS employees (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            password TEXT NOT NULL
+        )
+    """)
+    cols = [r[1] for r in cur.execute("PRAGMA table_info(employees)")]
+    if "branch" not in cols:
+        cur.execute("ALTER TABLE employees "
+                    "ADD COLUMN branch TEXT NOT NULL DEFAULT ''")
+    if "deleted" not in cols:
+        cur.execute("ALTER TABLE employees "
+                    "ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0")
+    if "version" not in cols:
+        cur.execute("ALTER TABLE employees "
+                    "ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_employees_version "
+                "ON employees(version)")
+    # source roster -> highest version already pulled from it
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS roster_sync (
+            source TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+
+    plain = cur.execute(
+        "SELECT id, password FROM employees WHERE deleted = 0 "
+        "AND password != '' AND password NOT LIKE ?",
+        (HASH_SCHEME + "$%",)).fetchall()
+    for uid, password in plain:
+        cur.execute("UPDATE employees SET password=?, version=? WHERE id=?",
+                    (hash_password(password), _next_version(cur), uid))
+    con.commit()
+    con.close()
+
+
+def _next_version(cur):
+    # one probe of the version index
+    return cur.execute("SELECT COALESCE(MAX(version), 0) + 1 "
+                       "FROM employees").fetchone()[0]
+
+
+# ---------- Directory ----------
+
+class StaffDirectory:
+    # Employee lookups go through the primary key, never a scan of the
+    # roster. A successful login is remembered as a keyed digest of the
+    # password that was just checked; it is only trusted while the stored
+    # hash is unchanged, so a password change, removal or sync ends it.
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        init_staff_db(path)
+        self._secret = os.urandom(32)       # never leaves this process
+        self._sessions = {}     # uid -> (stored hash, digest, expires)
+        self._dummy = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, uid):
+        con = sqlite3.connect(self.path)
+        row = con.execute("SELECT id, name, password, branch FROM employees "
+                          "WHERE id = ? AND deleted = 0", (uid,)).fetchone()
+        con.close()
+        if row is None:
+            return None
+        return {"id": row[0], "name": row[1], "password": row[2],
+                "branch": row[3]}
+
+    def count(self):
+        con = sqlite3.connect(self.path)
+        n = con.execute("SELECT COUNT(*) FROM employees "
+                        "WHERE deleted = 0").fetchone()[0]
+        con.close()
+        return n
+
+    def search(self, text="", limit=500):
+        # [(id, name, branch)] in id order; a roster of thousands is never
+        # listed whole.
+        like = f"%{text.strip()}%"
+        con = sqlite3.connect(self.path)
+        rows = con.execute(
+            "SELECT id, name, branch FROM employees WHERE deleted = 0 "
+            "AND (id LIKE ? OR name LIKE ?) ORDER BY id LIMIT ?",
+            (like, like, limit)).fetchall()
+        con.close()
+        return rows
+
+    def add(self, uid, name, password, branch=""):
+        con = sqlite3.connect(self.path)
+        try:
+            cur = con.cursor()
+            # a removed id may be given out again
+            cur.execute(
+                "INSERT INTO employees(id, name, password, branch, deleted, "
+                "version) VALUES (?,?,?,?,0,?) ON CONFLICT(id) DO UPDATE SET "
+                "name=excluded.name, password=excluded.password, "
+                "branch=excluded.branch, deleted=0, version=excluded.version "
+                "WHERE deleted = 1",
+                (uid, name, hash_password(password), branch,
+                 _next_version(cur)))
+            if cur.rowcount == 0:
+                raise ValueError("Employee ID already exists.")
+            con.commit()
+        finally:
+            con.close()
+
+    def remove(self, uid):
+        con = sqlite3.connect(self.path)
+        cur = con.cursor()
+        cur.execute("UPDATE employees SET deleted=1, password='', version=? "
+                    "WHERE id=? AND deleted=0", (_next_version(cur), uid))
+        con.commit()
+        con.close()
+        self._sessions.pop(uid, None)
+
+    def _digest(self, uid, password):
+        return hmac.new(self._secret, f"{uid}\0{password}".encode("utf-8"),
+                        hashlib.sha256).digest()
+
+    def verify(self, uid, password):
+        # Display name for a good login, else None.
+        emp = self.get(uid)
+        if emp is None:
+            # spend the same time as a real check, so unknown ids cannot be
+            # told apart from wrong passwords
+            if self._dummy is None:
+                self._dummy = hash_password("")
+            verify_password(password, self._dummy)
+            return None
+        stored = emp["password"]
+        digest = self._digest(uid, password)
+        cached = self._sessions.get(uid)
+        if cached and cached[0] == stored and cached[2] > time.time() \
+                and hmac.compare_digest(cached[1], digest):
+            self.hits += 1
+            return emp["name"]
+        self.misses += 1
+        if not verify_password(password, stored):
+            return None
+        if needs_rehash(stored):
+            stored = self._rehash(uid, password)
+        if len(self._sessions) >= SESSION_CACHE_SIZE:
+            self._sessions.pop(next(iter(self._sessions)))
+        self._sessions[uid] = (stored, digest, time.time() + SESSION_TTL)
+        return emp["name"]
+
+    def _rehash(self, uid, password):
+        stored = hash_password(password)
+        con = sqlite3.connect(self.path)
+        cur = con.cursor()
+        cur.execute("UPDATE employees SET password=?, version=? WHERE id=?",
+                    (stored, _next_version(cur), uid))
+        con.commit()
+        con.close()
+        return stored
+
+    # ---------- Roster sync ----------
+
+    def sync_from(self, source_path, branch=None):
+        # Pull the rows changed in a central roster since the last sync from
+        # it. Only hashes travel. With `branch`, staff of other branches are
+        # kept as tombstones here, so someone moved away can no longer log
+        # in. Returns (rows applied, new high-water version).
+        source = os.path.abspath(source_path)
+        con = sqlite3.connect(self.path)
+        try:
+            cur = con.cursor()
+            row = cur.execute("SELECT version FROM roster_sync WHERE source=?",
+                              (source,)).fetchone()
+            since = row[0] if row else 0
+            src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+            try:
+                changed = src.execute(
+                    "SELECT id, name, password, branch, deleted, version "
+                    "FROM employees WHERE version > ? ORDER BY version",
+                    (since,)).fetchall()
+            finally:
+                src.close()
+            if not changed:
+                return 0, since
+            version = _next_version(cur)
+            rows = []
+            for uid, name, password, their_branch, deleted, _v in changed:
+                if branch is not None and their_branch not in ("", branch):
+                    deleted = 1
+                if deleted:
+                    password = ""
+                elif password and not is_hashed(password):
+                    password = hash_password(password)
+                rows.append((uid, name, password, their_branch, deleted,
+                             version))
+                version += 1
+            cur.executemany(
+                "INSERT INTO employees(id, name, password, branch, deleted, "
+                "version) VALUES (?,?,?,?,?,?) ON CONFLICT(id) DO UPDATE SET "
+                "name=excluded.name, password=excluded.password, "
+                "branch=excluded.branch, deleted=excluded.deleted, "
+                "version=excluded.version", rows)
+            cur.execute("INSERT OR REPLACE INTO roster_sync(source, version) "
+                        "VALUES (?,?)", (source, changed[-1][5]))
+            con.commit()
+        finally:
+            con.close()
+        for uid, *_rest in changed:
+            self._sessions.pop(uid, None)
+        return len(changed), changed[-1][5]
+
+
+# ---------- Benchmark ----------
+
+def _fill(path, n, real_ids=(), fill_iterations=1):
+    # n staff; `real_ids` get full-strength hashes, the rest cheap ones of
+    # the same length so filling 50k rows does not take an hour.
+    init_staff_db(path)
+    con = sqlite3.connect(path)
+    con.executemany(
+        "INSERT INTO employees(id, name, password, branch, deleted, version) "
+        "VALUES (?,?,?,?,0,?)",
+        ((f"E{i:06d}", f"Staff {i}",
+          hash_password(f"pw{i}", HASH_ITERATIONS if f"E{i:06d}" in real_ids
+                        else fill_iterations),
+          f"B{i % 12:02d}", i + 1) for i in range(n)))
+    con.commit()
+    con.close()
+
+
+def _ms(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000
+
+
+def benchmark(sizes, probes=10, lookups=2000):
+    import random
+    import tempfile
+
+    rng = random.Random(1)
+    print(f"PBKDF2 iterations: {HASH_ITERATIONS}")
+    print(f"{'staff':>8} {'lookup':>9} {'scan':>9} {'login':>9} "
+          f"{'cached':>9} {'unknown':>9} {'sync all':>9} {'sync 1%':>9}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            central = os.path.join(tmp, "central.db")
+            real = {f"E{i:06d}" for i in rng.sample(range(n), min(probes, n))}
+            _fill(central, n, real)
+            directory = StaffDirectory(central)
+
+            ids = [f"E{rng.randrange(n):06d}" for _ in range(lookups)]
+            t = time.perf_counter()
+            for uid in ids:
+                directory.get(uid)
+            lookup = (time.perf_counter() - t) / lookups
+
+            # what login used to do: next() over a list of dicts
+            roster = [{"id": f"E{i:06d}", "name": f"Staff {i}"}
+                      for i in range(n)]
+            t = time.perf_counter()
+            for uid in ids[:200]:
+                next((e for e in roster if e["id"] == uid), None)
+            scan = (time.perf_counter() - t) / 200
+
+            cold, warm, unknown = [], [], []
+            for uid in real:
+                pw = "pw" + str(int(uid[1:]))
+                t = time.perf_counter()
+                assert directory.verify(uid, pw)
+                cold.append(time.perf_counter() - t)
+                for _again in range(20):
+                    t = time.perf_counter()
+                    directory.verify(uid, pw)
+                    warm.append(time.perf_counter() - t)
+                t = time.perf_counter()
+                directory.verify("X" + uid, pw)
+                unknown.append(time.perf_counter() - t)
+
+            branch = StaffDirectory(os.path.join(tmp, "branch.db"))
+            t = time.perf_counter()
+            branch.sync_from(central, branch="B01")
+            sync_all = time.perf_counter() - t
+            con = sqlite3.connect(central)
+            cur = con.cursor()
+            version = _next_version(cur)
+            changed = rng.sample(range(n), max(1, n // 100))
+            cur.executemany("UPDATE employees SET name=?, version=? WHERE id=?",
+                            [(f"Renamed {i}", version + k, f"E{i:06d}")
+                             for k, i in enumerate(changed)])
+            con.commit()
+            con.close()
+            t = time.perf_counter()
+            applied, _v = branch.sync_from(central, branch="B01")
+            sync_delta = time.perf_counter() - t
+            assert applied == len(changed)
+
+        print(f"{n:>8} {lookup * 1000:>7.3f}ms {scan * 1000:>7.3f}ms "
+              f"{_ms(cold):>7.1f}ms {_ms(warm):>7.3f}ms {_ms(unknown):>7.1f}ms "
+              f"{sync_all * 1000:>7.0f}ms {sync_delta * 1000:>7.0f}ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Staff directory tools.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_sync = sub.add_parser("sync", help="pull changes from a central roster")
+    p_sync.add_argument("central_db")
+    p_sync.add_argument("--branch")
+    p_bench = sub.add_parser("bench", help="time logins by roster size")
+    p_bench.add_argument("--sizes", type=int, nargs="+",
+                         default=[100, 1000, 10000, 50000])
+    args = parser.parse_args()
+
+    if args.cmd == "sync":
+        applied, version = StaffDirectory().sync_from(args.central_db,
+                                                      args.branch)
+        print(f"Applied {applied} roster changes (now at version {version})")
+    else:
+        benchmark(args.sizes)
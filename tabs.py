@@ -0,0 +1,83 @@
+from array import array
+from datetime import datetime
+
+# ---------- Open tabs (tables / parked orders) ----------
+
+DEFAULT_TAB = "Walk-in"
+
+
+class Tab:
+    # One open order. Quantities live in a flat array indexed by the item's
+    # position in the menu, so a parked table costs a few bytes per item
+    # instead of a set of Tk variables.
+    __slots__ = ("name", "qty", "voucher_code", "discount_percent",
+                 "customer", "redeem_points", "reservation_id", "opened_at")
+
+    def __init__(self, name, n_items):
+        self.name = name
+        self.qty = array("i", bytes(4 * n_items))
+        self.voucher_code = None
+        self.discount_percent = 0.0
+        self.customer = None        # loyalty phone number
+        self.redeem_points = 0
+        self.reservation_id = None  # the booking seated at this tab
+        self.opened_at = datetime.now()
+
+    def is_empty(self):
+        return not any(self.qty)
+
+    def clear(self):
+        self.qty = array("i", bytes(4 * len(self.qty)))
+        self.voucher_code = None
+        self.discount_percent = 0.0
+        self.customer = None
+        self.redeem_points = 0
+
+    def item_count(self):
+        return sum(self.qty)
+
+
+class TabBook:
+    def __init__(self, item_keys=()):
+        self.keys = list(item_keys)
+        self.tabs = {}
+        self.active = None
+        self.open(DEFAULT_TAB)
+
+    def open(self, name):
+        if name not in self.tabs:
+            self.tabs[name] = Tab(name, len(self.keys))
+        self.active = name
+        return self.tabs[name]
+
+    def close(self, name):
+        # Closing the last tab leaves a fresh default one behind.
+        self.tabs.pop(name, None)
+        if not self.tabs:
+            self.tabs[DEFAULT_TAB] = Tab(DEFAULT_TAB, len(self.keys))
+        if self.active not in self.tabs:
+            self.active = next(iter(self.tabs))
+        return self.tabs[self.active]
+
+    def active_tab(self):
+        return self.tabs[self.active]
+
+    def names(self):
+        return list(self.tabs)
+
+    def rebind(self, item_keys):
+        # The menu was rebuilt (items added, removed or reordered): move every
+        # tab's quantities to the new positions by item key, dropping items
+        # that no longer exist.
+        item_keys = list(item_keys)
+        if item_keys == self.keys:
+            return
+        new_pos = {key: i for i, key in enumerate(item_keys)}
+        moves = [(old, new_pos[key]) for old, key in enumerate(self.keys)
+                 if key in new_pos]
+        for tab in self.tabs.values():
+            qty = array("i", bytes(4 * len(item_keys)))
+            for old, new in moves:
+                qty[new] = tab.qty[old]
+            tab.qty = qty
+        self.keys = item_keys
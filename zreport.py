@@ -0,0 +1,162 @@
+import json
+import os
+from datetime import datetime
+
+from billing import ORDER_FILE, cash_taken, order_amounts, order_lines, format_tk
+from history import iter_history
+
+# ---------- Files ----------
+
+REPORT_DIR = "reports"
+
+PAYMENT_METHODS = ["Cash", "bKash", "Nagad", "Rocket", "Card"]
+
+
+# ---------- Z-report ----------
+
+def build_zreport(day, opening_float=0.0, counted_cash=None,
+                  orders=None, path=ORDER_FILE):
+    # Single pass over the day's orders. Only running totals are kept, so
+    # memory depends on the number of methods/vouchers/staff/items, never on
+    # the number of orders. `orders` may be any iterable; by default the
+    # day's history segment and the live order file are streamed from disk.
+    if orders is None:
+        orders = iter_history(path, first_day=day, last_day=day)
+
+    by_method = {m: {"count": 0, "total": 0.0} for m in PAYMENT_METHODS}
+    by_voucher = {}
+    by_employee = {}
+    items = {}
+    count = 0
+    gross = discounts = vat = net = cash_in = 0.0
+
+    for o in orders:
+        if not o.get("datetime", "").startswith(day):
+            continue
+        subtotal, discount, order_vat = order_amounts(o)
+        total = float(o.get("total_bill", 0) or 0)
+        count += 1
+        gross += subtotal
+        discounts += discount
+        vat += order_vat
+        net += total
+        cash_in += cash_taken(o)
+
+        m = by_method.setdefault(o.get("method", ""), {"count": 0, "total": 0.0})
+        m["count"] += 1
+        m["total"] += total
+
+        code = o.get("voucher_code") or "None"
+        if code != "None":
+            v = by_voucher.setdefault(code, {"count": 0, "amount": 0.0})
+            v["count"] += 1
+            v["amount"] += discount
+
+        e = by_employee.setdefault(o.get("employee") or "",
+                                   {"count": 0, "total": 0.0})
+        e["count"] += 1
+        e["total"] += total
+
+        for it in order_lines(o):
+            row = items.setdefault(it.get("name", ""), {"qty": 0, "amount": 0.0})
+            row["qty"] += int(it.get("qty", 0) or 0)
+            row["amount"] += float(it.get("line_total", 0) or 0)
+
+    # short-paid Cash orders only put what was paid in the drawer
+    expected = opening_float + cash_in
+    return {
+        "day": day,
+        "generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "orders": count,
+        "gross": gross,
+        "discounts": discounts,
+        "vat": vat,
+        "net": net,
+        "by_method": by_method,
+        "by_voucher": by_voucher,
+        "by_employee": by_employee,
+        "items": items,
+        "cash": {
+            "opening_float": opening_float,
+            "taken": cash_in,
+            "expected": expected,
+            "counted": counted_cash,
+            "variance": (None if counted_cash is None
+                         else counted_cash - expected),
+        },
+    }
+
+
+def format_zreport(report):
+    lines = [
+        f"Z-REPORT  {report['day']}",
+        f"Generated {report['generated']}",
+        "",
+        f"Orders:          {report['orders']}",
+        f"Food cost:       {format_tk(report['gross'])}",
+        f"Discounts:       {format_tk(report['discounts'])}",
+        f"VAT:             {format_tk(report['vat'])}",
+        f"Net takings:     {format_tk(report['net'])}",
+        "",
+        "By payment method",
+    ]
+    for m, row in report["by_method"].items():
+        lines.append(f"  {m:<12}{row['count']:>6}  {format_tk(row['total']):>16}")
+
+    lines += ["", "Discounts by voucher"]
+    if not report["by_voucher"]:
+        lines.append("  (none)")
+    for code, row in sorted(report["by_voucher"].items()):
+        lines.append(f"  {code:<12}{row['count']:>6}  {format_tk(row['amount']):>16}")
+
+    lines += ["", "By employee"]
+    for name, row in sorted(report["by_employee"].items()):
+        lines.append(f"  {name[:24]:<24}{row['count']:>6}  {format_tk(row['total']):>16}")
+
+    lines += ["", "Items sold"]
+    for name, row in sorted(report["items"].items(),
+                            key=lambda kv: -kv[1]["qty"]):
+        lines.append(f"  {name[:30]:<30}{row['qty']:>6}  {format_tk(row['amount']):>16}")
+
+    cash = report["cash"]
+    lines += [
+        "",
+        "Cash drawer",
+        f"  Opening float: {format_tk(cash['opening_float'])}",
+        f"  Cash taken:    {format_tk(cash['taken'])}",
+        f"  Expected:      {format_tk(cash['expected'])}",
+    ]
+    if cash["counted"] is not None:
+        lines.append(f"  Counted:       {format_tk(cash['counted'])}")
+        lines.append(f"  Over / short:  {format_tk(cash['variance'])}")
+    return "\n".join(lines) + "\n"
+
+
+def export_zreport(report, out_dir=REPORT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f"zreport_{report['day']}")
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(format_zreport(report))
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return base + ".txt", base + ".json"
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="End-of-day Z-report.")
+    parser.add_argument("day", nargs="?",
+                        default=datetime.now().strftime("%Y-%m-%d"))
+    parser.add_argument("--orders", default=ORDER_FILE)
+    parser.add_argument("--float", type=float, default=0.0, dest="float_")
+    parser.add_argument("--counted", type=float, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rep = build_zreport(args.day, args.float_, args.counted, path=args.orders)
+    elapsed = time.perf_counter() - started
+    print(format_zreport(rep))
+    print("Exported:", ", ".join(export_zreport(rep)))
+    print(f"Computed in {elapsed * 1000:.1f} ms")